@@ -94,10 +94,30 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Take the write lock when a transaction starts, so concurrent
+            # writers queue on the busy timeout instead of failing with
+            # "database is locked" when a read lock can't be upgraded.
+            # Needs Django 5.1+ (pinned in requirements.txt)
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
     }
 }
 
 
+# Cache
+# Shared by every worker process on the host (gunicorn/Passenger workers and
+# run_jobs), so invalidations such as the settings-row version stamps in
+# core.settings_cache reach all of them. A per-process LocMemCache would not.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "tmp" / "django_cache",
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
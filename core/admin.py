@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Service, Project, Testimonial, Contact, Newsletter, SiteSettings, CompanyStats, Employee
+from django.utils import timezone
+from .models import Service, Project, Testimonial, Contact, Newsletter, SiteSettings, CompanyStats, Employee, Job, OutboundEmail
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
@@ -44,3 +45,33 @@ class EmployeeAdmin(admin.ModelAdmin):
     list_display = ('name', 'role', 'order')
     list_editable = ('order',)
     search_fields = ('name', 'role')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_after', 'locked_by', 'updated_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'updated_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status=Job.STATUS_RUNNING).update(
+            status=Job.STATUS_PENDING, attempts=0, run_after=timezone.now(), locked_at=None
+        )
+        self.message_user(request, f"{updated} job(s) queued again.")
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    exclude = ('message',)
+    readonly_fields = ('created_at', 'sent_at')
+    actions = ['requeue_emails']
+
+    @admin.action(description='Send selected emails again')
+    def requeue_emails(self, request, queryset):
+        updated = queryset.exclude(status=OutboundEmail.STATUS_SENDING).update(
+            status=OutboundEmail.STATUS_QUEUED, attempts=0, next_attempt_at=timezone.now(), claim='', locked_at=None
+        )
+        self.message_user(request, f"{updated} email(s) queued again.")
@@ -28,3 +28,22 @@ class CoreConfig(AppConfig):
                 pass
 
         post_migrate.connect(sync_site, sender=self)
+
+        from .lookups import register_lookups
+        register_lookups()
+
+        from django.core.checks import register
+        from .checks import check_shared_cache
+        register(check_shared_cache)
+
+        # Cached settings rows (and the email branding built from them) are
+        # dropped in every process when changed, including through the admin
+        from .models import SiteSettings, CompanyStats
+        from .settings_cache import connect_singleton_signals
+        connect_singleton_signals(SiteSettings)
+        connect_singleton_signals(CompanyStats)
+
+        # Buffered page visits are written after the response has been sent
+        from django.core.signals import request_finished
+        from .visits import flush_visits_if_due
+        request_finished.connect(flush_visits_if_due, dispatch_uid='flush_page_visits')
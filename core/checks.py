@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Warning
+
+# Backends whose entries only live inside one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Settings-row invalidation (core.settings_cache) only reaches other processes through a shared cache."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            'The default cache is local to each process, so a settings change made in one '
+            'worker is not seen by the others (or by run_jobs) until they restart.',
+            hint='Configure a shared cache in CACHES, e.g. FileBasedCache, DatabaseCache or Redis.',
+            id='core.W001',
+        )]
+    return []
@@ -1,8 +1,8 @@
-from .models import SiteSettings, CompanyStats
+from .settings_cache import get_site_settings, get_company_stats
 
 def site_settings(request):
-    settings_obj = SiteSettings.objects.first()
-    stats_obj = CompanyStats.objects.first()
+    settings_obj = get_site_settings()
+    stats_obj = get_company_stats()
     return {
         'site_settings': settings_obj,
         'company_stats': stats_obj,
@@ -0,0 +1,155 @@
+"""
+Database-backed job queue.
+
+Work that should not hold up a request (PDF rendering, SMTP round trips) is
+registered with @task and queued with enqueue(). The run_jobs management
+command claims due jobs and runs them; no broker is needed, the Job table is
+the queue.
+
+    @task('courses.issue_certificate')
+    def issue_certificate(certificate_id, base_url=''):
+        ...
+
+    enqueue('courses.issue_certificate', certificate_id=cert.pk, base_url=base_url)
+
+Payloads must be JSON serialisable, so pass primary keys and absolute URLs
+rather than model instances or requests.
+"""
+import os
+import socket
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+from .models import Job
+from .retention import delete_in_chunks
+
+# {task name: callable}
+_registry = {}
+_discovered = False
+
+# Retry delay after the n-th failed attempt: RETRY_BASE_SECONDS * 2 ** (n - 1)
+RETRY_BASE_SECONDS = 30
+# A running job whose worker died is picked up again after this long
+STALE_LOCK_SECONDS = 15 * 60
+
+
+def get_retention_days():
+    return getattr(settings, 'JOB_RETENTION_DAYS', 7)
+
+
+def task(name):
+    """Registers a function as a job handler under the given name."""
+    def decorator(func):
+        _registry[name] = func
+        func.task_name = name
+        return func
+    return decorator
+
+
+def get_task(name):
+    global _discovered
+    if name not in _registry and not _discovered:
+        # Handlers live in <app>/tasks.py; import them on first use
+        autodiscover_modules('tasks')
+        _discovered = True
+    return _registry.get(name)
+
+
+def enqueue(name, run_after=None, max_attempts=5, **payload):
+    """
+    Queues a job and returns it. With JOB_QUEUE_EAGER enabled the job runs
+    immediately instead, which is handy on a dev box without a worker.
+    """
+    if callable(name):
+        name = name.task_name
+    job = Job.objects.create(
+        task=name,
+        payload=payload,
+        run_after=run_after or timezone.now(),
+        max_attempts=max_attempts,
+    )
+    if getattr(settings, 'JOB_QUEUE_EAGER', False):
+        run_job(job)
+    return job
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next(worker_id=None):
+    """
+    Claims the oldest due job for this worker, or returns None. The claim is a
+    conditional UPDATE, so two workers racing for the same row can't both win.
+    """
+    worker_id = worker_id or default_worker_id()
+    now = timezone.now()
+    stale = now - timedelta(seconds=STALE_LOCK_SECONDS)
+    due = Job.objects.filter(
+        Q(status=Job.STATUS_PENDING, run_after__lte=now) |
+        Q(status=Job.STATUS_RUNNING, locked_at__lt=stale)
+    )
+    for job_id, status, locked_at in due.values_list('id', 'status', 'locked_at')[:10]:
+        claimed = Job.objects.filter(id=job_id, status=status, locked_at=locked_at).update(
+            status=Job.STATUS_RUNNING,
+            locked_at=now,
+            locked_by=worker_id,
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Runs one claimed job and records the outcome. Returns True on success."""
+    job.attempts += 1
+    handler = get_task(job.task)
+    try:
+        if handler is None:
+            raise LookupError(f"No task registered as '{job.task}'")
+        handler(**job.payload)
+    except Exception as e:
+        print(f"Job {job.pk} ({job.task}) failed: {e}")
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.STATUS_FAILED
+        else:
+            job.status = Job.STATUS_PENDING
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+        job.locked_at = None
+        job.save(update_fields=['attempts', 'status', 'run_after', 'locked_at', 'last_error', 'updated_at'])
+        return False
+
+    job.status = Job.STATUS_DONE
+    job.locked_at = None
+    job.last_error = ''
+    job.save(update_fields=['attempts', 'status', 'locked_at', 'last_error', 'updated_at'])
+    return True
+
+
+def run_pending(limit=None, worker_id=None):
+    """Runs due jobs until none are left (or limit is reached). Returns (done, failed)."""
+    done = failed = 0
+    while limit is None or done + failed < limit:
+        job = claim_next(worker_id)
+        if job is None:
+            break
+        if run_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def prune_jobs(days=None, chunk_size=1000):
+    """
+    Deletes jobs that finished successfully more than `days` ago (default
+    JOB_RETENTION_DAYS). Failed jobs are kept for inspection. Returns the count.
+    """
+    days = get_retention_days() if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return delete_in_chunks(Job.objects.filter(status=Job.STATUS_DONE, updated_at__lt=cutoff), chunk_size=chunk_size)
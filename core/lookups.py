@@ -0,0 +1,28 @@
+"""
+Extra field lookups, registered in CoreConfig.ready.
+
+`field__prefix=value` is a case-sensitive "starts with" written as a range,
+value <= field < value + U+10FFFF, which a plain index on the column serves.
+SQLite can't use an ordinary index for LIKE (startswith / istartswith), so
+prefix searches over large tables should use this instead.
+"""
+from django.db.models import CharField, Lookup
+
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+class Prefix(Lookup):
+    lookup_name = 'prefix'
+
+    def as_sql(self, compiler, connection):
+        if not self.rhs_is_direct_value():
+            raise ValueError('The prefix lookup only takes a literal value.')
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        upper = [str(rhs_params[0]) + PREFIX_UPPER_BOUND]
+        params = (*lhs_params, *rhs_params, *lhs_params, *upper)
+        return f'({lhs} >= {rhs} AND {lhs} < {rhs})', params
+
+
+def register_lookups():
+    CharField.register_lookup(Prefix)
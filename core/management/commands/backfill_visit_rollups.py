@@ -0,0 +1,21 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.rollups import rebuild_visit_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the hourly/daily page-visit rollups from raw PageVisit rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to rebuild (YYYY-MM-DD). Default: the oldest raw visit')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format.')
+        counted = rebuild_visit_rollups(since=since)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {counted} visits.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core.jobs import prune_jobs, get_retention_days
+from core.outbox import prune_sent
+
+
+class Command(BaseCommand):
+    help = 'Deletes finished jobs and sent outbox emails older than the retention window (failed/dead ones are kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Days to keep (default JOB_RETENTION_DAYS or 7)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows deleted per transaction')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_retention_days()
+        jobs = prune_jobs(days=days, chunk_size=options['chunk_size'])
+        emails = prune_sent(days=days, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {jobs} finished jobs and {emails} sent emails older than {days} days.'))
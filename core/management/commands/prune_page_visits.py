@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from core.retention import prune_page_visits, get_retention_days
+
+
+class Command(BaseCommand):
+    help = 'Compacts raw page visits older than the retention window into the rollups, archives them and deletes them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Days of raw visits to keep (default PAGE_VISIT_RETENTION_DAYS or 90)')
+        parser.add_argument('--archive-dir', default=None, help='Where to write the .jsonl.gz archive (default PAGE_VISIT_ARCHIVE_DIR)')
+        parser.add_argument('--no-archive', action='store_true', help='Delete without writing an archive')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between delete chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many visits would be pruned')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_retention_days()
+        result = prune_page_visits(
+            days=days,
+            archive=not options['no_archive'],
+            archive_dir=options['archive_dir'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f'{result.deleted} visits before {result.cutoff:%Y-%m-%d} would be pruned.')
+            return
+        if result.archive_path:
+            self.stdout.write(f'Archived {result.archived} visits to {result.archive_path}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {result.deleted} visits before {result.cutoff:%Y-%m-%d} '
+            f'({result.compacted} compacted into the daily rollups).'
+        ))
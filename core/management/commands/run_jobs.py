@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from core.jobs import run_pending, default_worker_id
+from core.outbox import drain_outbox, outbox_enabled
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (emails, certificates). Keeps polling unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every due job, then exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--batch', type=int, default=50, help='Jobs to run between queue checks')
+        parser.add_argument('--worker-id', default='', help='Name recorded on claimed jobs (default host:pid)')
+        parser.add_argument('--max-runtime', type=float, default=None,
+                            help='Exit after this many seconds (for a per-minute cron instead of a daemon)')
+        parser.add_argument('--no-outbox', action='store_true', help="Don't send outbox emails (when send_outbox runs separately)")
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        self.stdout.write(f'Job worker {worker_id} started.')
+        total_done = total_failed = 0
+        deadline = time.monotonic() + options['max_runtime'] if options['max_runtime'] else None
+        try:
+            while True:
+                done, failed = run_pending(limit=options['batch'], worker_id=worker_id)
+                total_done += done
+                total_failed += failed
+                if done or failed:
+                    self.stdout.write(f'Ran {done + failed} jobs ({failed} failed).')
+                # Emails queued by the jobs go out together over one connection
+                if outbox_enabled() and not options['no_outbox']:
+                    stats = drain_outbox()
+                    if stats.sent or stats.retried or stats.dead:
+                        self.stdout.write(f'Sent {stats.sent} emails ({stats.retried} to retry, {stats.dead} dead-lettered).')
+                if options['once']:
+                    if done + failed < options['batch']:
+                        break
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                if not (done or failed):
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Worker stopped: {total_done} done, {total_failed} failed.'))
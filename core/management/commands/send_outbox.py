@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from core.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Sends queued outbox emails in batches over one SMTP connection. Keeps polling unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send everything that is due, then exit')
+        parser.add_argument('--batch', type=int, default=100, help='Messages claimed per batch')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many messages')
+        parser.add_argument('--sleep', type=float, default=5.0, help='Seconds to wait when the outbox is empty')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                stats = drain_outbox(batch_size=options['batch'], limit=options['limit'])
+                if stats.sent or stats.retried or stats.dead or options['once']:
+                    self.report(stats)
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, stats):
+        rate = stats.sent / stats.elapsed if stats.elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {stats.sent} emails in {stats.elapsed:.2f}s ({rate:.1f}/s), '
+            f'{stats.retried} to retry, {stats.dead} dead-lettered.'
+        ))
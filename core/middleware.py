@@ -1,7 +1,6 @@
 from django.utils.deprecation import MiddlewareMixin
-from django.urls import resolve
 from django.conf import settings
-from .models import PageVisit
+from .visits import visit_buffer
 
 
 class PageVisitLoggerMiddleware(MiddlewareMixin):
@@ -15,15 +14,13 @@ class PageVisitLoggerMiddleware(MiddlewareMixin):
             # Avoid logging health checks or sitemap/robots
             if path in ('/sitemap.xml', '/robots.txt'):
                 return None
-            # Resolve to ensure valid view
-            resolve(path)
-            # Save visit
-            PageVisit.objects.create(
-                page_url=path,
-                user=request.user if request.user.is_authenticated else None,
+            # process_view only runs for resolved URLs (request.resolver_match), so no resolve() here
+            # Queue the visit; core.visits writes them in batches after the response
+            visit_buffer.record(
+                path,
+                user_id=request.user.pk if request.user.is_authenticated else None,
             )
         except Exception:
             # Silently ignore any logging errors
             pass
         return None
-
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_pagevisit_visited_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageVisitDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('page_url', models.CharField(blank=True, max_length=255)),
+                ('visits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'page_url'), name='core_visit_daily_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PageVisitHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('page_url', models.CharField(blank=True, max_length=255)),
+                ('visits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'page_url'), name='core_visit_hourly_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_page_visit_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pagevisit',
+            index=models.Index(fields=['visited_at'], name='core_visit_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagevisit',
+            index=models.Index(fields=['page_url', 'visited_at'], name='core_visit_page_time_idx'),
+        ),
+    ]
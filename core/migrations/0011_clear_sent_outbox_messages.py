@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def clear_sent_messages(apps, schema_editor):
+    OutboundEmail = apps.get_model('core', 'OutboundEmail')
+    OutboundEmail.objects.filter(status='sent').exclude(message=b'').update(message=b'')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_pagevisit_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_sent_messages, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
 from django.utils.text import slugify
 from django.urls import reverse
+from django.utils import timezone
 import uuid
+from .settings_cache import get_cached_singleton, invalidate_after_commit
 
 class Service(models.Model):
     title = models.CharField(max_length=200)
@@ -92,7 +94,34 @@ class Newsletter(models.Model):
 
 # --- Site Settings & Company ---
 
-class SiteSettings(models.Model):
+class SingletonModel(models.Model):
+    """
+    Base for settings tables that hold a single row. get_cached() returns that
+    row (or None) from the process cache; saving or deleting through the model
+    invalidates it in every process (see core.settings_cache). Queryset
+    updates/deletes bypass this, so follow them with invalidate_cache().
+    """
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_cached(cls):
+        return get_cached_singleton(cls)
+
+    @classmethod
+    def invalidate_cache(cls):
+        invalidate_after_commit(cls)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invalidate_cache()
+        return result
+
+class SiteSettings(SingletonModel):
     site_name = models.CharField(max_length=200, default='TechOhr')
     logo = models.ImageField(upload_to='settings/logo/', blank=True, null=True)
     favicon = models.ImageField(upload_to='settings/favicon/', blank=True, null=True)
@@ -119,7 +148,7 @@ class SiteSettings(models.Model):
     def __str__(self):
         return "Site Settings"
 
-class CompanyStats(models.Model):
+class CompanyStats(SingletonModel):
     projects_completed = models.PositiveIntegerField(default=0)
     happy_clients = models.PositiveIntegerField(default=0)
     team_members = models.PositiveIntegerField(default=0)
@@ -144,12 +173,125 @@ class Employee(models.Model):
 
 class PageVisit(models.Model):
     page_url = models.CharField(max_length=255)
-    visited_at = models.DateTimeField(auto_now_add=True)
+    # Set when the visit is recorded, not when the buffered batch is written
+    visited_at = models.DateTimeField(default=timezone.now)
     user = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Trend ranges, backfills and retention cut-offs
+            models.Index(fields=['visited_at'], name='core_visit_time_idx'),
+            models.Index(fields=['page_url', 'visited_at'], name='core_visit_page_time_idx'),
+        ]
+
     def __str__(self):
         who = self.user.username if self.user else 'Anonymous'
         return f"{who} visited {self.page_url} at {self.visited_at}"
 
     def __str__(self):
         return f"{self.name} - {self.role}"
+
+
+
+class PageVisitHourly(models.Model):
+    """Visits per hour, per page. page_url '' holds the total across all pages."""
+    hour = models.DateTimeField()
+    page_url = models.CharField(max_length=255, blank=True)
+    visits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'page_url'], name='core_visit_hourly_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.page_url or 'All pages'} @ {self.hour}: {self.visits}"
+
+
+class PageVisitDaily(models.Model):
+    """Visits per day, per page. page_url '' holds the total across all pages."""
+    day = models.DateField()
+    page_url = models.CharField(max_length=255, blank=True)
+    visits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'page_url'], name='core_visit_daily_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.page_url or 'All pages'} on {self.day}: {self.visits}"
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by the run_jobs worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='core_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} [{self.status}]"
+
+
+class OutboundEmail(models.Model):
+    """
+    A fully rendered email waiting in the outbox. The MIME message is stored as
+    sent on the wire, so the sender never re-renders templates or re-reads
+    attachments; see core.outbox.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead'),
+    ]
+
+    subject = models.CharField(max_length=255, blank=True)
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    message = models.BinaryField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='core_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} [{self.status}]"
@@ -0,0 +1,219 @@
+"""
+Outbound email outbox.
+
+send_html_email() renders a message once and stores the raw MIME bytes in
+OutboundEmail. drain_outbox() then sends due messages in batches over a single
+SMTP connection, so a burst of receipts or notifications pays for one TLS
+handshake instead of one per message. Failed messages are retried with
+exponential backoff and dead-lettered after EMAIL_OUTBOX_MAX_ATTEMPTS, or at
+once when the server rejects them permanently. A sent message keeps its
+envelope (subject, recipients, sent_at) but not its body.
+"""
+import smtplib
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db.models import Q
+from django.utils import timezone
+from .jobs import get_retention_days
+from .models import OutboundEmail
+from .retention import delete_in_chunks
+
+# Retry delay after the n-th failed attempt: RETRY_BASE_SECONDS * 2 ** (n - 1), capped
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 60 * 60
+# Messages stuck in 'sending' (sender crashed mid-batch) are released after this long
+STALE_CLAIM_SECONDS = 10 * 60
+
+OutboxStats = namedtuple('OutboxStats', ['sent', 'retried', 'dead', 'elapsed'])
+
+
+def outbox_enabled():
+    return getattr(settings, 'EMAIL_OUTBOX', True)
+
+
+def get_max_attempts():
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+
+
+class RawMIMEMessage:
+    """Stands in for email.message.Message: hands back the stored bytes untouched."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        if linesep == '\r\n':
+            return self.data
+        return self.data.replace(b'\r\n', linesep.encode('ascii'))
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.as_bytes(linesep=linesep).decode('utf-8', 'replace')
+
+    def get_charset(self):
+        return None
+
+
+class RawEmailMessage:
+    """
+    The parts of EmailMessage that mail backends use, backed by a stored
+    OutboundEmail, so connection.send_messages() can send it as is.
+    """
+    encoding = None
+
+    def __init__(self, outbound):
+        self.outbound = outbound
+        self.subject = outbound.subject
+        self.from_email = outbound.from_email
+        self.to = list(outbound.recipients)
+
+    def recipients(self):
+        return self.to
+
+    def message(self):
+        return RawMIMEMessage(bytes(self.outbound.message))
+
+
+def queue_email(email):
+    """Stores a built EmailMessage in the outbox. Returns the OutboundEmail."""
+    return OutboundEmail.objects.create(
+        subject=str(email.subject)[:255],
+        from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=email.recipients(),
+        message=email.message().as_bytes(linesep='\r\n'),
+    )
+
+
+def claim_batch(size):
+    """Claims up to `size` due messages for this drain with one conditional UPDATE."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=STALE_CLAIM_SECONDS)
+    due = OutboundEmail.objects.filter(
+        Q(status=OutboundEmail.STATUS_QUEUED, next_attempt_at__lte=now) |
+        Q(status=OutboundEmail.STATUS_SENDING, locked_at__lt=stale)
+    )
+    ids = list(due.values_list('id', flat=True)[:size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    due.filter(id__in=ids).update(status=OutboundEmail.STATUS_SENDING, claim=token, locked_at=now)
+    return list(OutboundEmail.objects.filter(claim=token, status=OutboundEmail.STATUS_SENDING).order_by('id'))
+
+
+def _is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    code = getattr(error, 'smtp_code', None)
+    return bool(code and code >= 500)
+
+
+def _is_connection_error(error):
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def _reconnect(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+    try:
+        connection.open()
+        return True
+    except Exception as e:
+        print(f"Error reconnecting to the mail server: {e}")
+        return False
+
+
+def _release(messages):
+    if messages:
+        OutboundEmail.objects.filter(pk__in=[m.pk for m in messages]).update(
+            status=OutboundEmail.STATUS_QUEUED, claim='', locked_at=None
+        )
+
+
+def _record_failure(outbound, error, max_attempts):
+    outbound.attempts += 1
+    outbound.last_error = f"{type(error).__name__}: {error}"
+    outbound.claim = ''
+    outbound.locked_at = None
+    if _is_permanent(error) or outbound.attempts >= max_attempts:
+        outbound.status = OutboundEmail.STATUS_DEAD
+        outbound.save(update_fields=['attempts', 'last_error', 'claim', 'locked_at', 'status'])
+        return OutboundEmail.STATUS_DEAD
+    delay = min(RETRY_BASE_SECONDS * 2 ** (outbound.attempts - 1), RETRY_MAX_SECONDS)
+    outbound.status = OutboundEmail.STATUS_QUEUED
+    outbound.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    outbound.save(update_fields=['attempts', 'last_error', 'claim', 'locked_at', 'status', 'next_attempt_at'])
+    return OutboundEmail.STATUS_QUEUED
+
+
+def drain_outbox(batch_size=100, limit=None, connection=None):
+    """
+    Sends due messages until the outbox is empty (or `limit` messages were
+    tried) over one connection. Returns OutboxStats.
+    """
+    started = time.monotonic()
+    max_attempts = get_max_attempts()
+    sent = retried = dead = 0
+    connection = connection or get_connection()
+    opened = stopped = False
+    try:
+        while not stopped and (limit is None or sent + retried + dead < limit):
+            size = batch_size if limit is None else min(batch_size, limit - sent - retried - dead)
+            batch = claim_batch(size)
+            if not batch:
+                break
+            if not opened:
+                try:
+                    connection.open()
+                except Exception as e:
+                    print(f"Error connecting to the mail server: {e}")
+                    _release(batch)
+                    break
+                opened = True
+            delivered = []
+            for index, outbound in enumerate(batch):
+                try:
+                    if connection.send_messages([RawEmailMessage(outbound)]):
+                        delivered.append(outbound.pk)
+                        continue
+                    raise smtplib.SMTPException('Message was not accepted by the mail backend')
+                except Exception as e:
+                    print(f"Error sending outbox email {outbound.pk}: {e}")
+                    if _record_failure(outbound, e, max_attempts) == OutboundEmail.STATUS_DEAD:
+                        dead += 1
+                    else:
+                        retried += 1
+                    if _is_connection_error(e) and not _reconnect(connection):
+                        # Server unreachable: hand the rest back untouched and stop
+                        _release(batch[index + 1:])
+                        stopped = True
+                        break
+            if delivered:
+                # The MIME bytes (attachments included) aren't needed once sent
+                OutboundEmail.objects.filter(pk__in=delivered).update(
+                    status=OutboundEmail.STATUS_SENT, claim='', locked_at=None, sent_at=timezone.now(), last_error='',
+                    message=b'',
+                )
+                sent += len(delivered)
+    finally:
+        if opened:
+            try:
+                connection.close()
+            except Exception:
+                pass
+    return OutboxStats(sent, retried, dead, time.monotonic() - started)
+
+
+def prune_sent(days=None, chunk_size=1000):
+    """Deletes emails sent more than `days` ago (default JOB_RETENTION_DAYS); dead ones are kept."""
+    days = get_retention_days() if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return delete_in_chunks(
+        OutboundEmail.objects.filter(status=OutboundEmail.STATUS_SENT, sent_at__lt=cutoff), chunk_size=chunk_size
+    )
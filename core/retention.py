@@ -0,0 +1,105 @@
+"""
+Retention for raw page visits.
+
+Visits older than the retention window are first compacted into the hourly
+and daily rollups (rebuilt from the raw rows, so the counts are exact), then
+optionally archived as gzip-compressed JSON Lines, and finally deleted in
+small id-ordered chunks. Each chunk is its own short transaction, so the site
+never waits behind one long write lock.
+"""
+import gzip
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import PageVisit
+from .rollups import rebuild_visit_rollups
+
+PruneResult = namedtuple('PruneResult', ['cutoff', 'compacted', 'archived', 'deleted', 'archive_path'])
+
+
+def get_retention_days():
+    return getattr(settings, 'PAGE_VISIT_RETENTION_DAYS', 90)
+
+
+def get_archive_dir():
+    archive_dir = getattr(settings, 'PAGE_VISIT_ARCHIVE_DIR', None)
+    if not archive_dir:
+        archive_dir = os.path.join(settings.BASE_DIR, 'archive', 'page_visits')
+    return str(archive_dir)
+
+
+def retention_cutoff(days, now=None):
+    """Start of the local day `days` days ago; only whole days are pruned."""
+    now = timezone.localtime(now or timezone.now())
+    return (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def archive_visits(queryset, archive_dir, cutoff, chunk_size=1000):
+    """
+    Writes the visits as JSON Lines into a gzip file and returns (path, count).
+    The file only appears under its final name once it is complete.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    path = os.path.join(archive_dir, f"page_visits_before_{cutoff:%Y-%m-%d}_{stamp}.jsonl.gz")
+    tmp_path = f"{path}.tmp"
+    count = 0
+    rows = queryset.order_by('id').values_list('id', 'page_url', 'visited_at', 'user_id')
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for visit_id, page_url, visited_at, user_id in rows.iterator(chunk_size=chunk_size):
+                f.write(json.dumps({
+                    'id': visit_id,
+                    'page_url': page_url,
+                    'visited_at': visited_at.isoformat(),
+                    'user_id': user_id,
+                }) + '\n')
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path, count
+
+
+def delete_in_chunks(queryset, chunk_size=1000, pause=0.0):
+    """Deletes the queryset a chunk of ids at a time. Returns the number deleted."""
+    deleted = 0
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        count, _ = queryset.model.objects.filter(id__in=ids).delete()
+        deleted += count
+        last_id = ids[-1]
+        if pause:
+            # Let other writers in between chunks
+            time.sleep(pause)
+    return deleted
+
+
+def prune_page_visits(days=None, archive=True, archive_dir=None, chunk_size=1000, pause=0.0, dry_run=False):
+    days = get_retention_days() if days is None else days
+    cutoff = retention_cutoff(days)
+    expired = PageVisit.objects.filter(visited_at__lt=cutoff)
+    if dry_run:
+        return PruneResult(cutoff, 0, 0, expired.count(), None)
+    if not expired.exists():
+        return PruneResult(cutoff, 0, 0, 0, None)
+
+    # Make sure the rollups hold these days before the raw rows go
+    compacted = rebuild_visit_rollups(until=cutoff)
+
+    archived = 0
+    archive_path = None
+    if archive:
+        archive_path, archived = archive_visits(expired, archive_dir or get_archive_dir(), cutoff, chunk_size)
+
+    deleted = delete_in_chunks(expired, chunk_size=chunk_size, pause=pause)
+    return PruneResult(cutoff, compacted, archived, deleted, archive_path)
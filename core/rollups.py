@@ -0,0 +1,109 @@
+"""
+Page-visit rollups.
+
+PageVisitHourly and PageVisitDaily keep visit counts per bucket, both per page
+and in total (page_url ''). They are bumped for every batch written by the
+visit buffer (core.visits), so the admin dashboard reads a few rollup rows
+instead of counting the raw PageVisit table. backfill_visit_rollups rebuilds
+them from raw visits.
+"""
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+from .models import PageVisit, PageVisitHourly, PageVisitDaily
+
+TOTAL = ''
+
+
+def bucket_visits(visits):
+    """Counts (visited_at, page_url) pairs per hour and per day, per page and in total."""
+    hourly = Counter()
+    daily = Counter()
+    for visited_at, page_url in visits:
+        local = timezone.localtime(visited_at)
+        hour = local.replace(minute=0, second=0, microsecond=0)
+        day = local.date()
+        for url in (page_url, TOTAL):
+            hourly[(hour, url)] += 1
+            daily[(day, url)] += 1
+    return hourly, daily
+
+
+def _increment(model, bucket_field, counts):
+    for (bucket, page_url), visits in counts.items():
+        lookup = {bucket_field: bucket, 'page_url': page_url}
+        if model.objects.filter(**lookup).update(visits=F('visits') + visits):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(visits=visits, **lookup)
+        except IntegrityError:
+            # Another writer created the row first
+            model.objects.filter(**lookup).update(visits=F('visits') + visits)
+
+
+def record_visit_rollups(visits):
+    """Adds a batch of PageVisit objects (or (visited_at, page_url) pairs) to the rollups."""
+    pairs = [(v.visited_at, v.page_url) if isinstance(v, PageVisit) else v for v in visits]
+    hourly, daily = bucket_visits(pairs)
+    _increment(PageVisitHourly, 'hour', hourly)
+    _increment(PageVisitDaily, 'day', daily)
+
+
+def rebuild_visit_rollups(since=None, until=None):
+    """
+    Recomputes the rollups from raw PageVisit rows, from the start of the day
+    of `since` (default: the oldest visit) up to `until` (exclusive, a day
+    boundary; default: now). Rollups outside that window are kept, so days
+    whose raw rows were already pruned are left alone. Returns the number of
+    visits counted.
+    """
+    visits = PageVisit.objects.all()
+    if since is None:
+        oldest = visits.order_by('visited_at').values_list('visited_at', flat=True).first()
+        if oldest is None:
+            return 0
+        since = oldest
+    start = timezone.localtime(since).replace(hour=0, minute=0, second=0, microsecond=0)
+    visits = visits.filter(visited_at__gte=start)
+    hourly_window = PageVisitHourly.objects.filter(hour__gte=start)
+    daily_window = PageVisitDaily.objects.filter(day__gte=start.date())
+    if until is not None:
+        visits = visits.filter(visited_at__lt=until)
+        hourly_window = hourly_window.filter(hour__lt=until)
+        daily_window = daily_window.filter(day__lt=timezone.localtime(until).date())
+
+    # Read and rewrite under one write lock (transaction_mode IMMEDIATE), so a
+    # buffer flush can't bump the rollups between the count and the delete
+    with transaction.atomic():
+        hourly_rows = []
+        for row in visits.annotate(bucket=TruncHour('visited_at')).values('bucket', 'page_url').annotate(n=Count('id')):
+            hourly_rows.append(PageVisitHourly(hour=row['bucket'], page_url=row['page_url'], visits=row['n']))
+        for row in visits.annotate(bucket=TruncHour('visited_at')).values('bucket').annotate(n=Count('id')):
+            hourly_rows.append(PageVisitHourly(hour=row['bucket'], page_url=TOTAL, visits=row['n']))
+        daily_rows = []
+        for row in visits.annotate(bucket=TruncDate('visited_at')).values('bucket', 'page_url').annotate(n=Count('id')):
+            daily_rows.append(PageVisitDaily(day=row['bucket'], page_url=row['page_url'], visits=row['n']))
+        for row in visits.annotate(bucket=TruncDate('visited_at')).values('bucket').annotate(n=Count('id')):
+            daily_rows.append(PageVisitDaily(day=row['bucket'], page_url=TOTAL, visits=row['n']))
+
+        hourly_window.delete()
+        daily_window.delete()
+        PageVisitHourly.objects.bulk_create(hourly_rows, batch_size=500)
+        PageVisitDaily.objects.bulk_create(daily_rows, batch_size=500)
+    return sum(row.visits for row in daily_rows if row.page_url == TOTAL)
+
+
+def hourly_totals(start, end):
+    """{hour: visits} for hours in [start, end), all pages."""
+    rows = PageVisitHourly.objects.filter(page_url=TOTAL, hour__gte=start, hour__lt=end)
+    return {timezone.localtime(hour): visits for hour, visits in rows.values_list('hour', 'visits')}
+
+
+def daily_totals(start_day, end_day):
+    """{day: visits} for days in [start_day, end_day], all pages."""
+    rows = PageVisitDaily.objects.filter(page_url=TOTAL, day__range=(start_day, end_day))
+    return dict(rows.values_list('day', 'visits'))
+
@@ -0,0 +1,86 @@
+"""
+Cached lookups for single-row settings models (SiteSettings, CompanyStats,
+PaymentSettings, CertificateSettings). Models normally go through
+SingletonModel.get_cached() (core.models), which is built on this module.
+
+Each process keeps the row it loaded together with the version stamp it was
+loaded under. The stamp lives in the default cache, which must be shared
+between processes (config.settings uses FileBasedCache; the core.W001 check
+warns about per-process backends), so a save in one process
+(post_save / post_delete -> invalidate_cached_singleton) bumps it and every
+other process reloads on its next lookup. A lookup therefore costs one cache
+read instead of a database query.
+
+Returned instances are shared: read from them, don't modify and save them.
+"""
+import threading
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+VERSION_KEY = 'singleton:{}:version'
+
+# {model label: (version, instance or None)}
+_local_cache = {}
+_lock = threading.Lock()
+
+
+def _version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def _current_version(model):
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        # First lookup since the cache was cleared; whoever adds first wins
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_cached_singleton(model):
+    """Returns model.objects.first(), cached until the row is saved or deleted."""
+    label = model._meta.label_lower
+    version = _current_version(model)
+    entry = _local_cache.get(label)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    instance = model.objects.first()
+    with _lock:
+        _local_cache[label] = (version, instance)
+    return instance
+
+
+def invalidate_cached_singleton(sender, **kwargs):
+    """post_save / post_delete receiver; also fine to call directly with the model."""
+    cache.set(_version_key(sender), uuid.uuid4().hex, None)
+    with _lock:
+        _local_cache.pop(sender._meta.label_lower, None)
+
+
+def invalidate_after_commit(model):
+    """
+    Invalidates now and again once the surrounding transaction commits, so a
+    process that reloads in between can't keep the pre-commit row under the
+    new version.
+    """
+    invalidate_cached_singleton(model)
+    transaction.on_commit(lambda: invalidate_cached_singleton(model))
+
+
+def connect_singleton_signals(model):
+    label = model._meta.label_lower
+    post_save.connect(invalidate_cached_singleton, sender=model, dispatch_uid=f'singleton_save_{label}')
+    post_delete.connect(invalidate_cached_singleton, sender=model, dispatch_uid=f'singleton_delete_{label}')
+
+
+def get_site_settings():
+    from .models import SiteSettings
+    return SiteSettings.get_cached()
+
+
+def get_company_stats():
+    from .models import CompanyStats
+    return CompanyStats.get_cached()
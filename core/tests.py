@@ -1,6 +1,31 @@
-from django.test import TestCase, Client
+import gzip
+import io
+import json
+import os
+import shutil
+import smtplib
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings as django_settings
+from django.test import TestCase, Client, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 from django.urls import reverse
-from .models import Project
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db.models import Sum
+from django.utils import timezone
+from .models import Project, Job, OutboundEmail, SiteSettings, PageVisit, PageVisitDaily, PageVisitHourly
+from . import jobs, outbox, visits, rollups, settings_cache
+from . import utils
+from .checks import check_shared_cache
+from .utils import send_html_email
 
 class HomeViewTests(TestCase):
     def setUp(self):
@@ -30,3 +55,326 @@ class ProjectTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'core/project_detail.html')
         self.assertContains(response, 'Test Project')
+
+
+recorded = []
+
+
+@jobs.task('tests.record')
+def record_task(value):
+    recorded.append(value)
+
+
+@jobs.task('tests.explode')
+def explode_task():
+    raise ValueError('boom')
+
+
+class JobQueueTests(TestCase):
+    def test_enqueued_job_runs_once(self):
+        recorded.clear()
+        job = jobs.enqueue('tests.record', value=42)
+        self.assertEqual(jobs.run_pending(), (1, 0))
+        self.assertEqual(jobs.run_pending(), (0, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual(recorded, [42])
+
+    def test_claim_is_exclusive(self):
+        jobs.enqueue('tests.record', value=1)
+        self.assertIsNotNone(jobs.claim_next('worker-a'))
+        self.assertIsNone(jobs.claim_next('worker-b'))
+
+    def test_failed_job_backs_off_then_gives_up(self):
+        job = jobs.enqueue(explode_task, max_attempts=2)
+        self.assertEqual(jobs.run_pending(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_PENDING)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now() - timedelta(seconds=1))
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = jobs.enqueue('tests.record', value=1)
+        jobs.claim_next('crashed-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=jobs.STALE_LOCK_SECONDS + 1))
+        self.assertEqual(jobs.claim_next('worker-b').pk, job.pk)
+
+    def test_prune_jobs_keeps_recent_and_failed(self):
+        old = timezone.now() - timedelta(days=8)
+        done_old = Job.objects.create(task='tests.record', status=Job.STATUS_DONE)
+        failed_old = Job.objects.create(task='tests.record', status=Job.STATUS_FAILED)
+        done_new = Job.objects.create(task='tests.record', status=Job.STATUS_DONE)
+        Job.objects.filter(pk__in=[done_old.pk, failed_old.pk]).update(updated_at=old)
+        sent_old = OutboundEmail.objects.create(from_email='a@example.com', status=OutboundEmail.STATUS_SENT, sent_at=old)
+        call_command('prune_jobs', days=7, stdout=io.StringIO())
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {failed_old.pk, done_new.pk})
+        self.assertFalse(OutboundEmail.objects.filter(pk=sent_old.pk).exists())
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def __init__(self, fail_with=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_with = fail_with
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if self.fail_with:
+            raise self.fail_with
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def queue(self, count=1):
+        for i in range(count):
+            send_html_email(
+                subject=f'Hello {i}',
+                template_name='emails/admin_new_student.html',
+                context={'dashboard_url': 'https://example.com/'},
+                recipient_list=[f'user{i}@example.com'],
+            )
+
+    def test_send_html_email_queues_instead_of_sending(self):
+        self.queue()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.STATUS_QUEUED).count(), 1)
+
+    def test_drain_sends_batch_over_one_connection(self):
+        self.queue(5)
+        CountingBackend.opened = 0
+        stats = outbox.drain_outbox(batch_size=2, connection=CountingBackend())
+        self.assertEqual(stats.sent, 5)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn(b'Subject: Hello 0', mail.outbox[0].message().as_bytes())
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT).exists())
+        self.assertFalse(OutboundEmail.objects.exclude(message=b'').exists())
+
+    def test_temporary_failure_is_retried_later(self):
+        self.queue()
+        stats = outbox.drain_outbox(connection=CountingBackend(fail_with=smtplib.SMTPDataError(451, 'try later')))
+        self.assertEqual(stats.retried, 1)
+        message = OutboundEmail.objects.get()
+        self.assertEqual(message.status, OutboundEmail.STATUS_QUEUED)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertEqual(outbox.drain_outbox(connection=CountingBackend()).sent, 0)
+
+    def test_permanent_failure_is_dead_lettered(self):
+        self.queue()
+        stats = outbox.drain_outbox(connection=CountingBackend(fail_with=smtplib.SMTPDataError(550, 'no such user')))
+        self.assertEqual(stats.dead, 1)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_DEAD)
+
+
+MEDIA_DIR = tempfile.mkdtemp(prefix='core-media-')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_DIR)
+class EmailBrandingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_DIR, ignore_errors=True)
+
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4), (0, 102, 255)).save(buffer, format='PNG')
+        SiteSettings.objects.create(logo=SimpleUploadedFile('logo.png', buffer.getvalue(), content_type='image/png'))
+        utils.invalidate_email_branding()
+
+    def send(self):
+        send_html_email(
+            subject='Hello',
+            template_name='emails/admin_new_student.html',
+            context={'dashboard_url': 'https://example.com/'},
+            recipient_list=['user@example.com'],
+        )
+
+    def test_branding_loaded_once(self):
+        self.send()
+        # Only the outbox INSERT: no settings query, no logo read
+        with self.assertNumQueries(1):
+            self.send()
+        first, second = OutboundEmail.objects.all()
+        cid = utils.get_email_branding().logo_cid
+        self.assertIn(cid.encode(), bytes(first.message))
+        self.assertIn(cid.encode(), bytes(second.message))
+
+    def test_saving_settings_invalidates_branding(self):
+        branding = utils.get_email_branding()
+        settings = SiteSettings.objects.get()
+        settings.site_name = 'Renamed'
+        settings.save()
+        self.assertEqual(utils.get_email_branding().site_settings.site_name, 'Renamed')
+        self.assertIsNot(branding, utils.get_email_branding())
+
+
+class PageVisitBufferTests(TestCase):
+    def setUp(self):
+        visits.visit_buffer.flush(blocking=True)
+
+    def test_visits_are_buffered_then_bulk_written(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(PageVisit.objects.count(), 0)
+        self.assertEqual(visits.visit_buffer.flush(), 2)
+        self.assertEqual(PageVisit.objects.filter(page_url=reverse('home')).count(), 2)
+        today = timezone.localdate()
+        self.assertEqual(PageVisitDaily.objects.get(day=today, page_url=reverse('home')).visits, 2)
+        self.assertEqual(PageVisitDaily.objects.get(day=today, page_url='').visits, 2)
+
+    def test_visit_time_is_record_time(self):
+        buffer = visits.VisitBuffer()
+        earlier = timezone.now() - timedelta(minutes=5)
+        buffer.record('/about/', visited_at=earlier)
+        buffer.flush()
+        self.assertEqual(PageVisit.objects.get().visited_at, earlier)
+
+    def test_full_buffer_drops_and_counts(self):
+        buffer = visits.VisitBuffer(max_size=2, flush_size=2)
+        for _ in range(3):
+            buffer.record('/')
+        self.assertTrue(buffer.is_due())
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.stats()['written'], 2)
+
+
+class PageVisitRollupTests(TestCase):
+    def test_increments_accumulate(self):
+        when = timezone.now()
+        rollups.record_visit_rollups([(when, '/a/'), (when, '/b/')])
+        rollups.record_visit_rollups([(when, '/a/')])
+        day = timezone.localdate(when)
+        self.assertEqual(PageVisitDaily.objects.get(day=day, page_url='/a/').visits, 2)
+        self.assertEqual(PageVisitDaily.objects.get(day=day, page_url='').visits, 3)
+        self.assertEqual(PageVisitHourly.objects.get(page_url='').visits, 3)
+
+    def test_backfill_matches_incremental(self):
+        now = timezone.now()
+        raw = [PageVisit(page_url=url, visited_at=now - timedelta(days=days, hours=hours))
+               for url, days, hours in [('/a/', 0, 0), ('/a/', 1, 2), ('/b/', 1, 3), ('/a/', 3, 0)]]
+        PageVisit.objects.bulk_create(raw)
+        rollups.record_visit_rollups(raw)
+        incremental = sorted(PageVisitDaily.objects.values_list('day', 'page_url', 'visits'))
+        hourly = sorted(PageVisitHourly.objects.values_list('hour', 'page_url', 'visits'))
+
+        out = io.StringIO()
+        call_command('backfill_visit_rollups', stdout=out)
+        self.assertIn('Rolled up 4 visits', out.getvalue())
+        self.assertEqual(sorted(PageVisitDaily.objects.values_list('day', 'page_url', 'visits')), incremental)
+        self.assertEqual(sorted(PageVisitHourly.objects.values_list('hour', 'page_url', 'visits')), hourly)
+
+    def test_flush_during_backfill_is_not_lost(self):
+        PageVisit.objects.create(page_url='/a/', visited_at=timezone.now())
+        rollups.record_visit_rollups(PageVisit.objects.all())
+        buffer = visits.VisitBuffer()
+        buffer.record('/a/')
+        real_atomic = rollups.transaction.atomic
+
+        def flush_then_atomic(*args, **kwargs):
+            # A concurrent flush lands just as the rebuild takes the write lock
+            buffer.flush()
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch.object(rollups.transaction, 'atomic', side_effect=flush_then_atomic):
+            rollups.rebuild_visit_rollups()
+        self.assertEqual(PageVisit.objects.count(), 2)
+        self.assertEqual(PageVisitDaily.objects.get(day=timezone.localdate(), page_url='').visits, 2)
+        self.assertEqual(PageVisitHourly.objects.filter(page_url='').aggregate(n=Sum('visits'))['n'], 2)
+
+    def test_dashboard_reads_rollups(self):
+        cache.clear()
+        staff = get_user_model().objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+        rollups.record_visit_rollups([(timezone.now(), '/')] * 3)
+        for trend in ('hourly', 'daily', 'weekly', 'monthly', 'yearly'):
+            response = self.client.get(reverse('admin_dashboard'), {'trend_type': trend})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sum(response.context['visit_trend_values']), 3, trend)
+
+
+class PageVisitRetentionTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+
+    def test_prune_compacts_archives_and_deletes(self):
+        now = timezone.now()
+        old = [PageVisit(page_url=url, visited_at=now - timedelta(days=days))
+               for url, days in [('/a/', 120), ('/a/', 120), ('/b/', 100)]]
+        recent = PageVisit(page_url='/a/', visited_at=now - timedelta(days=2))
+        PageVisit.objects.bulk_create(old + [recent])
+
+        out = io.StringIO()
+        call_command('prune_page_visits', days=90, archive_dir=self.archive_dir, chunk_size=2, pause=0, stdout=out)
+        self.assertIn('Pruned 3 visits', out.getvalue())
+        self.assertEqual(list(PageVisit.objects.values_list('visited_at', flat=True)), [recent.visited_at])
+
+        # The pruned days are still in the rollups
+        old_day = timezone.localdate(now - timedelta(days=120))
+        self.assertEqual(PageVisitDaily.objects.get(day=old_day, page_url='/a/').visits, 2)
+        self.assertEqual(PageVisitDaily.objects.filter(page_url='').aggregate(n=Sum('visits'))['n'], 3)
+
+        archives = os.listdir(self.archive_dir)
+        self.assertEqual(len(archives), 1)
+        with gzip.open(os.path.join(self.archive_dir, archives[0]), 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(sorted(row['page_url'] for row in rows), ['/a/', '/a/', '/b/'])
+
+    def test_dry_run_keeps_everything(self):
+        PageVisit.objects.create(page_url='/a/', visited_at=timezone.now() - timedelta(days=200))
+        out = io.StringIO()
+        call_command('prune_page_visits', dry_run=True, stdout=out)
+        self.assertIn('1 visits', out.getvalue())
+        self.assertEqual(PageVisit.objects.count(), 1)
+        self.assertFalse(PageVisitDaily.objects.exists())
+
+
+def invalidate_in_other_process(code):
+    """Runs `code` in a fresh Python process on this project's settings and cache."""
+    script = 'import django\ndjango.setup()\n' + code
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'))
+    subprocess.run([sys.executable, '-c', script], cwd=django_settings.BASE_DIR, env=env, check=True, timeout=60)
+
+
+class SettingsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_context_processor_settings_are_cached(self):
+        SiteSettings.objects.create(site_name='Cached')
+        self.client.get(reverse('home'))
+        self.assertEqual(settings_cache.get_site_settings().site_name, 'Cached')
+        with self.assertNumQueries(0):
+            settings_cache.get_site_settings()
+            settings_cache.get_company_stats()
+
+    def test_version_bump_reloads_in_other_processes(self):
+        site = SiteSettings.objects.create(site_name='Before')
+        self.assertEqual(settings_cache.get_site_settings().site_name, 'Before')
+        # Another process saves: the row changes in the database without touching
+        # this process, and that process invalidates through the shared cache
+        SiteSettings.objects.filter(pk=site.pk).update(site_name='After')
+        self.assertEqual(settings_cache.get_site_settings().site_name, 'Before')
+        invalidate_in_other_process(
+            'from core.models import SiteSettings\n'
+            'from core.settings_cache import invalidate_cached_singleton\n'
+            'invalidate_cached_singleton(SiteSettings)\n'
+        )
+        self.assertEqual(settings_cache.get_site_settings().site_name, 'After')
+
+    def test_configured_cache_is_shared(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([w.id for w in check_shared_cache(None)], ['core.W001'])
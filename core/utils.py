@@ -1,52 +1,95 @@
-import os
-import uuid
+import hashlib
+from collections import namedtuple
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
-from .models import SiteSettings
+from .settings_cache import get_site_settings
+from .outbox import outbox_enabled, queue_email
 from email.mime.image import MIMEImage
 
-def send_html_email(subject, template_name, context, recipient_list, from_email=None, request=None, attachments=None, fail_silently=False):
+# Resolved email branding: the settings row, the logo and its prebuilt inline MIME part
+EmailBranding = namedtuple('EmailBranding', ['site_settings', 'updated_at', 'logo_field', 'logo_path', 'logo_cid', 'logo_mime'])
+
+# {'branding': EmailBranding}, rebuilt whenever the cached SiteSettings row changes
+_branding_cache = {}
+
+
+def _build_email_branding(site_settings):
+    logo_field = logo_path = logo_cid = logo_mime = None
+    if site_settings:
+        # Prefer main logo, then light, then dark
+        logo_field = site_settings.logo or site_settings.logo_light or site_settings.logo_dark
+        if logo_field:
+            try:
+                logo_path = logo_field.path
+                with open(logo_path, 'rb') as f:
+                    logo_data = f.read()
+                # Named after the content so a new logo never reuses a cached CID
+                logo_cid = f'brand_logo_{hashlib.sha1(logo_data).hexdigest()[:8]}'
+                logo_mime = MIMEImage(logo_data)
+                logo_mime.add_header('Content-ID', f'<{logo_cid}>')
+                logo_mime.add_header('Content-Disposition', 'inline', filename='logo.png')
+            except Exception as e:
+                print(f"Error attaching logo to email: {e}")
+                logo_path = logo_cid = logo_mime = None
+    updated_at = site_settings.updated_at if site_settings else None
+    return EmailBranding(site_settings, updated_at, logo_field, logo_path, logo_cid, logo_mime)
+
+
+def get_email_branding():
+    """
+    Returns the cached EmailBranding. The settings row comes from the shared
+    settings cache (core.settings_cache); the logo is only read again once that
+    hands out a different row, i.e. after SiteSettings was saved somewhere.
+    """
+    site_settings = get_site_settings()
+    branding = _branding_cache.get('branding')
+    if branding is not None and branding.site_settings is site_settings:
+        return branding
+    branding = _build_email_branding(site_settings)
+    _branding_cache['branding'] = branding
+    return branding
+
+
+def invalidate_email_branding(**kwargs):
+    _branding_cache.clear()
+
+
+def get_base_url(request):
+    """Site root for absolute links in emails sent outside the request, e.g. https://techohr.com"""
+    return request.build_absolute_uri('/')[:-1]
+
+
+def send_html_email(subject, template_name, context, recipient_list, from_email=None, request=None, attachments=None, fail_silently=False, base_url=None):
     """
     Sends an HTML email with the brand logo embedded as a CID attachment.
     This ensures the logo is visible even on localhost or offline.
     
     attachments: List of tuples (filename, content, mimetype)
+    base_url: Site root such as "https://techohr.com", used for the logo URL
+        fallback when there is no request (background jobs).
     """
     if from_email is None:
         from_email = settings.DEFAULT_FROM_EMAIL
 
-    # Get Site Settings
-    site_settings = SiteSettings.objects.first()
+    # Site settings and logo come from the branding cache
+    branding = get_email_branding()
+    site_settings = branding.site_settings
     context['site_settings'] = site_settings
-    
-    # Determine Logo Logic
-    logo_path = None
-    logo_cid = None
-    # Use a unique ID to prevent caching issues
-    logo_content_id = f'brand_logo_{uuid.uuid4().hex[:8]}'
-    
-    if site_settings:
-        # Prefer main logo, then light, then dark
-        logo_field = site_settings.logo or site_settings.logo_light or site_settings.logo_dark
-        if logo_field:
-            try:
-                logo_path = logo_field.path
-                if os.path.exists(logo_path):
-                    logo_cid = logo_content_id
-            except Exception:
-                pass
-    
+    logo_cid = branding.logo_cid
+
     # Always try to generate absolute URL as fallback (though template prefers CID)
-    if request:
+    if request and not base_url:
         try:
             base_url = request.build_absolute_uri('/')[:-1]
-            if site_settings:
-                # Use the same field logic as CID
-                logo_field_url = site_settings.logo or site_settings.logo_light or site_settings.logo_dark
-                if logo_field_url:
-                    context['logo_url'] = f"{base_url}{logo_field_url.url}"
+        except Exception:
+            pass
+    if base_url:
+        try:
+            base_url = base_url.rstrip('/')
+            if branding.logo_field:
+                context['logo_url'] = f"{base_url}{branding.logo_field.url}"
         except Exception:
             pass
 
@@ -67,18 +110,9 @@ def send_html_email(subject, template_name, context, recipient_list, from_email=
     )
     email.attach_alternative(html_content, "text/html")
 
-    # Attach Logo File
-    if logo_path and logo_cid:
-        try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            
-            logo = MIMEImage(logo_data)
-            logo.add_header('Content-ID', f'<{logo_cid}>')
-            logo.add_header('Content-Disposition', 'inline', filename='logo.png')
-            email.attach(logo)
-        except Exception as e:
-            print(f"Error attaching logo to email: {e}")
+    # Attach the prebuilt logo part; it is shared, never modified
+    if branding.logo_mime is not None:
+        email.attach(branding.logo_mime)
 
     # Attach other files
     if attachments:
@@ -86,5 +120,8 @@ def send_html_email(subject, template_name, context, recipient_list, from_email=
             # Expecting (filename, content, mimetype)
             email.attach(*attachment)
 
-    # Send
+    # Queue for the outbox sender, which delivers over one shared connection
+    if outbox_enabled():
+        queue_email(email)
+        return 1
     return email.send(fail_silently=fail_silently)
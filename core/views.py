@@ -1,7 +1,7 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Service, Project, Testimonial, Contact, Newsletter
 from blog.models import Post
-from courses.models import Course, Enrollment
+from courses.models import Course
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 from users.decorators import staff_required
@@ -11,7 +11,7 @@ from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 from django.urls import reverse
-from .utils import send_html_email
+from .utils import send_html_email, invalidate_email_branding
 
 def home(request):
     services = Service.objects.all()[:6] # Increased to 6 for the grid
@@ -20,12 +20,8 @@ def home(request):
     latest_posts = Post.objects.filter(status='published').order_by('-published_at')[:4]
     
     # Featured/Latest Courses
-    courses = Course.objects.filter(is_published=True).order_by('-created_at')[:3]
-    
-    # Check enrollment status for each course if user is authenticated
-    if request.user.is_authenticated:
-        for course in courses:
-            course.is_enrolled = Enrollment.objects.filter(student=request.user, course=course).exists()
+    # Card data (counts, duration, enrollment status) is annotated on the same query
+    courses = Course.objects.filter(is_published=True).for_catalogue(request.user).order_by('-created_at')[:3]
     
     return render(request, 'core/home.html', {
         'services': services,
@@ -236,6 +232,7 @@ def manage_settings(request):
                 obj.favicon = None
             obj.save()
             stats_form.save()
+            invalidate_email_branding()
             messages.success(request, 'Settings updated successfully!')
             return redirect('manage_settings')
     else:
@@ -0,0 +1,140 @@
+"""
+Buffered page-visit logging.
+
+The middleware only appends to an in-process queue; visits are written with
+one bulk_create (plus the rollup increments, see core.rollups) once PAGE_VISIT_FLUSH_SIZE have piled up or
+PAGE_VISIT_FLUSH_INTERVAL seconds have passed. The flush runs from the
+request_finished signal, i.e. after the response has gone out, and once more
+at interpreter exit. The queue is bounded (PAGE_VISIT_BUFFER_SIZE): when the
+database can't keep up, new visits are dropped and counted rather than
+piling up in memory.
+"""
+import atexit
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import connections, router, transaction
+from .models import PageVisit
+from .rollups import record_visit_rollups
+
+
+class VisitBuffer:
+    def __init__(self, max_size=10000, flush_size=100, flush_interval=10.0):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.database = None
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _count(self, field, n=1):
+        with self._stats_lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def _database_name(self):
+        return connections[router.db_for_write(PageVisit)].settings_dict['NAME']
+
+    def record(self, page_url, user_id=None, visited_at=None):
+        if self.database is None:
+            self.database = self._database_name()
+        visit = PageVisit(page_url=page_url[:255], user_id=user_id)
+        if visited_at is not None:
+            visit.visited_at = visited_at
+        try:
+            self.queue.put_nowait(visit)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('recorded')
+        return True
+
+    def is_due(self):
+        pending = self.queue.qsize()
+        if pending >= self.flush_size:
+            return True
+        return pending > 0 and time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self, blocking=False):
+        """Writes everything queued so far. Returns the number of visits written."""
+        # Only one thread flushes at a time; the others just keep serving requests
+        if not self._flush_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.last_flush = time.monotonic()
+            database, self.database = self.database, None
+            if not batch:
+                return 0
+            if database != self._database_name():
+                # Recorded against another database (e.g. a test database torn down before exit)
+                self._count('failed', len(batch))
+                return 0
+            try:
+                self._drop_missing_users(batch)
+                # Raw rows and the hourly/daily rollups move together
+                with transaction.atomic():
+                    PageVisit.objects.bulk_create(batch, batch_size=500)
+                    record_visit_rollups(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} page visits: {e}")
+                self._count('failed', len(batch))
+                return 0
+            self._count('written', len(batch))
+            return len(batch)
+        finally:
+            self._flush_lock.release()
+
+    def _drop_missing_users(self, batch):
+        # A user can be deleted between the request and the flush; keep the visit, anonymously
+        user_ids = {visit.user_id for visit in batch if visit.user_id is not None}
+        if not user_ids:
+            return
+        User = PageVisit._meta.get_field('user').related_model
+        existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        for visit in batch:
+            if visit.user_id is not None and visit.user_id not in existing:
+                visit.user_id = None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'pending': self.queue.qsize(),
+                'recorded': self.recorded,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+
+visit_buffer = VisitBuffer(
+    max_size=getattr(settings, 'PAGE_VISIT_BUFFER_SIZE', 10000),
+    flush_size=getattr(settings, 'PAGE_VISIT_FLUSH_SIZE', 100),
+    flush_interval=getattr(settings, 'PAGE_VISIT_FLUSH_INTERVAL', 10.0),
+)
+
+
+def flush_visits_if_due(**kwargs):
+    """request_finished receiver: flushes once a size or time threshold is reached."""
+    if visit_buffer.is_due():
+        visit_buffer.flush()
+
+
+def flush_visits_at_exit():
+    try:
+        visit_buffer.flush(blocking=True)
+    except Exception as e:
+        print(f"Error flushing page visits at shutdown: {e}")
+
+
+atexit.register(flush_visits_at_exit)
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from .models import Category, Course, Module, Lesson, Enrollment, Review, Certificate, LessonCompletion, CertificateSettings, Assessment, Question, Choice, Submission, StudentAnswer
-from .models import Payment, PaymentSettings
+from .models import Payment, PaymentPayload, PaymentSettings
+from .progress import complete_lessons, issue_completion_certificates
+from core.utils import get_base_url
 
 @admin.register(PaymentSettings)
 class PaymentSettingsAdmin(admin.ModelAdmin):
@@ -81,6 +83,14 @@ class CourseAdmin(admin.ModelAdmin):
 class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ('student', 'course', 'enrolled_at', 'get_progress')
     list_filter = ('course', 'enrolled_at', 'is_completed')
+    list_select_related = ('student', 'course')
+    actions = ['mark_complete']
+
+    @admin.action(description='Mark all lessons complete (issues certificates)')
+    def mark_complete(self, request, queryset):
+        completed = complete_lessons(queryset)
+        issued = issue_completion_certificates(completed, base_url=get_base_url(request))
+        self.message_user(request, f"{len(completed)} enrollment(s) completed, {issued} certificate(s) issued.")
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -98,8 +108,17 @@ class LessonCompletionAdmin(admin.ModelAdmin):
     list_display = ('enrollment', 'lesson', 'completed_at', 'is_completed')
     list_filter = ('is_completed', 'completed_at')
 
+class PaymentPayloadInline(admin.StackedInline):
+    model = PaymentPayload
+    can_delete = False
+    readonly_fields = ('data',)
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('user', 'course', 'reference', 'amount', 'status', 'paid_at')
     list_filter = ('status', 'course')
-    search_fields = ('reference', 'user__username', 'course__title')
+    list_select_related = ('user', 'course')
+    # Case-sensitive prefix/exact lookups the indexes can serve; '^' and '='
+    # would be istartswith/iexact, which SQLite runs as LIKE scans
+    search_fields = ('reference__prefix', 'user__username__exact', 'user__email__exact')
+    inlines = [PaymentPayloadInline]
@@ -4,3 +4,22 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "courses"
+
+    def ready(self):
+        # Payment keys and the certificate design are read through the settings cache
+        from core.settings_cache import connect_singleton_signals
+        from .models import PaymentSettings, CertificateSettings
+        connect_singleton_signals(PaymentSettings)
+        connect_singleton_signals(CertificateSettings)
+
+        # Stored lesson counts and enrollment progress
+        from django.db.models.signals import pre_save, post_save, post_delete
+        from .models import Lesson, Module, LessonCompletion
+        from . import progress
+        pre_save.connect(progress.remember_lesson_course, sender=Lesson, dispatch_uid='progress_lesson_pre_save')
+        post_save.connect(progress.lesson_saved, sender=Lesson, dispatch_uid='progress_lesson_save')
+        post_delete.connect(progress.lesson_deleted, sender=Lesson, dispatch_uid='progress_lesson_delete')
+        pre_save.connect(progress.remember_module_course, sender=Module, dispatch_uid='progress_module_pre_save')
+        post_save.connect(progress.module_saved, sender=Module, dispatch_uid='progress_module_save')
+        post_save.connect(progress.completion_changed, sender=LessonCompletion, dispatch_uid='progress_completion_save')
+        post_delete.connect(progress.completion_changed, sender=LessonCompletion, dispatch_uid='progress_completion_delete')
@@ -0,0 +1,632 @@
+"""
+Certificate rendering engine.
+
+A certificate design (CertificateSettings) is compiled once into a
+CertificateTemplate: cached background, resolved colours and font families,
+image placements and every fixed text position. Rendering a certificate then
+only stamps the per-student fields (name, course, date, instructor, barcode).
+"""
+import io
+import os
+import copy
+import hashlib
+import uuid
+from collections import namedtuple
+from PIL import Image, ImageDraw
+from fpdf import FPDF
+from fontTools import ttLib
+from django.conf import settings as django_settings
+from .models import CertificateSettings
+
+try:
+    # fpdf2 internals behind the shared-asset fast path (fpdf2 2.8.x, see
+    # requirements.txt); without them every document uses add_font()/image()
+    from fpdf.fonts import SubsetMap
+    from fpdf.image_datastructures import ImageCache
+    from fpdf.image_parsing import preload_image
+except ImportError:
+    SubsetMap = ImageCache = preload_image = None
+
+try:
+    import barcode
+    from barcode.writer import ImageWriter
+except ImportError:
+    barcode = None
+
+# Background canvas (A4 @ 96 DPI is approx 1123x794, 2000x1414 gives good print quality)
+CERTIFICATE_BG_SIZE = (2000, 1414)
+BORDER_DARK_BLUE = (25, 55, 90)
+BORDER_LIGHT_BLUE = (100, 180, 255)
+
+# Watermark: faint logo tiles, 150px wide at 8% opacity
+WATERMARK_LOGO_WIDTH = 150
+WATERMARK_OPACITY = 0.08
+WATERMARK_MODE_STAGGERED = 'staggered'
+WATERMARK_MODE_DIAGONAL = 'diagonal'
+
+# In-memory background cache: {cache_key: png_path}
+_background_cache = {}
+# Logo hash memo: {(path, mtime, size): sha1}
+_logo_hash_cache = {}
+
+
+def get_watermark_mode():
+    return getattr(django_settings, 'CERTIFICATE_WATERMARK_MODE', WATERMARK_MODE_STAGGERED)
+
+
+def get_certificate_cache_dir():
+    cache_dir = getattr(django_settings, 'CERTIFICATE_CACHE_DIR', None)
+    if not cache_dir:
+        cache_dir = os.path.join(django_settings.MEDIA_ROOT, 'certificates', 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _file_hash(path):
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _logo_hash_cache.get(memo_key)
+    if digest is None:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        _logo_hash_cache[memo_key] = digest
+    return digest
+
+
+def get_certificate_background_key(settings):
+    """
+    Version key for the rendered background: changes whenever the settings row is
+    saved (updated_at) or the logo file itself changes.
+    """
+    if not settings:
+        return 'default'
+    logo_hash = 'nologo'
+    if settings.logo:
+        try:
+            logo_hash = _file_hash(settings.logo.path)[:12]
+        except Exception:
+            logo_hash = 'missing'
+    revision = settings.updated_at.strftime('%Y%m%d%H%M%S%f') if settings.updated_at else 'new'
+    return f"{settings.pk or 0}-{revision}-{logo_hash}-{get_watermark_mode()}"
+
+
+def prepare_watermark_logo(logo_path, width=WATERMARK_LOGO_WIDTH, opacity=WATERMARK_OPACITY):
+    """Loads the logo, scales it to the tile width and fades its alpha channel."""
+    logo = Image.open(logo_path).convert('RGBA')
+    aspect = logo.height / logo.width
+    logo_h = max(int(width * aspect), 1)
+    resampling_attr = getattr(Image, 'Resampling', None)
+    resample_filter = resampling_attr.LANCZOS if resampling_attr else getattr(Image, 'LANCZOS', Image.ANTIALIAS)
+    logo = logo.resize((width, logo_h), resample_filter)
+
+    # Scale alpha through a lookup table (one pass over the channel)
+    alpha = logo.getchannel('A').point([int(p * opacity) for p in range(256)])
+    logo.putalpha(alpha)
+    return logo
+
+
+def build_watermark_pattern(logo, mode=WATERMARK_MODE_STAGGERED, fill=(255, 255, 255, 255)):
+    """
+    Builds one period of the tiled watermark and composites it onto the page
+    colour once. The canvas underneath is a flat colour, so repeating this
+    opaque tile gives the same pixels as compositing every logo individually.
+
+    staggered: every other row shifted by half a tile (brick pattern).
+    diagonal: each row shifted by a quarter tile more than the one above.
+    """
+    tile_w, tile_h = logo.size
+    if mode == WATERMARK_MODE_DIAGONAL:
+        rows, step = 4, tile_w // 4
+    else:
+        rows, step = 2, tile_w // 2
+
+    # Shifted copies wrap around the tile edge. Tiles touch but never
+    # overlap, so paste is equivalent to compositing at this stage.
+    layer = Image.new('RGBA', (tile_w, tile_h * rows), (0, 0, 0, 0))
+    for row in range(rows):
+        offset = (row * step) % tile_w
+        layer.paste(logo, (offset, row * tile_h))
+        if offset:
+            layer.paste(logo, (offset - tile_w, row * tile_h))
+
+    pattern = Image.new('RGBA', layer.size, fill)
+    pattern.alpha_composite(layer)
+    return pattern
+
+
+def tile_watermark(canvas, pattern):
+    """Covers the canvas with the opaque pattern using plain pastes (no blending)."""
+    for y in range(0, canvas.height, pattern.height):
+        for x in range(0, canvas.width, pattern.width):
+            canvas.paste(pattern, (x, y))
+
+
+def render_certificate_background(settings, size=CERTIFICATE_BG_SIZE, mode=None):
+    """
+    Draws the watermark, borders and corners. Returns an RGBA PIL image.
+    Dimensions are laid out for 2000px wide and scaled for other sizes.
+    """
+    bg_width, bg_height = size
+    scale = bg_width / CERTIFICATE_BG_SIZE[0]
+    DARK_BLUE = BORDER_DARK_BLUE
+    LIGHT_BLUE = BORDER_LIGHT_BLUE
+
+    # 1. Create White Canvas
+    background = Image.new('RGBA', (bg_width, bg_height), (255, 255, 255, 255))
+
+    # 2. Tile Faint Logo
+    if settings and settings.logo:
+        try:
+            logo = prepare_watermark_logo(settings.logo.path, width=max(int(WATERMARK_LOGO_WIDTH * scale), 1))
+            pattern = build_watermark_pattern(logo, mode or get_watermark_mode())
+            tile_watermark(background, pattern)
+        except Exception as e:
+            print(f"Error processing watermark logo: {e}")
+
+    # 3. Draw Borders and Corners (Programmatically)
+    try:
+        draw = ImageDraw.Draw(background)
+
+        # Dimensions
+        margin = int(50 * scale)
+        outer_border_width = int(20 * scale)
+        gap = int(5 * scale)
+        inner_border_width = int(8 * scale)
+
+        # Outer Border (Dark Blue)
+        # Note: In PIL, width draws inside the bounding box
+        draw.rectangle(
+            [margin, margin, bg_width - margin, bg_height - margin],
+            outline=DARK_BLUE,
+            width=outer_border_width
+        )
+
+        # Inner Border (Light Blue)
+        inner_offset = margin + outer_border_width + gap
+        draw.rectangle(
+            [inner_offset, inner_offset, bg_width - inner_offset, bg_height - inner_offset],
+            outline=LIGHT_BLUE,
+            width=inner_border_width
+        )
+
+        # Corner Graphics (Decorative L-shapes)
+        corner_length = int(200 * scale)
+        corner_width = int(25 * scale)
+        corner_offset = margin - int(15 * scale)
+
+        # Helper to draw thick lines
+        def draw_corner(start, end, width, color):
+            draw.line([start, end], fill=color, width=width)
+
+        # Top-Left
+        draw_corner((corner_offset, corner_offset), (corner_offset + corner_length, corner_offset), corner_width, DARK_BLUE)
+        draw_corner((corner_offset, corner_offset), (corner_offset, corner_offset + corner_length), corner_width, DARK_BLUE)
+
+        # Top-Right
+        draw_corner((bg_width - corner_offset - corner_length, corner_offset), (bg_width - corner_offset, corner_offset), corner_width, DARK_BLUE)
+        draw_corner((bg_width - corner_offset, corner_offset), (bg_width - corner_offset, corner_offset + corner_length), corner_width, DARK_BLUE)
+
+        # Bottom-Left
+        draw_corner((corner_offset, bg_height - corner_offset), (corner_offset + corner_length, bg_height - corner_offset), corner_width, DARK_BLUE)
+        draw_corner((corner_offset, bg_height - corner_offset - corner_length), (corner_offset, bg_height - corner_offset), corner_width, DARK_BLUE)
+
+        # Bottom-Right
+        draw_corner((bg_width - corner_offset - corner_length, bg_height - corner_offset), (bg_width - corner_offset, bg_height - corner_offset), corner_width, DARK_BLUE)
+        draw_corner((bg_width - corner_offset, bg_height - corner_offset - corner_length), (bg_width - corner_offset, bg_height - corner_offset), corner_width, DARK_BLUE)
+
+    except Exception as e:
+        print(f"Error drawing borders: {e}")
+
+    return background
+
+
+def get_certificate_background_path(settings, rebuild=False):
+    """
+    Returns the path of the rendered background PNG for the current settings
+    revision, rendering it only if no cached copy exists (in memory or on disk).
+    """
+    key = get_certificate_background_key(settings)
+    path = _background_cache.get(key)
+    if path and not rebuild and os.path.exists(path):
+        return path
+
+    try:
+        path = os.path.join(get_certificate_cache_dir(), f"background_{key}.png")
+        if rebuild or not os.path.exists(path):
+            background = render_certificate_background(settings)
+            # Write atomically so concurrent workers never read a half-written PNG
+            tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            background.save(tmp_path, format='PNG')
+            os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error creating dynamic background: {e}")
+        return None
+
+    _background_cache.clear()
+    _background_cache[key] = path
+    return path
+
+
+def refresh_certificate_background(settings):
+    """
+    Called after the certificate design is saved: renders the background for the
+    new revision and removes the files of previous revisions.
+    """
+    path = get_certificate_background_path(settings, rebuild=True)
+    try:
+        cache_dir = get_certificate_cache_dir()
+        for name in os.listdir(cache_dir):
+            stale = os.path.join(cache_dir, name)
+            if name.startswith('background_') and stale != path:
+                os.remove(stale)
+    except Exception as e:
+        print(f"Error cleaning certificate background cache: {e}")
+    return path
+
+
+# --- Asset registry ---
+
+FONT_DIR_PARTS = ('static', 'fonts')
+SEAL_PATH_PARTS = ('static', 'images', 'gold_seal.png')
+
+# Parsed fonts, shared by every document in the process: {path: (mtime_ns, font_bytes, prototype)}
+_font_registry = {}
+# TTFFont attributes attach_font() copies or resets; a prototype missing any
+# of them comes from an fpdf2 we don't know, so it takes the add_font() path
+PROTOTYPE_ATTRS = ('i', 'fontkey', 'ttfont', 'desc', 'is_cff', 'missing_glyphs', 'biggest_size_pt', 'subset', '_hbfont')
+
+
+def _read_bytes(path, label):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except (OSError, ValueError) as e:
+        print(f"Error loading {label}: {e}")
+        return None
+
+
+def get_font_prototype(family, style, path):
+    """
+    Parses a TTF once per process and returns (font_bytes, prototype), where the
+    prototype is an FPDF TTFFont whose metrics can be shared across documents.
+    The prototype is None when the font needs the full add_font() path.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    entry = _font_registry.get(path)
+    if entry is None or entry[0] != mtime:
+        data = _read_bytes(path, 'font')
+        scratch = FPDF()
+        scratch.add_font(family, style, path)
+        prototype = next(iter(scratch.fonts.values()))
+        # Fonts patched at load time (no .notdef glyph) or CID-keyed CFF fonts
+        # carry state we can't rebuild from the raw bytes
+        if SubsetMap is None or not all(hasattr(prototype, attr) for attr in PROTOTYPE_ATTRS):
+            prototype = None
+        else:
+            glyf = prototype.ttfont['glyf'] if 'glyf' in prototype.ttfont else None
+            if prototype.is_cff or glyf is None or '.notdef' not in glyf:
+                prototype = None
+        entry = (mtime, data, prototype)
+        _font_registry[path] = entry
+    return entry[1], entry[2]
+
+
+def attach_font(pdf, family, style, path):
+    """
+    Adds a font to a document from the registry. Only the fontTools handle and
+    the subset map are per document, since output() subsets them in place;
+    widths, cmap and glyph ids come from the shared prototype.
+    """
+    data, prototype = get_font_prototype(family, style, path)
+    if prototype is None or data is None:
+        pdf.add_font(family, style, path)
+        return
+    try:
+        font = copy.copy(prototype)
+        font.i = len(pdf.fonts) + 1
+        font.ttfont = ttLib.TTFont(io.BytesIO(data), recalcTimestamp=False, lazy=True)
+        font.desc = copy.copy(prototype.desc)
+        font.missing_glyphs = []
+        font.biggest_size_pt = 0
+        font._hbfont = None
+        font.subset = SubsetMap(font)
+    except (AttributeError, TypeError) as e:
+        print(f"Font fast path unavailable, using add_font: {e}")
+        pdf.add_font(family, style, path)
+        return
+    pdf.fonts[font.fontkey] = font
+
+
+class CertificateAssets:
+    """
+    Fonts and images for one certificate design, loaded once per
+    CertificateSettings revision. Images are kept as bytes and pre-parsed into
+    an FPDF image cache, so documents reuse the compressed streams instead of
+    decoding and deflating the PNGs again.
+    """
+
+    def __init__(self, settings):
+        font_dir = os.path.join(django_settings.BASE_DIR, *FONT_DIR_PARTS)
+        self.font_files = []
+        self.fonts = {}
+        for role, (family, style, filename) in FONT_FILES.items():
+            path = os.path.join(font_dir, filename)
+            try:
+                get_font_prototype(family, style, path)
+                self.font_files.append((family, style, path))
+                self.fonts[role] = (family, style)
+            except Exception as e:
+                if os.path.exists(path):
+                    print(f"Font loading error: {e}")
+                # Fall back to core Helvetica
+                self.fonts[role] = ('Helvetica', 'B' if role == 'sans_bold' else '')
+
+        self.background = _read_bytes(get_certificate_background_path(settings), 'background')
+        self.logo = None
+        self.signature = None
+        if settings and settings.logo:
+            try:
+                self.logo = _read_bytes(settings.logo.path, 'logo')
+            except Exception as e:
+                print(f"Error loading logo: {e}")
+        if settings and settings.signature:
+            try:
+                self.signature = _read_bytes(settings.signature.path, 'signature')
+            except Exception as e:
+                print(f"Error loading signature: {e}")
+        seal_path = os.path.join(django_settings.BASE_DIR, *SEAL_PATH_PARTS)
+        self.seal = _read_bytes(seal_path, 'seal') if os.path.exists(seal_path) else None
+
+        self.image_cache = ImageCache() if ImageCache is not None else None
+        for label in ('background', 'logo', 'seal', 'signature'):
+            data = getattr(self, label)
+            if data is None or self.image_cache is None:
+                continue
+            try:
+                preload_image(self.image_cache, io.BytesIO(data))
+            except Exception as e:
+                print(f"Error loading {label}: {e}")
+                setattr(self, label, None)
+
+    def attach(self, pdf):
+        """Registers the fonts and pre-parsed images on a new document."""
+        for family, style, path in self.font_files:
+            try:
+                attach_font(pdf, family, style, path)
+            except Exception as e:
+                print(f"Font loading error: {e}")
+        if self.image_cache is None:
+            return
+        # Fresh info dicts per document: output() stores object ids on them
+        try:
+            for name, info in self.image_cache.images.items():
+                info = copy.copy(info)
+                info['usages'] = 0
+                pdf.image_cache.images[name] = info
+            pdf.image_cache.icc_profiles.update(self.image_cache.icc_profiles)
+        except AttributeError as e:
+            # image() still works, it just parses the images per document
+            print(f"Image cache fast path unavailable: {e}")
+
+    def image(self, pdf, label, **placement):
+        data = getattr(self, label)
+        if data is not None:
+            pdf.image(io.BytesIO(data), **placement)
+
+
+# --- Layout ---
+
+PAGE_WIDTH, PAGE_HEIGHT = 297, 210
+BOTTOM_Y = 165
+DEFAULT_COLOR = (25, 55, 90)   # Brightened Dark Blue
+
+# A text box on the page. x=None means a full-width centred cell at y.
+TextSlot = namedtuple('TextSlot', ['font', 'size', 'color', 'x', 'y', 'w', 'h'])
+
+STATIC_TEXT = [
+    ('Certificate of Completion', TextSlot('sans_bold', 42, 'primary', None, 50, 0, 15)),
+    ('THIS IS TO CERTIFY THAT', TextSlot('sans', 10, 'secondary', None, 67, 0, 10)),
+    ('HAS SUCCESSFULLY COMPLETED', TextSlot('sans_bold', 8, 'secondary', None, 105, 0, 10)),
+    ('DATE OF COMPLETION', TextSlot('sans_bold', 8, 'secondary', 40, BOTTOM_Y + 8, 60, 5)),
+    ('SIGNATURE', TextSlot('sans_bold', 8, 'secondary', 200, BOTTOM_Y + 8, 60, 5)),
+    ('INSTRUCTOR', TextSlot('sans', 8, 'secondary', 200, BOTTOM_Y + 18, 60, 5)),
+]
+
+VARIABLE_TEXT = {
+    'student_name': TextSlot('script', 48, 'primary', None, 80, 0, 20),
+    'course_title': TextSlot('sans', 24, 'primary', None, 120, 0, 15),
+    'issued_on': TextSlot('sans_bold', 12, 'secondary', 40, BOTTOM_Y, 60, 5),
+    'instructor_name': TextSlot('sans_bold', 10, 'secondary', 200, BOTTOM_Y + 13, 60, 5),
+}
+
+# Fixed lines: (x1, y1, x2, y2)
+STATIC_LINES = [
+    (40, BOTTOM_Y + 6, 100, BOTTOM_Y + 6),    # Date line
+    (200, BOTTOM_Y + 6, 260, BOTTOM_Y + 6),   # Signature line
+]
+
+NAME_LINE_Y = 100
+LOGO_BOX = (123.5, 10, 50)                  # x, y, w (x = (297-50)/2)
+SEAL_BOX = (133.5, BOTTOM_Y - 10, 30)       # Centred under the course title
+BARCODE_BOX = (123.5, BOTTOM_Y + 25, 50, 10)
+SIGNATURE_MAX = (50, 25)                    # Fits above the signature line, centred on x=230
+
+FONT_FILES = {
+    # role: (family, style, filename)
+    'script': ('GreatVibes', '', 'GreatVibes-Regular.ttf'),
+    'sans': ('Lato', '', 'Lato-Regular.ttf'),
+    'sans_bold': ('Lato', 'B', 'Lato-Bold.ttf'),
+}
+
+
+def hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+class CertificateTemplate:
+    """
+    A compiled certificate design. Built once per CertificateSettings revision
+    by get_certificate_template(); render() is the per-certificate hot path.
+    """
+
+    def __init__(self, settings):
+        self.key = get_certificate_background_key(settings)
+
+        # Colours
+        self.colors = {'primary': DEFAULT_COLOR, 'secondary': DEFAULT_COLOR, 'accent': DEFAULT_COLOR}
+        if settings:
+            for role in ('primary', 'secondary', 'accent'):
+                value = getattr(settings, f'{role}_color')
+                if value:
+                    try:
+                        self.colors[role] = hex_to_rgb(value)
+                    except ValueError:
+                        print(f"Invalid {role} colour on certificate settings: {value}")
+
+        # Fonts and images, loaded once and shared by every render
+        self.assets = CertificateAssets(settings)
+        self.fonts = self.assets.fonts
+        self.signature_box = self._compile_signature()
+
+        # Fixed text, pre-resolved to (text, family, style, size, rgb, x, y, w, h)
+        self.static_text = [self._resolve(slot, text) for text, slot in STATIC_TEXT]
+
+    def _resolve(self, slot, text):
+        family, style = self.fonts[slot.font]
+        return (text, family, style, slot.size, self.colors[slot.color], slot.x, slot.y, slot.w, slot.h)
+
+    def _compile_signature(self):
+        """Fits the signature into its box above the line once, instead of per render."""
+        if not self.assets.signature:
+            return None
+        try:
+            max_w, max_h = SIGNATURE_MAX
+            line_y = BOTTOM_Y + 6
+            with Image.open(io.BytesIO(self.assets.signature)) as sig_img:
+                img_w, img_h = sig_img.size
+            aspect = img_h / img_w
+
+            # Try fitting by width first, then by height if too tall
+            target_w = max_w
+            target_h = target_w * aspect
+            if target_h > max_h:
+                target_h = max_h
+                target_w = target_h / aspect
+
+            # Centre on the line (x=230) and sit 1 unit above it
+            return (230 - (target_w / 2), line_y - target_h - 1, target_w, target_h)
+        except Exception as e:
+            print(f"Error loading signature: {e}")
+            return None
+
+    def _draw_text(self, pdf, text, family, style, size, color, x, y, w, h):
+        pdf.set_font(family, style, size)
+        pdf.set_text_color(*color)
+        if x is None:
+            pdf.set_y(y)
+        else:
+            pdf.set_xy(x, y)
+        pdf.cell(w, h, text, align='C')
+
+    def _new_document(self):
+        pdf = FPDF(orientation='L', unit='mm', format='A4')
+        pdf.set_auto_page_break(auto=False)
+        self.assets.attach(pdf)
+        pdf.add_page()
+        return pdf
+
+    def _draw_static_layers(self, pdf):
+        try:
+            self.assets.image(pdf, 'background', x=0, y=0, w=PAGE_WIDTH, h=PAGE_HEIGHT)
+        except Exception as e:
+            print(f"Error loading background: {e}")
+        try:
+            x, y, w = LOGO_BOX
+            self.assets.image(pdf, 'logo', x=x, y=y, w=w)
+        except Exception as e:
+            print(f"Error loading logo: {e}")
+        x, y, w = SEAL_BOX
+        self.assets.image(pdf, 'seal', x=x, y=y, w=w)
+        if self.signature_box:
+            x, y, w, h = self.signature_box
+            try:
+                self.assets.image(pdf, 'signature', x=x, y=y, w=w, h=h)
+            except Exception as e:
+                print(f"Error loading signature: {e}")
+
+        for item in self.static_text:
+            self._draw_text(pdf, *item)
+
+        pdf.set_draw_color(*self.colors['accent'])
+        pdf.set_line_width(0.5)
+        for x1, y1, x2, y2 in STATIC_LINES:
+            pdf.line(x1, y1, x2, y2)
+
+    def render(self, certificate):
+        """Returns the PDF bytes for one certificate."""
+        pdf = self._new_document()
+        self._draw_static_layers(pdf)
+
+        student = certificate.student
+        instructor = certificate.course.instructor
+        fields = {
+            'student_name': student.get_full_name() or student.username,
+            'course_title': certificate.course.title.upper(),
+            'issued_on': certificate.issued_at.strftime('%B %d, %Y').upper(),
+            'instructor_name': instructor.get_full_name() or instructor.username,
+        }
+        for name, slot in VARIABLE_TEXT.items():
+            self._draw_text(pdf, *self._resolve(slot, fields[name]))
+
+        # Line under the name: at least 100 wide, 20 wider than the name
+        line_width = max(pdf.get_string_width(fields['student_name']) + 20, 100)
+        start_x = (PAGE_WIDTH - line_width) / 2
+        pdf.line(start_x, NAME_LINE_Y, start_x + line_width, NAME_LINE_Y)
+
+        self._draw_barcode(pdf, certificate.certificate_id)
+
+        pdf_bytes = pdf.output(dest='S')
+        if isinstance(pdf_bytes, str):
+            pdf_bytes = pdf_bytes.encode('latin-1')
+        return bytes(pdf_bytes)
+
+    def _draw_barcode(self, pdf, certificate_id):
+        if not barcode:
+            return
+        try:
+            options = {
+                'write_text': False,
+                'module_height': 5.0,
+                'quiet_zone': 1.0,
+                'font_size': 0,
+                'text_distance': 0,
+            }
+            code = barcode.get('code128', certificate_id, writer=ImageWriter())
+            # render() hands back the PIL image directly instead of writing a file
+            barcode_image = code.render(options)
+
+            x, y, w, h = BARCODE_BOX
+            pdf.image(barcode_image, x=x, y=y, w=w, h=h)
+        except Exception as e:
+            print(f"Barcode error: {e}")
+
+
+# Compiled template for the current design revision: {key: CertificateTemplate}
+_template_cache = {}
+
+
+def get_certificate_template(settings=None):
+    if settings is None:
+        settings = CertificateSettings.get_cached()
+    key = get_certificate_background_key(settings)
+    template = _template_cache.get(key)
+    if template is None:
+        template = CertificateTemplate(settings)
+        _template_cache.clear()
+        _template_cache[key] = template
+    return template
+
+
+def generate_certificate_pdf_bytes(certificate, settings=None):
+    return get_certificate_template(settings).render(certificate)
@@ -0,0 +1,225 @@
+"""
+A local stand-in for the Paystack API, for development and load testing.
+
+FakePaystack runs a threaded HTTP server that implements the parts of the
+API this app uses:
+
+    POST /transaction/initialize        -> authorization_url on this server
+    GET  /transaction/verify/<ref>      -> the transaction as Paystack reports it
+    GET  /checkout/<ref>                -> "the customer pays": settles the
+                                           transaction, sends the signed webhook
+                                           and redirects to the callback_url
+
+Latency, API failures (HTTP 500) and declined payments are injected at
+configurable rates. Point the app at it with PAYSTACK_API_BASE, e.g. via the
+fake_paystack management command, or start it in-process (tests, the
+paystack_load_test command):
+
+    with FakePaystack(secret_key='sk_test_x', latency=0.05) as fake:
+        ...  # fake.base_url
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse as urlparse
+import requests
+from django.utils import timezone
+
+
+class FakePaystack:
+    def __init__(self, secret_key, host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0,
+                 decline_rate=0.0, webhook_url=None, webhook_delay=0.0, seed=None):
+        self.secret_key = secret_key
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self.webhook_url = webhook_url
+        self.webhook_delay = webhook_delay
+        self.random = random.Random(seed)
+        self.transactions = {}
+        self.lock = threading.Lock()
+        self.stats = {'initialize': 0, 'verify': 0, 'checkout': 0, 'failures': 0, 'webhooks': 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Behaviour ---
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _should(self, rate):
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def initialize(self, payload):
+        reference = payload.get('reference') or f'fake_{uuid.uuid4().hex[:16]}'
+        with self.lock:
+            self.transactions[reference] = {
+                'id': len(self.transactions) + 1,
+                'reference': reference,
+                'amount': payload.get('amount') or 0,
+                'currency': payload.get('currency') or 'NGN',
+                'status': 'ongoing',
+                'gateway_response': 'Pending',
+                'paid_at': None,
+                'customer': {'email': payload.get('email')},
+                'metadata': payload.get('metadata') or {},
+                'callback_url': payload.get('callback_url') or '',
+            }
+        return {
+            'status': True,
+            'message': 'Authorization URL created',
+            'data': {
+                'authorization_url': f'{self.base_url}/checkout/{reference}',
+                'access_code': uuid.uuid4().hex[:12],
+                'reference': reference,
+            },
+        }
+
+    def pay(self, reference, success=None):
+        """Settles a transaction as the customer would. Returns it, or None if unknown."""
+        if success is None:
+            success = not self._should(self.decline_rate)
+        with self.lock:
+            transaction = self.transactions.get(reference)
+            if transaction is None:
+                return None
+            if transaction['status'] == 'ongoing':
+                transaction['status'] = 'success' if success else 'failed'
+                transaction['gateway_response'] = 'Successful' if success else 'Declined'
+                transaction['paid_at'] = timezone.now().isoformat() if success else None
+            return dict(transaction)
+
+    def transaction_data(self, reference):
+        with self.lock:
+            transaction = self.transactions.get(reference)
+            if transaction is None:
+                return None
+            return {k: v for k, v in transaction.items() if k != 'callback_url'}
+
+    def webhook(self, reference):
+        """(body, signature) of the charge.success event for a settled transaction."""
+        data = self.transaction_data(reference)
+        event = 'charge.success' if data and data['status'] == 'success' else 'charge.failed'
+        body = json.dumps({'event': event, 'data': data}).encode('utf-8')
+        signature = hmac.new(self.secret_key.encode('utf-8'), body, hashlib.sha512).hexdigest()
+        return body, signature
+
+    def deliver_webhook(self, reference):
+        if not self.webhook_url:
+            return
+        if self.webhook_delay:
+            time.sleep(self.webhook_delay)
+        body, signature = self.webhook(reference)
+        try:
+            requests.post(self.webhook_url, data=body, timeout=10, headers={
+                'Content-Type': 'application/json',
+                'X-Paystack-Signature': signature,
+            })
+            self._count('webhooks')
+        except requests.RequestException as e:
+            print(f"Fake Paystack: webhook for {reference} failed: {e}")
+
+    # --- HTTP ---
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload=None, headers=None):
+                body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if payload is not None:
+                    self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _api_preamble(self, endpoint):
+                fake._count(endpoint)
+                if fake.latency:
+                    time.sleep(fake.latency * fake.random.uniform(0.5, 1.5))
+                if self.headers.get('Authorization') != f'Bearer {fake.secret_key}':
+                    self._send(401, {'status': False, 'message': 'Invalid key'})
+                    return False
+                if fake._should(fake.failure_rate):
+                    fake._count('failures')
+                    self._send(500, {'status': False, 'message': 'Injected failure'})
+                    return False
+                return True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if self.path.rstrip('/') != '/transaction/initialize':
+                    return self._send(404, {'status': False, 'message': 'Not found'})
+                if not self._api_preamble('initialize'):
+                    return
+                try:
+                    payload = json.loads(raw or b'{}')
+                except ValueError:
+                    return self._send(400, {'status': False, 'message': 'Invalid JSON'})
+                if not payload.get('email') or not payload.get('amount'):
+                    return self._send(400, {'status': False, 'message': 'Email and amount are required'})
+                self._send(200, fake.initialize(payload))
+
+            def do_GET(self):
+                path = urlparse.urlparse(self.path).path
+                if path.startswith('/transaction/verify/'):
+                    if not self._api_preamble('verify'):
+                        return
+                    reference = urlparse.unquote(path.rsplit('/', 1)[-1])
+                    data = fake.transaction_data(reference)
+                    if data is None:
+                        return self._send(400, {'status': False, 'message': 'Transaction reference not found'})
+                    return self._send(200, {'status': True, 'message': 'Verification successful', 'data': data})
+                if path.startswith('/checkout/'):
+                    fake._count('checkout')
+                    reference = urlparse.unquote(path.rsplit('/', 1)[-1])
+                    transaction = fake.pay(reference)
+                    if transaction is None:
+                        return self._send(404, {'status': False, 'message': 'Unknown checkout'})
+                    threading.Thread(target=fake.deliver_webhook, args=(reference,), daemon=True).start()
+                    callback = transaction['callback_url']
+                    if not callback:
+                        return self._send(200, {'status': True, 'data': {'status': transaction['status']}})
+                    query = urlparse.urlencode({'trxref': reference, 'reference': reference})
+                    separator = '&' if '?' in callback else '?'
+                    return self._send(302, headers={'Location': f'{callback}{separator}{query}'})
+                self._send(404, {'status': False, 'message': 'Not found'})
+
+        return Handler
@@ -0,0 +1,86 @@
+import os
+import time
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from courses.models import Certificate, CertificateSettings
+from courses import certificates as engine
+
+# (label, size): current canvas, then A4 landscape at 300 and 600 DPI
+SIZES = [
+    ('current', engine.CERTIFICATE_BG_SIZE),
+    ('A4 300dpi', (3508, 2480)),
+    ('A4 600dpi', (7016, 4960)),
+]
+
+
+def _legacy_tiling(logo, size):
+    """The per-tile alpha_composite loop the renderer used before, kept as a baseline."""
+    background = Image.new('RGBA', size, (255, 255, 255, 255))
+    space_x, space_y = logo.size
+    for y in range(0, size[1], space_y):
+        for x in range(0, size[0], space_x):
+            offset = (space_x // 2) if (y // space_y) % 2 == 1 else 0
+            background.alpha_composite(logo, (x + offset, y))
+    return background
+
+
+def _single_pass(logo, size, mode):
+    background = Image.new('RGBA', size, (255, 255, 255, 255))
+    engine.tile_watermark(background, engine.build_watermark_pattern(logo, mode))
+    return background
+
+
+class Command(BaseCommand):
+    help = 'Times certificate background watermarking and full certificate renders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best time is reported)')
+        parser.add_argument('--logo', help='Logo to tile (default: certificate logo, else the gold seal)')
+        parser.add_argument('--renders', type=int, default=0, help='Also time N full renders of an existing certificate')
+
+    def _best(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        settings = CertificateSettings.get_cached()
+
+        logo_path = options['logo']
+        if not logo_path and settings and settings.logo and os.path.exists(settings.logo.path):
+            logo_path = settings.logo.path
+        if not logo_path:
+            logo_path = os.path.join(django_settings.BASE_DIR, 'static', 'images', 'gold_seal.png')
+        self.stdout.write(f'Watermark logo: {logo_path}')
+
+        self.stdout.write(f"{'size':<12}{'pixels':>14}{'legacy ms':>12}{'staggered ms':>15}{'diagonal ms':>14}")
+        for label, size in SIZES:
+            scale = size[0] / engine.CERTIFICATE_BG_SIZE[0]
+            logo = engine.prepare_watermark_logo(logo_path, width=max(int(engine.WATERMARK_LOGO_WIDTH * scale), 1))
+            legacy = self._best(lambda: _legacy_tiling(logo, size), repeat)
+            staggered = self._best(lambda: _single_pass(logo, size, engine.WATERMARK_MODE_STAGGERED), repeat)
+            diagonal = self._best(lambda: _single_pass(logo, size, engine.WATERMARK_MODE_DIAGONAL), repeat)
+            self.stdout.write(f"{label:<12}{f'{size[0]}x{size[1]}':>14}{legacy:>12.1f}{staggered:>15.1f}{diagonal:>14.1f}")
+
+        full = self._best(lambda: engine.render_certificate_background(settings), repeat)
+        self.stdout.write(f'Full background (watermark + borders) at current size: {full:.1f} ms')
+
+        if options['renders']:
+            certificate = Certificate.objects.select_related('student', 'course__instructor').first()
+            if not certificate:
+                self.stdout.write(self.style.WARNING('No certificates to render.'))
+                return
+            template = engine.get_certificate_template(settings)
+            started = time.perf_counter()
+            for _ in range(options['renders']):
+                template.render(certificate)
+            per_render = (time.perf_counter() - started) * 1000 / options['renders']
+            self.stdout.write(f"Certificate render: {per_render:.1f} ms each over {options['renders']} renders")
@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from courses.fake_paystack import FakePaystack
+from courses.paystack import get_paystack_keys
+
+
+class Command(BaseCommand):
+    help = 'Runs a local fake Paystack API; point PAYSTACK_API_BASE at it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--secret-key', default='', help='Key expected from the app and used to sign webhooks (default: the configured Paystack secret key)')
+        parser.add_argument('--latency', type=float, default=0.0, help='Average seconds added to every API call')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of API calls answered with HTTP 500')
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of checkouts that end declined')
+        parser.add_argument('--webhook-url', default='http://127.0.0.1:8000/courses/pay/webhook/', help='Where to deliver signed webhooks (empty to disable)')
+        parser.add_argument('--webhook-delay', type=float, default=0.0, help='Seconds to wait before delivering a webhook')
+
+    def handle(self, *args, **options):
+        secret_key = options['secret_key'] or get_paystack_keys()[1]
+        if not secret_key:
+            raise CommandError('No Paystack secret key configured; pass --secret-key.')
+        fake = FakePaystack(
+            secret_key,
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            failure_rate=options['failure_rate'],
+            decline_rate=options['decline_rate'],
+            webhook_url=options['webhook_url'] or None,
+            webhook_delay=options['webhook_delay'],
+        ).start()
+        self.stdout.write(f'Fake Paystack listening on {fake.base_url}')
+        self.stdout.write(f'Set PAYSTACK_API_BASE = "{fake.base_url}" in settings to use it.')
+        try:
+            while True:
+                time.sleep(60)
+                self.stdout.write(f'Stats: {fake.stats}')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fake.stop()
+        self.stdout.write(self.style.SUCCESS(f'Stopped. {fake.stats}'))
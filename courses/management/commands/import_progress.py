@@ -0,0 +1,74 @@
+import csv
+from collections import defaultdict
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from courses.models import Course, Enrollment, Lesson
+from courses.progress import complete_lessons, issue_completion_certificates
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports lesson completions from a CSV with the columns student (username or email), '
+        'course (slug) and lesson (slug, empty for every lesson in the course)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--enroll', action='store_true', help='Enroll students who are not enrolled yet')
+        parser.add_argument('--certificates', action='store_true', help='Issue certificates for enrollments this completes (emailed by run_jobs)')
+        parser.add_argument('--base-url', default='', help='Site root for links in the emails, e.g. https://techohr.com')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["csv_file"]}: {e}')
+        if rows and not {'student', 'course'} <= set(rows[0]):
+            raise CommandError('The CSV needs at least the columns student and course.')
+
+        User = get_user_model()
+        # {(student, course slug): set of lesson slugs, or None for all lessons}
+        wanted = defaultdict(set)
+        for row in rows:
+            key = ((row.get('student') or '').strip(), (row.get('course') or '').strip())
+            lesson = (row.get('lesson') or '').strip()
+            if not lesson:
+                wanted[key] = None
+            elif wanted[key] is not None:
+                wanted[key].add(lesson)
+
+        skipped = 0
+        # Enrollments grouped by the lesson selection they get
+        batches = defaultdict(list)
+        for (student, course_slug), lesson_slugs in wanted.items():
+            user = User.objects.filter(Q(username=student) | Q(email__iexact=student)).first()
+            enrollment = Enrollment.objects.filter(student=user, course__slug=course_slug).first() if user else None
+            if enrollment is None and user and options['enroll']:
+                course = Course.objects.filter(slug=course_slug).first()
+                if course:
+                    enrollment = Enrollment.objects.create(student=user, course=course)
+            if enrollment is None:
+                skipped += 1
+                self.stdout.write(self.style.WARNING(f'Skipped {student} / {course_slug}: no such enrollment'))
+                continue
+            if lesson_slugs is None:
+                batches[None].append(enrollment)
+            else:
+                lesson_ids = frozenset(Lesson.objects.filter(
+                    module__course_id=enrollment.course_id, slug__in=lesson_slugs,
+                ).values_list('pk', flat=True))
+                batches[lesson_ids].append(enrollment)
+
+        completed = []
+        for lesson_ids, enrollments in batches.items():
+            completed += complete_lessons(enrollments, lesson_ids=lesson_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported progress for {sum(len(e) for e in batches.values())} enrollments '
+            f'({len(completed)} now completed, {skipped} skipped).'
+        ))
+        if options['certificates'] and completed:
+            issued = issue_completion_certificates(completed, base_url=options['base_url'])
+            self.stdout.write(f'Issued {issued} certificates.')
@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from courses.models import Course, Enrollment, Certificate, CertificateSettings
+from courses.certificates import get_certificate_template
+from courses.utils import get_certificate_fingerprint, store_certificate_pdf
+from core.jobs import enqueue
+
+
+def _init_worker():
+    # Forked workers inherit a configured Django; spawned ones need setting up
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _render_certificate(certificate, settings):
+    from courses.certificates import generate_certificate_pdf_bytes
+    return certificate.pk, generate_certificate_pdf_bytes(certificate, settings=settings)
+
+
+class Command(BaseCommand):
+    help = 'Issues and renders certificates for a course or a list of certificate IDs, storing the PDFs in Certificate.file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', help='Course slug or ID: issue certificates for every completed enrollment')
+        parser.add_argument('--ids', nargs='+', default=[], help='Certificate IDs to (re-)render')
+        parser.add_argument('--workers', type=int, default=None, help='Number of render processes (default: CPU count, 1 renders inline)')
+        parser.add_argument('--force', action='store_true', help='Re-render even if the stored PDF is up to date')
+        parser.add_argument('--email', action='store_true', help='Queue emails for newly issued certificates (sent by run_jobs)')
+        parser.add_argument('--base-url', default='', help='Site root for links in the emails, e.g. https://techohr.com')
+
+    def handle(self, *args, **options):
+        if not options['course'] and not options['ids']:
+            raise CommandError('Pass --course and/or --ids.')
+
+        certificates = {}
+        issued = []
+
+        if options['course']:
+            lookup = {'pk': options['course']} if options['course'].isdigit() else {'slug': options['course']}
+            course = Course.objects.filter(**lookup).first()
+            if not course:
+                raise CommandError(f"Course not found: {options['course']}")
+            if not course.has_certificate:
+                raise CommandError(f'{course.title} does not award certificates.')
+
+            enrollments = Enrollment.objects.filter(course=course, is_completed=True).select_related('student')
+            for enrollment in enrollments:
+                cert, created = Certificate.objects.get_or_create(student=enrollment.student, course=course)
+                if created:
+                    issued.append(cert.pk)
+            self.stdout.write(f'Issued {len(issued)} new certificates for {course.title}.')
+            for cert in Certificate.objects.filter(course=course).select_related('student', 'course__instructor'):
+                certificates[cert.pk] = cert
+
+        if options['ids']:
+            found = Certificate.objects.filter(certificate_id__in=options['ids']).select_related('student', 'course__instructor')
+            for cert in found:
+                certificates[cert.pk] = cert
+            missing = set(options['ids']) - {c.certificate_id for c in found}
+            for certificate_id in sorted(missing):
+                self.stdout.write(self.style.WARNING(f'Certificate not found: {certificate_id}'))
+
+        settings = CertificateSettings.get_cached()
+        fingerprints = {pk: get_certificate_fingerprint(cert, settings) for pk, cert in certificates.items()}
+        pending = [
+            cert for pk, cert in certificates.items()
+            if options['force'] or not cert.file or cert.file_fingerprint != fingerprints[pk]
+        ]
+        self.stdout.write(f'{len(pending)} of {len(certificates)} certificates need rendering.')
+        if not pending:
+            return
+
+        # Compile the template (background, fonts, layout) once, before forking
+        get_certificate_template(settings)
+
+        started = time.monotonic()
+        rendered = failed = 0
+        workers = options['workers']
+
+        if workers == 1 or len(pending) == 1:
+            results = (_render_certificate(cert, settings) for cert in pending)
+            for pk, pdf_bytes in results:
+                store_certificate_pdf(certificates[pk], pdf_bytes, fingerprints[pk])
+                rendered += 1
+        else:
+            # Connections must not be shared with forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(_render_certificate, cert, settings): cert for cert in pending}
+                for future in as_completed(futures):
+                    cert = futures[future]
+                    try:
+                        pk, pdf_bytes = future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f'Failed to render {cert.certificate_id}: {e}'))
+                        continue
+                    # Writes stay in this process so SQLite only ever sees one writer
+                    store_certificate_pdf(cert, pdf_bytes, fingerprints[pk])
+                    rendered += 1
+
+        elapsed = time.monotonic() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} certificates in {elapsed:.1f}s ({rate:.1f}/s), {failed} failed.'))
+
+        if options['email'] and issued:
+            queued = 0
+            for pk in issued:
+                if pk in certificates:
+                    enqueue('courses.issue_certificate', certificate_id=pk, base_url=options['base_url'])
+                    queued += 1
+            self.stdout.write(f'Queued {queued} certificate emails.')
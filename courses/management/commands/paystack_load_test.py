@@ -0,0 +1,214 @@
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.models import Job
+from courses.fake_paystack import FakePaystack
+from courses.models import Course, Enrollment, Payment
+from courses.payments import check_payment
+from courses.paystack import get_client, get_paystack_keys
+
+CHECKOUT_RE = re.compile(r'/checkout/([\w-]+)')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives concurrent checkouts (init, pay, verify callback + webhook, background verify) '
+        'through the app against an in-process fake Paystack and reports throughput and contention, '
+        'then checks that a callback with a forged reference is refused. '
+        'Creates throwaway users and a course, removed afterwards unless --keep.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20, help='Checkouts in flight at once (1 runs inline)')
+        parser.add_argument('--latency', type=float, default=0.05, help='Average fake Paystack latency in seconds')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of Paystack API calls failing with HTTP 500')
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of declined checkouts')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, course and payments')
+
+    def handle(self, *args, **options):
+        self.timings = defaultdict(list)
+        self.errors = Counter()
+        self.lock = threading.Lock()
+        self.concurrency = options['concurrency']
+
+        run_id = uuid.uuid4().hex[:6]
+        secret_key = get_paystack_keys()[1]
+        if not secret_key or secret_key == 'PAYSTACK_SECRET_KEY':
+            secret_key = 'sk_test_loadtest'
+        users, course = self.create_fixtures(run_id, options['checkouts'])
+        references = []
+
+        fake = FakePaystack(
+            secret_key,
+            latency=options['latency'],
+            failure_rate=options['failure_rate'],
+            decline_rate=options['decline_rate'],
+        )
+        overrides = override_settings(
+            PAYSTACK_API_BASE=fake.base_url,
+            PAYSTACK_SECRET_KEY=secret_key,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            EMAIL_OUTBOX=False,
+            JOB_QUEUE_EAGER=False,
+        )
+        try:
+            with fake, overrides:
+                get_client().metrics.reset()
+                self.stdout.write(f'Running {len(users)} checkouts, {options["concurrency"]} at a time...')
+                started = time.monotonic()
+                references = self.run_parallel(lambda user: self.checkout(user, course, fake), users, options['concurrency'])
+                callbacks_done = time.monotonic()
+                # What the run_jobs worker does for each pending payment
+                self.run_parallel(self.background_verify, [r for r in references if r], options['concurrency'])
+                finished = time.monotonic()
+                if users:
+                    self.forged_callback(users[0], course)
+                self.report(users, course, [r for r in references if r], fake, started, callbacks_done, finished)
+        finally:
+            if not options['keep']:
+                self.cleanup(users, course, [r for r in references if r])
+
+    # --- Scenario ---
+
+    def create_fixtures(self, run_id, count):
+        User = get_user_model()
+        instructor = User.objects.create_user(username=f'loadtest-{run_id}-instructor')
+        course = Course.objects.create(
+            title=f'Load test course {run_id}', instructor=instructor,
+            description='Load test', price=5000, is_published=True,
+        )
+        User.objects.bulk_create([
+            User(username=f'loadtest-{run_id}-{i}', email=f'loadtest-{run_id}-{i}@example.com')
+            for i in range(count)
+        ])
+        users = list(User.objects.filter(username__startswith=f'loadtest-{run_id}-').exclude(pk=instructor.pk))
+        return users, course
+
+    def timed(self, step, func, *args):
+        started = time.monotonic()
+        try:
+            return func(*args)
+        except Exception as e:
+            with self.lock:
+                self.errors[f'{step}: {type(e).__name__}: {str(e)[:80]}'] += 1
+            return None
+        finally:
+            with self.lock:
+                self.timings[step].append(time.monotonic() - started)
+
+    def checkout(self, user, course, fake):
+        client = Client()
+        if self.timed('login', lambda: client.force_login(user) or True) is None:
+            return None
+        response = self.timed('init', client.get, reverse('init_course_payment', args=[course.slug]))
+        match = CHECKOUT_RE.search(response.content.decode('utf-8', 'replace')) if response is not None else None
+        if not match:
+            with self.lock:
+                self.errors['init: no authorization_url'] += 1
+            return None
+        reference = match.group(1)
+        fake.pay(reference)
+
+        # Paystack's redirect and its webhook typically land together
+        body, signature = fake.webhook(reference)
+        verify_url = reverse('verify_course_payment', args=[course.slug]) + f'?reference={reference}'
+        send_webhook = lambda: self.timed('webhook', lambda: Client().post(
+            reverse('paystack_webhook'), body, content_type='application/json', HTTP_X_PAYSTACK_SIGNATURE=signature,
+        ))
+        if self.concurrency <= 1:
+            send_webhook()
+            self.timed('verify_callback', client.get, verify_url)
+            return reference
+        webhook = threading.Thread(target=self.run_and_close, args=(send_webhook,))
+        webhook.start()
+        self.timed('verify_callback', client.get, verify_url)
+        webhook.join()
+        return reference
+
+    def forged_callback(self, user, course):
+        """A callback with a reference no checkout started must not record a payment."""
+        client = Client()
+        client.force_login(user)
+        reference = f'forged-{uuid.uuid4().hex[:8]}'
+        client.get(reverse('verify_course_payment', args=[course.slug]) + f'?reference={reference}')
+        if Payment.objects.filter(reference=reference).exists():
+            with self.lock:
+                self.errors['verify_callback: forged reference recorded'] += 1
+
+    def run_and_close(self, func, *args):
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+
+    def background_verify(self, reference):
+        return self.timed('verify_job', check_payment, reference)
+
+    def run_parallel(self, func, items, concurrency):
+        if concurrency <= 1:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(lambda item: self.run_and_close(func, item), items))
+
+    # --- Results ---
+
+    def report(self, users, course, references, fake, started, callbacks_done, finished):
+        elapsed = callbacks_done - started
+        self.stdout.write('')
+        self.stdout.write(f'Checkouts: {len(users)} started, {len(references)} reached Paystack')
+        self.stdout.write(f'Throughput: {len(users) / elapsed if elapsed else 0:.1f} checkouts/s '
+                          f'({elapsed:.1f}s, plus {finished - callbacks_done:.1f}s background verification)')
+        self.stdout.write('Step latency (ms):       p50      p95      max')
+        for step in ('init', 'verify_callback', 'webhook', 'verify_job'):
+            values = self.timings.get(step) or []
+            self.stdout.write(f'  {step:<18} {percentile(values, 50) * 1000:8.1f} {percentile(values, 95) * 1000:8.1f} '
+                              f'{(max(values) if values else 0) * 1000:8.1f}')
+
+        payments = Payment.objects.filter(reference__in=references)
+        statuses = Counter(payments.values_list('status', flat=True))
+        enrollments = Enrollment.objects.filter(course=course).count()
+        receipts = Counter(
+            Job.objects.filter(task='courses.send_payment_receipt', payload__reference__in=references)
+            .values_list('payload__reference', flat=True)
+        )
+        duplicates = sum(1 for n in receipts.values() if n > 1)
+        self.stdout.write(f'Payments: {dict(statuses)}; enrollments: {enrollments}; '
+                          f'receipts queued: {sum(receipts.values())} ({duplicates} references with duplicates)')
+        self.stdout.write(f'Fake Paystack: {fake.stats}')
+        for endpoint, m in get_client().metrics.snapshot().items():
+            self.stdout.write(f'Client {endpoint}: {m["calls"]} calls, {m["errors"]} errors, {m["retries"]} retries, '
+                              f'avg {m["avg_ms"]:.1f}ms, max {m["max_ms"]:.1f}ms')
+
+        locked = sum(n for error, n in self.errors.items() if 'locked' in error)
+        if self.errors:
+            self.stdout.write(self.style.WARNING(f'Errors ({sum(self.errors.values())}, {locked} lock timeouts):'))
+            for error, n in self.errors.most_common(10):
+                self.stdout.write(f'  {n:5d}  {error}')
+        else:
+            self.stdout.write(self.style.SUCCESS('No errors.'))
+
+    def cleanup(self, users, course, references):
+        Job.objects.filter(payload__reference__in=references).delete()
+        Payment.objects.filter(reference__in=references).delete()
+        instructor_id = course.instructor_id
+        course.delete()
+        get_user_model().objects.filter(pk__in=[u.pk for u in users] + [instructor_id]).delete()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Enrollment
+from courses.progress import courses_with_drift, enrollments_with_drift, refresh_course_progress, refresh_enrollment_progress
+
+
+class Command(BaseCommand):
+    help = 'Recounts stored lesson counts and enrollment progress where they have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report rows that have drifted')
+
+    def handle(self, *args, **options):
+        course_ids = list(courses_with_drift().values_list('pk', flat=True))
+        if options['dry_run']:
+            # Enrollment drift is measured against fresh lesson counts, so this is the full picture
+            enrollment_count = enrollments_with_drift().count()
+            self.stdout.write(f'{len(course_ids)} courses and {enrollment_count} enrollments have drifted.')
+            return
+
+        with transaction.atomic():
+            refresh_course_progress(course_ids)
+            enrollment_ids = list(enrollments_with_drift().values_list('pk', flat=True))
+            refresh_enrollment_progress(Enrollment.objects.filter(pk__in=enrollment_ids))
+        self.stdout.write(self.style.SUCCESS(
+            f'Repaired {len(course_ids)} course lesson counts and {len(enrollment_ids)} enrollments.'
+        ))
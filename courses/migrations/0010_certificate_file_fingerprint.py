@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_course_digital_file_course_is_digital_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='file_fingerprint',
+            field=models.CharField(blank=True, help_text='Hash of the design and printed details the stored PDF was rendered from.', max_length=40),
+        ),
+    ]
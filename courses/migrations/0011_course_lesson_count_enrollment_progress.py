@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:03
+
+from django.db import migrations, models
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def fill_progress(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonCompletion = apps.get_model('courses', 'LessonCompletion')
+
+    lessons = (
+        Lesson.objects.filter(module__course=OuterRef('pk'))
+        .order_by().values('module__course').annotate(n=Count('pk')).values('n')
+    )
+    Course.objects.update(lesson_count=Coalesce(Subquery(lessons, output_field=IntegerField()), Value(0)))
+
+    completions = (
+        LessonCompletion.objects.filter(enrollment=OuterRef('pk'), is_completed=True)
+        .order_by().values('enrollment').annotate(n=Count('pk')).values('n')
+    )
+    Enrollment.objects.update(completed_count=Coalesce(Subquery(completions, output_field=IntegerField()), Value(0)))
+    lesson_count = Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('lesson_count')[:1], output_field=IntegerField())
+    Enrollment.objects.update(progress=Coalesce(
+        F('completed_count') * 100 / NullIf(lesson_count, Value(0)), Value(0), output_field=IntegerField()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_certificate_file_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text="Percent of the course's lessons completed"),
+        ),
+        migrations.RunPython(fill_progress, migrations.RunPython.noop),
+    ]
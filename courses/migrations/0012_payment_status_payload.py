@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+# Statuses written by earlier code (free text, mixed case) -> the enum
+SUCCESS = ('success', 'successful', 'successfull')
+PENDING = ('', 'pending', 'ongoing', 'processing', 'queued')
+
+
+def move_payloads_and_normalise(apps, schema_editor):
+    Payment = apps.get_model('courses', 'Payment')
+    PaymentPayload = apps.get_model('courses', 'PaymentPayload')
+
+    batch = []
+    for pk, raw in Payment.objects.exclude(raw={}).values_list('pk', 'raw').iterator(chunk_size=500):
+        batch.append(PaymentPayload(payment_id=pk, data=raw))
+        if len(batch) >= 500:
+            PaymentPayload.objects.bulk_create(batch)
+            batch = []
+    PaymentPayload.objects.bulk_create(batch)
+
+    payments = Payment.objects.annotate(normalised=Lower(Trim('status')))
+    payments.filter(normalised__in=SUCCESS).update(status='success')
+    payments.filter(normalised__in=PENDING).update(status='pending')
+    # failed, abandoned, reversed and anything unrecognised never settled
+    Payment.objects.exclude(status__in=('success', 'pending')).update(status='failed')
+
+
+def restore_payloads(apps, schema_editor):
+    Payment = apps.get_model('courses', 'Payment')
+    PaymentPayload = apps.get_model('courses', 'PaymentPayload')
+    for payment_id, data in PaymentPayload.objects.values_list('payment_id', 'data').iterator(chunk_size=500):
+        Payment.objects.filter(pk=payment_id).update(raw=data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_course_lesson_count_enrollment_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentPayload',
+            fields=[
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='courses.payment')),
+                ('data', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.RunPython(move_payloads_and_normalise, restore_payloads),
+        migrations.RemoveField(
+            model_name='payment',
+            name='raw',
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'course', 'status', '-paid_at'], name='courses_pay_user_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-paid_at'], name='courses_pay_status_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-paid_at'], name='courses_pay_time_idx'),
+        ),
+    ]
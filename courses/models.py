@@ -4,9 +4,11 @@ from django.utils.text import slugify
 from django.utils import timezone
 from datetime import timedelta
 from django.urls import reverse
+from django.db.models.functions import Coalesce
 import uuid
+from core.models import SingletonModel
 
-class PaymentSettings(models.Model):
+class PaymentSettings(SingletonModel):
     paystack_public_key = models.CharField(max_length=255, blank=True, null=True)
     paystack_secret_key = models.CharField(max_length=255, blank=True, null=True)
     stripe_public_key = models.CharField(max_length=255, blank=True, null=True)
@@ -36,6 +38,29 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = "Categories"
 
+class CourseQuerySet(models.QuerySet):
+    def for_catalogue(self, user=None):
+        """
+        Everything a course card shows, in one query: category and instructor
+        joined, plus module_count, total_duration, avg_rating, review_count and
+        is_enrolled (for `user`) annotated from correlated subqueries. The
+        lesson count is the stored Course.lesson_count.
+        """
+        modules = Module.objects.filter(course=models.OuterRef('pk')).order_by().values('course').annotate(n=models.Count('pk')).values('n')
+        duration = Lesson.objects.filter(module__course=models.OuterRef('pk')).order_by().values('module__course').annotate(total=models.Sum('duration')).values('total')
+        reviews = Review.objects.filter(course=models.OuterRef('pk')).order_by().values('course')
+        if user is not None and user.is_authenticated:
+            is_enrolled = models.Exists(Enrollment.objects.filter(course=models.OuterRef('pk'), student=user))
+        else:
+            is_enrolled = models.Value(False)
+        return self.select_related('category', 'instructor').annotate(
+            module_count=Coalesce(models.Subquery(modules, output_field=models.IntegerField()), models.Value(0)),
+            total_duration=models.Subquery(duration, output_field=models.DurationField()),
+            avg_rating=models.Subquery(reviews.annotate(avg=models.Avg('rating')).values('avg'), output_field=models.FloatField()),
+            review_count=Coalesce(models.Subquery(reviews.annotate(n=models.Count('pk')).values('n'), output_field=models.IntegerField()), models.Value(0)),
+            is_enrolled=is_enrolled,
+        )
+
 class Course(models.Model):
     LEVEL_CHOICES = (
         ('Beginner', 'Beginner'),
@@ -62,6 +87,11 @@ class Course(models.Model):
     # Certificate Settings
     has_certificate = models.BooleanField(default=True)
 
+    # Maintained by courses.progress when lessons are added, moved or removed
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CourseQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
@@ -159,12 +189,31 @@ class Lesson(models.Model):
     def __str__(self):
         return self.title
 
+class EnrollmentQuerySet(models.QuerySet):
+    def with_progress(self):
+        """
+        Annotates completed_lessons, total_lessons and current_progress, counted
+        live in correlated subqueries, so a list of enrollments with progress is
+        a single query.
+        """
+        from .progress import completed_count_subquery, lesson_count_subquery, progress_expression
+        return self.annotate(
+            completed_lessons=completed_count_subquery(),
+            total_lessons=lesson_count_subquery('course_id'),
+        ).annotate(current_progress=progress_expression(models.F('completed_lessons'), models.F('total_lessons')))
+
 class Enrollment(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='enrollments', on_delete=models.CASCADE)
     course = models.ForeignKey(Course, related_name='enrollments', on_delete=models.CASCADE)
     enrolled_at = models.DateTimeField(auto_now_add=True)
     is_completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
+
+    # Maintained by courses.progress when completions are recorded
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
+    progress = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Percent of the course's lessons completed")
+
+    objects = EnrollmentQuerySet.as_manager()
     
     class Meta:
         unique_together = ('student', 'course')
@@ -173,11 +222,8 @@ class Enrollment(models.Model):
         return f"{self.student} enrolled in {self.course}"
     
     def get_progress(self):
-        total_lessons = Lesson.objects.filter(module__course=self.course).count()
-        if total_lessons == 0:
-            return 0
-        completed = LessonCompletion.objects.filter(enrollment=self, is_completed=True).count()
-        return int((completed / total_lessons) * 100)
+        return self.progress
+    get_progress.short_description = 'Progress'
 
 class LessonCompletion(models.Model):
     enrollment = models.ForeignKey(Enrollment, related_name='completions', on_delete=models.CASCADE)
@@ -189,28 +235,58 @@ class LessonCompletion(models.Model):
         unique_together = ('enrollment', 'lesson')
 
 class Payment(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    # Paystack never gave a final answer; the webhook can still settle it
+    STATUS_ABANDONED = 'abandoned'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SUCCESS, 'Success'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_ABANDONED, 'Abandoned'),
+    ]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     reference = models.CharField(max_length=100, unique=True)
     amount = models.IntegerField()
-    status = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
     paid_at = models.DateTimeField(auto_now_add=True)
-    raw = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            # payment_success: a student's latest successful payment for a course
+            models.Index(fields=['user', 'course', 'status', '-paid_at'], name='courses_pay_user_course_idx'),
+            # manage_payments: newest first, optionally filtered by status
+            models.Index(fields=['status', '-paid_at'], name='courses_pay_status_time_idx'),
+            models.Index(fields=['-paid_at'], name='courses_pay_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.course} - {self.reference}"
 
+
+class PaymentPayload(models.Model):
+    """Paystack's transaction data for a payment, kept apart so ledger queries don't load it."""
+    payment = models.OneToOneField(Payment, related_name='payload', on_delete=models.CASCADE, primary_key=True)
+    data = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Payload for {self.payment_id}"
+
 class Certificate(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='certificates', on_delete=models.CASCADE)
     course = models.ForeignKey(Course, related_name='certificates', on_delete=models.CASCADE)
     issued_at = models.DateTimeField(auto_now_add=True)
     certificate_id = models.CharField(max_length=50, unique=True, default=uuid.uuid4)
     file = models.FileField(upload_to='certificates/', blank=True, null=True)
+    file_fingerprint = models.CharField(max_length=40, blank=True, help_text="Hash of the design and printed details the stored PDF was rendered from.")
 
     def __str__(self):
         return f"Certificate for {self.student} - {self.course}"
 
-class CertificateSettings(models.Model):
+class CertificateSettings(SingletonModel):
     # Only one instance should exist, or one per site if multi-tenant, but assuming single site for now.
     # We can enforce singleton pattern or just allow editing the latest one.
     
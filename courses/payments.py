@@ -0,0 +1,181 @@
+"""
+Paystack payment verification.
+
+Every checkout is started with a reference generated here and remembered
+in the student's session (remember_checkout). A checkout comes back from
+Paystack to verify_course_payment with that reference; the view only
+records the Payment as pending and queues a courses.verify_payment job,
+then shows a "verifying" page which polls payment_status. References that
+weren't started in the session, and aren't already recorded, are refused,
+so arbitrary strings can't create pending rows. The job asks Paystack once
+per run; while Paystack still reports the transaction as pending (or can't
+be reached) it re-queues itself with a growing delay, up to
+PAYSTACK_VERIFY_MAX_CHECKS times. The webhook can settle the same payment
+at any point; both end in fulfil_payment(), which enrolls and queues the
+receipt exactly once whichever arrives first.
+
+    pending --(Paystack success)--> success   (student enrolled, receipt queued)
+    pending --(failed/abandoned/reversed, or reference not found)--> failed
+    pending --(no final answer after the last check)--> abandoned
+
+A failed or abandoned payment can still be settled by a later webhook.
+"""
+import uuid
+from datetime import timedelta
+from django.conf import settings as django_settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from core.jobs import enqueue
+from .models import Course, Enrollment, Payment, PaymentPayload
+from .paystack import PaystackError, get_client
+
+STATUS_PENDING = Payment.STATUS_PENDING
+STATUS_SUCCESS = Payment.STATUS_SUCCESS
+STATUS_FAILED = Payment.STATUS_FAILED
+STATUS_ABANDONED = Payment.STATUS_ABANDONED
+
+# Transaction statuses as Paystack reports them
+SUCCESS_STATUSES = ('success', 'successful', 'successfull')
+FAILED_STATUSES = ('failed', 'abandoned', 'reversed')
+# Paystack's answer for a reference it has no transaction for
+NOT_FOUND_HTTP_STATUSES = (400, 404)
+
+# Checkouts started in the session, as [reference, course_id], newest last
+SESSION_KEY = 'paystack_checkouts'
+SESSION_LIMIT = 10
+
+def get_max_checks():
+    return getattr(django_settings, 'PAYSTACK_VERIFY_MAX_CHECKS', 20)
+
+
+def recheck_delay(check):
+    """Seconds before the next check while Paystack still says pending: 3, 6, 12 ... capped at 60."""
+    return min(3 * 2 ** (check - 1), 60)
+
+
+def new_reference():
+    return f'tch_{uuid.uuid4().hex}'
+
+
+def remember_checkout(session, course, reference):
+    """Records a reference we handed to Paystack for this course."""
+    checkouts = [c for c in session.get(SESSION_KEY, []) if c[0] != reference]
+    session[SESSION_KEY] = (checkouts + [[reference, course.pk]])[-SESSION_LIMIT:]
+
+
+def is_own_checkout(session, course, reference):
+    return [reference, course.pk] in session.get(SESSION_KEY, [])
+
+
+def start_verification(user, course, reference, amount, base_url=''):
+    """
+    Records the reference as a pending payment and queues the first check.
+    Returns the Payment; a reference seen before is returned unchanged.
+    """
+    payment, created = Payment.objects.get_or_create(
+        reference=reference,
+        defaults={'user': user, 'course': course, 'amount': amount, 'status': STATUS_PENDING},
+    )
+    if created:
+        enqueue('courses.verify_payment', reference=reference, base_url=base_url)
+    return payment
+
+
+def fetch_transaction(reference):
+    """Asks Paystack for the transaction. Returns the API response as a dict."""
+    return get_client().verify_transaction(reference)
+
+
+def fulfil_payment(reference, data, user=None, course=None, base_url=''):
+    """
+    Settles a successful Paystack transaction; safe to call any number of
+    times, from any path (verify job, webhook), concurrently.
+
+    The Payment is upserted by its unique reference (INSERT ... ON CONFLICT DO
+    NOTHING), then flipped to success with a conditional UPDATE. Only the call
+    whose UPDATE changed the row enrolls the student and queues the receipt,
+    in the same transaction, so both happen exactly once. No row is read
+    before the first write, so on SQLite the transaction takes the write lock
+    up front (waiting on the busy timeout) instead of failing a lock upgrade.
+
+    user and course are only needed when the reference hasn't been recorded
+    yet; they default to the user_id and course_slug in the transaction
+    metadata. Returns the Payment, or None for an unknown reference that
+    can't be attributed.
+    """
+    if user is None or course is None:
+        metadata = data.get('metadata') or {}
+        if course is None and metadata.get('course_slug'):
+            course = Course.objects.filter(slug=metadata['course_slug']).first()
+        if user is None and metadata.get('user_id'):
+            user = get_user_model().objects.filter(pk=metadata['user_id']).first()
+
+    changes = {'status': STATUS_SUCCESS}
+    if data.get('amount'):
+        changes['amount'] = data['amount']
+    with transaction.atomic():
+        if user is not None and course is not None:
+            Payment.objects.bulk_create([Payment(
+                reference=reference, user=user, course=course,
+                amount=data.get('amount') or 0, status=STATUS_PENDING,
+            )], ignore_conflicts=True)
+        claimed = Payment.objects.filter(reference=reference).exclude(status=STATUS_SUCCESS).update(**changes)
+        payment = Payment.objects.filter(reference=reference).first()
+        if claimed and payment is not None:
+            PaymentPayload.objects.update_or_create(payment_id=payment.pk, defaults={'data': data})
+            Enrollment.objects.get_or_create(student_id=payment.user_id, course_id=payment.course_id)
+            enqueue(
+                'courses.send_payment_receipt',
+                user_id=payment.user_id,
+                course_id=payment.course_id,
+                reference=payment.reference,
+                amount=payment.amount,
+                status=STATUS_SUCCESS,
+                paid_at=data.get('paid_at'),
+                base_url=base_url,
+            )
+    return payment
+
+
+def close_payment(payment, status, data):
+    """Moves a pending payment to failed or abandoned, keeping Paystack's last answer."""
+    with transaction.atomic():
+        if Payment.objects.filter(pk=payment.pk, status=STATUS_PENDING).update(status=status):
+            PaymentPayload.objects.update_or_create(payment_id=payment.pk, defaults={'data': data})
+    return status
+
+
+def check_payment(reference, base_url='', check=1):
+    """
+    One verification step for a pending payment. Returns the payment status
+    after the check. An unknown reference fails the payment; an unreachable
+    Paystack counts as a check like a pending answer, so every payment ends
+    failed, successful or abandoned once the checks run out.
+    """
+    payment = Payment.objects.filter(reference=reference).first()
+    if payment is None or payment.status != STATUS_PENDING:
+        return payment.status if payment else None
+
+    try:
+        res = fetch_transaction(reference)
+    except PaystackError as e:
+        if e.status_code in NOT_FOUND_HTTP_STATUSES:
+            return close_payment(payment, STATUS_FAILED, e.payload or {'message': str(e)})
+        print(f"Error verifying payment {reference} (check {check}): {e}")
+        res = {}
+    data = res.get('data') or {}
+    status_val = str(data.get('status') or '').lower()
+    if res.get('status') is True and status_val in SUCCESS_STATUSES:
+        return fulfil_payment(reference, data, base_url=base_url).status
+    if status_val in FAILED_STATUSES:
+        return close_payment(payment, STATUS_FAILED, data)
+
+    if check >= get_max_checks():
+        return close_payment(payment, STATUS_ABANDONED, data)
+    enqueue(
+        'courses.verify_payment',
+        run_after=timezone.now() + timedelta(seconds=recheck_delay(check)),
+        reference=reference, base_url=base_url, check=check + 1,
+    )
+    return STATUS_PENDING
@@ -0,0 +1,240 @@
+"""
+Paystack API client.
+
+All calls to Paystack go through one shared PaystackClient (get_client()),
+which keeps a pooled keep-alive requests.Session, so the TCP and TLS
+handshakes are paid once per connection rather than once per call. Each
+endpoint has its own (connect, read) timeout. Connection errors, 429s and
+5xx responses are retried with exponential backoff and full jitter. A
+circuit breaker fails fast while Paystack keeps failing, and per-endpoint
+latency metrics are kept in memory (client.metrics.snapshot()).
+
+Settings:
+    PAYSTACK_API_BASE       default https://api.paystack.co (point at the
+                            fake_paystack server for local runs)
+    PAYSTACK_TIMEOUTS       {endpoint: (connect, read)} overrides
+    PAYSTACK_MAX_RETRIES    retries after the first attempt (default 2)
+    PAYSTACK_POOL_SIZE      keep-alive connections per host (default 20)
+"""
+import random
+import threading
+import time
+from urllib import parse as urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings as django_settings
+from .models import PaymentSettings
+
+DEFAULT_API_BASE = 'https://api.paystack.co'
+DEFAULT_TIMEOUTS = {
+    'initialize': (3.05, 10),
+    'verify': (3.05, 10),
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PaystackError(Exception):
+    def __init__(self, message, status_code=None, payload=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = payload or {}
+
+
+class CircuitOpenError(PaystackError):
+    pass
+
+
+def get_paystack_keys():
+    payment_settings = PaymentSettings.get_cached()
+    pk = payment_settings.paystack_public_key if payment_settings else None
+    sk = payment_settings.paystack_secret_key if payment_settings else None
+
+    # Fallback to settings if not in DB
+    if not pk:
+        pk = getattr(django_settings, 'PAYSTACK_PUBLIC_KEY', None)
+    if not sk:
+        sk = getattr(django_settings, 'PAYSTACK_SECRET_KEY', None)
+
+    return pk, sk
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds; then lets one trial call through (half-open).
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class PaystackMetrics:
+    """Call counts and latency per endpoint, for this process."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, elapsed, ok, retries=0):
+        with self._lock:
+            m = self._endpoints.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            })
+            ms = elapsed * 1000
+            m['calls'] += 1
+            m['errors'] += 0 if ok else 1
+            m['retries'] += retries
+            m['total_ms'] += ms
+            m['max_ms'] = max(m['max_ms'], ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: dict(m, avg_ms=m['total_ms'] / m['calls'] if m['calls'] else 0.0)
+                for endpoint, m in self._endpoints.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+class PaystackClient:
+    def __init__(self, secret_key, base_url=None, timeouts=None, max_retries=2, backoff=0.25,
+                 pool_size=20, breaker=None, session=None):
+        self.secret_key = secret_key
+        self.base_url = (base_url or DEFAULT_API_BASE).rstrip('/')
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = PaystackMetrics()
+        self.session = session or self._build_session(pool_size)
+
+    def _build_session(self, pool_size):
+        session = requests.Session()
+        # Retries are ours (with jitter and the breaker), not urllib3's
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Authorization': f'Bearer {self.secret_key}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'User-Agent': 'TechOHR-LMS/1.0',
+        })
+        return session
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: anywhere between 0 and the exponential cap
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def request(self, endpoint, method, path, **kwargs):
+        """Calls the API and returns the decoded JSON body; raises PaystackError."""
+        if not self.breaker.allow():
+            raise CircuitOpenError('Paystack is temporarily unavailable. Please try again shortly.')
+
+        url = f'{self.base_url}{path}'
+        timeout = self.timeouts.get(endpoint, (3.05, 10))
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            error = None
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                error = PaystackError(f'Network error contacting Paystack: {e}')
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                error = PaystackError(f'Paystack returned HTTP {response.status_code}', response.status_code)
+
+            if attempt >= self.max_retries:
+                self.breaker.record_failure()
+                self.metrics.record(endpoint, time.monotonic() - started, ok=False, retries=attempt)
+                raise error
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+        # Paystack answered: a 4xx is about the request, not an outage
+        self.breaker.record_success()
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        ok = response.ok
+        self.metrics.record(endpoint, time.monotonic() - started, ok=ok, retries=attempt)
+        if not ok:
+            raise PaystackError(body.get('message') or f'Paystack returned HTTP {response.status_code}',
+                                response.status_code, body)
+        return body
+
+    def initialize_transaction(self, payload):
+        return self.request('initialize', 'POST', '/transaction/initialize', json=payload)
+
+    def verify_transaction(self, reference):
+        return self.request('verify', 'GET', f'/transaction/verify/{urlparse.quote(reference)}')
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The shared client, rebuilt if the secret key or API base changes."""
+    global _client
+    _, secret_key = get_paystack_keys()
+    base_url = getattr(django_settings, 'PAYSTACK_API_BASE', DEFAULT_API_BASE)
+    client = _client
+    if client is not None and client.secret_key == secret_key and client.base_url == base_url.rstrip('/'):
+        return client
+    with _client_lock:
+        if _client is None or _client.secret_key != secret_key or _client.base_url != base_url.rstrip('/'):
+            if _client is not None:
+                _client.session.close()
+            _client = PaystackClient(
+                secret_key,
+                base_url=base_url,
+                timeouts=getattr(django_settings, 'PAYSTACK_TIMEOUTS', None),
+                max_retries=getattr(django_settings, 'PAYSTACK_MAX_RETRIES', 2),
+                pool_size=getattr(django_settings, 'PAYSTACK_POOL_SIZE', 20),
+            )
+        return _client
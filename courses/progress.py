@@ -0,0 +1,212 @@
+"""
+Stored course progress.
+
+Course.lesson_count and Enrollment.completed_count / progress are kept up to
+date by the signal receivers below whenever lessons are added, moved or
+removed and whenever completions are recorded or removed. Every refresh is an
+UPDATE with the counts computed in subqueries, so concurrent writers can't
+lose increments, and it runs inside the caller's transaction. Bulk writes
+that skip signals (bulk_create, queryset update/delete) must call the refresh
+helpers themselves; the reconcile_progress command repairs any drift.
+
+Rows removed by a cascade are refreshed once per course or enrollment for the
+whole delete() call, and not at all when the course or enrollment itself is
+being deleted.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+from core.jobs import enqueue
+from .models import Certificate, Course, Enrollment, Lesson, LessonCompletion, Module
+
+
+def lesson_count_subquery(course_ref='pk'):
+    lessons = (
+        Lesson.objects.filter(module__course=OuterRef(course_ref))
+        .order_by()
+        .values('module__course')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    return Coalesce(Subquery(lessons, output_field=IntegerField()), Value(0))
+
+
+def completed_count_subquery(enrollment_ref='pk'):
+    completions = (
+        LessonCompletion.objects.filter(enrollment=OuterRef(enrollment_ref), is_completed=True)
+        .order_by()
+        .values('enrollment')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    return Coalesce(Subquery(completions, output_field=IntegerField()), Value(0))
+
+
+def stored_lesson_count(course_ref='course_id'):
+    lessons = Course.objects.filter(pk=OuterRef(course_ref)).values('lesson_count')[:1]
+    return Subquery(lessons, output_field=IntegerField())
+
+
+def progress_expression(completed, lessons):
+    """Whole percent rounded down, 0 for a course without lessons."""
+    return Coalesce(completed * 100 / NullIf(lessons, Value(0)), Value(0), output_field=IntegerField())
+
+
+def refresh_enrollment_progress(enrollments):
+    """Recounts completed lessons and progress for a queryset of enrollments."""
+    # SET expressions see the old completed_count, so progress recounts too
+    enrollments.update(
+        completed_count=completed_count_subquery(),
+        progress=progress_expression(completed_count_subquery(), stored_lesson_count()),
+    )
+
+
+def refresh_course_progress(course_ids):
+    """Recounts lessons for the courses, then progress for all their enrollments."""
+    course_ids = {pk for pk in course_ids if pk is not None}
+    if not course_ids:
+        return
+    Course.objects.filter(pk__in=course_ids).update(lesson_count=lesson_count_subquery())
+    refresh_enrollment_progress(Enrollment.objects.filter(course_id__in=course_ids))
+
+
+def complete_lessons(enrollments, lesson_ids=None):
+    """
+    Marks lessons complete for one or more enrollments: every lesson of each
+    enrollment's course, or only those in lesson_ids. Missing completions are
+    inserted with one bulk_create and the stored counters recounted, all in
+    one transaction. Enrollments that reach 100% are flagged completed.
+    Returns the ids of the enrollments completed by this call.
+    """
+    enrollments = list(enrollments)
+    if not enrollments:
+        return []
+    enrollment_ids = [e.pk for e in enrollments]
+    lessons = Lesson.objects.filter(module__course__in={e.course_id for e in enrollments})
+    if lesson_ids is not None:
+        lessons = lessons.filter(pk__in=lesson_ids)
+    lessons_by_course = defaultdict(list)
+    for lesson_id, course_id in lessons.values_list('pk', 'module__course_id'):
+        lessons_by_course[course_id].append(lesson_id)
+
+    completions = [
+        LessonCompletion(enrollment_id=e.pk, lesson_id=lesson_id, is_completed=True)
+        for e in enrollments for lesson_id in lessons_by_course[e.course_id]
+    ]
+    with transaction.atomic():
+        LessonCompletion.objects.bulk_create(completions, batch_size=500, ignore_conflicts=True)
+        # Rows that already existed but were unticked
+        LessonCompletion.objects.filter(
+            enrollment_id__in=enrollment_ids, lesson__in=lessons, is_completed=False,
+        ).update(is_completed=True)
+        refresh_enrollment_progress(Enrollment.objects.filter(pk__in=enrollment_ids))
+        completed = list(
+            Enrollment.objects.filter(pk__in=enrollment_ids, progress=100, is_completed=False).values_list('pk', flat=True)
+        )
+        Enrollment.objects.filter(pk__in=completed).update(is_completed=True, completed_at=timezone.now())
+    return completed
+
+
+def issue_completion_certificates(enrollment_ids, base_url=''):
+    """Issues certificates for completed enrollments and queues them. Returns how many were new."""
+    issued = 0
+    enrollments = Enrollment.objects.filter(pk__in=enrollment_ids, is_completed=True, course__has_certificate=True)
+    for student_id, course_id in enrollments.values_list('student_id', 'course_id'):
+        cert, created = Certificate.objects.get_or_create(student_id=student_id, course_id=course_id)
+        if created:
+            enqueue('courses.issue_certificate', certificate_id=cert.pk, base_url=base_url)
+            issued += 1
+    return issued
+
+
+def courses_with_drift():
+    return Course.objects.annotate(actual_lessons=lesson_count_subquery()).exclude(lesson_count=F('actual_lessons'))
+
+
+def enrollments_with_drift():
+    """Enrollments whose stored counts differ from a fresh count (given correct lesson counts)."""
+    return (
+        Enrollment.objects
+        .annotate(actual_completed=completed_count_subquery())
+        .annotate(actual_progress=progress_expression(completed_count_subquery(), lesson_count_subquery('course_id')))
+        .filter(~Q(completed_count=F('actual_completed')) | ~Q(progress=F('actual_progress')))
+    )
+
+
+def _course_id_for_module(module_id):
+    return Module.objects.filter(pk=module_id).values_list('course_id', flat=True).first()
+
+
+def _origin_model(origin):
+    """Model of the instance or queryset delete() was called on."""
+    return getattr(origin, 'model', type(origin))
+
+
+def _first_in_delete(origin, key):
+    """
+    True the first time key is seen during one delete() call. post_delete
+    fires after each model's rows are gone, so one refresh per key is enough.
+    """
+    if origin is None:
+        return True
+    seen = vars(origin).setdefault('_progress_refreshed', set())
+    if key in seen:
+        return False
+    seen.add(key)
+    return True
+
+
+# --- Signal receivers (connected in CoursesConfig.ready) ---
+
+def remember_lesson_course(sender, instance, raw=False, **kwargs):
+    """Lesson pre_save: note the course the lesson belonged to, in case it moves."""
+    instance._previous_course_id = None
+    if instance.pk and not raw:
+        instance._previous_course_id = (
+            Lesson.objects.filter(pk=instance.pk).values_list('module__course_id', flat=True).first()
+        )
+
+
+def lesson_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    course_id = instance.module.course_id
+    previous = getattr(instance, '_previous_course_id', None)
+    if created or previous != course_id:
+        refresh_course_progress([course_id, previous])
+
+
+def lesson_deleted(sender, instance, origin=None, **kwargs):
+    # Also fires for lessons removed along with their module or course
+    if issubclass(_origin_model(origin), Course):
+        return
+    if _first_in_delete(origin, ('module', instance.module_id)):
+        refresh_course_progress([_course_id_for_module(instance.module_id)])
+
+
+def remember_module_course(sender, instance, raw=False, **kwargs):
+    """Module pre_save: a module moved to another course takes its lessons along."""
+    instance._previous_course_id = None
+    if instance.pk and not raw:
+        instance._previous_course_id = _course_id_for_module(instance.pk)
+
+
+def module_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    previous = getattr(instance, '_previous_course_id', None)
+    if previous is not None and previous != instance.course_id:
+        refresh_course_progress([previous, instance.course_id])
+
+
+def completion_changed(sender, instance, raw=False, origin=None, **kwargs):
+    """LessonCompletion post_save / post_delete."""
+    if raw:
+        return
+    if origin is not None and not issubclass(_origin_model(origin), LessonCompletion):
+        # Cascaded: lesson_deleted recounts the course, or the enrollment is going too
+        return
+    if _first_in_delete(origin, instance.enrollment_id):
+        refresh_enrollment_progress(Enrollment.objects.filter(pk=instance.enrollment_id))
@@ -0,0 +1,53 @@
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.contrib.auth import get_user_model
+from core.jobs import task
+from core.utils import send_html_email
+from .models import Certificate, Course
+from .payments import check_payment
+from .utils import ensure_certificate_file, send_certificate_email
+
+
+@task('courses.issue_certificate')
+def issue_certificate(certificate_id, base_url=''):
+    """Renders and stores a newly issued certificate, then emails it to the student."""
+    certificate = Certificate.objects.select_related('student', 'course__instructor').filter(pk=certificate_id).first()
+    if certificate is None:
+        return
+    ensure_certificate_file(certificate)
+    if not certificate.student.email:
+        return
+    if not send_certificate_email(certificate, base_url=base_url):
+        raise RuntimeError(f"Certificate email for {certificate.certificate_id} was not sent")
+
+
+@task('courses.send_payment_receipt')
+def send_payment_receipt(user_id, course_id, reference, amount, status, paid_at=None, base_url=''):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    course = Course.objects.filter(pk=course_id).first()
+    if not (user and course and user.email):
+        return
+    start_url = reverse('course_detail', kwargs={'slug': course.slug})
+    context = {
+        'user': user,
+        'course': course,
+        'reference': reference,
+        'amount_naira': (amount or 0) / 100.0,
+        'status': status,
+        'paid_at': (parse_datetime(paid_at) if paid_at else None) or timezone.now(),
+        'start_url': f"{base_url}{start_url}",
+    }
+    send_html_email(
+        subject=f'Payment Receipt - {course.title}',
+        template_name='emails/payment_receipt.html',
+        context=context,
+        recipient_list=[user.email],
+        base_url=base_url
+    )
+
+
+@task('courses.verify_payment')
+def verify_payment(reference, base_url='', check=1):
+    """Checks a pending Paystack payment once; re-queues itself while it is still pending."""
+    check_payment(reference, base_url=base_url, check=check)
@@ -5,3 +5,9 @@ register = template.Library()
 @register.filter
 def get_item(dictionary, key):
     return dictionary.get(key)
+
+@register.filter
+def star_icons(rating):
+    """'full', 'half' or 'empty' for each of five stars, the rating rounded to the nearest half."""
+    halves = round((rating or 0) * 2)
+    return ['full' if halves >= 2 * i else 'half' if halves == 2 * i - 1 else 'empty' for i in range(1, 6)]
@@ -1,3 +1,624 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image, ImageChops
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.core.management import call_command
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import Course, Certificate, CertificateSettings, Enrollment, Lesson, LessonCompletion, Module, Payment, PaymentPayload, PaymentSettings, Review
+from .views import get_paystack_keys
+from core.jobs import run_pending
+from core.tests import invalidate_in_other_process
+from core.models import Job
+from django.utils import timezone
+from core.outbox import drain_outbox
+from core.visits import visit_buffer
+from . import certificates, payments, paystack, utils
+from .templatetags import course_extras
+from .fake_paystack import FakePaystack
+
+User = get_user_model()
+
+CACHE_DIR = tempfile.mkdtemp(prefix='cert-cache-')
+MEDIA_DIR = tempfile.mkdtemp(prefix='cert-media-')
+
+
+@override_settings(CERTIFICATE_CACHE_DIR=CACHE_DIR)
+class CertificateBackgroundCacheTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        certificates._background_cache.clear()
+        self.settings = CertificateSettings.objects.create()
+
+    def test_background_rendered_once_per_revision(self):
+        with mock.patch.object(certificates, 'render_certificate_background', wraps=certificates.render_certificate_background) as render:
+            first = certificates.get_certificate_background_path(self.settings)
+            second = certificates.get_certificate_background_path(self.settings)
+        self.assertEqual(first, second)
+        self.assertEqual(render.call_count, 1)
+
+    def test_saving_settings_changes_background_key(self):
+        old_key = certificates.get_certificate_background_key(self.settings)
+        self.settings.primary_color = '#000000'
+        self.settings.save()
+        self.assertNotEqual(old_key, certificates.get_certificate_background_key(self.settings))
+
+    def test_template_compiled_once_per_revision(self):
+        template = certificates.get_certificate_template(self.settings)
+        self.assertIs(template, certificates.get_certificate_template(self.settings))
+        self.settings.save()
+        self.assertIsNot(template, certificates.get_certificate_template(self.settings))
+
+    def test_generate_certificate_pdf(self):
+        student = User.objects.create_user(username='student', password='password', first_name='Ada', last_name='Lovelace')
+        instructor = User.objects.create_user(username='instructor', password='password')
+        course = Course.objects.create(title='Test Course', instructor=instructor, description='Test')
+        certificate = Certificate.objects.create(student=student, course=course)
+        pdf_bytes = certificates.generate_certificate_pdf_bytes(certificate)
+        self.assertTrue(pdf_bytes.startswith(b'%PDF'))
+
+    def test_renders_reuse_registered_assets(self):
+        instructor = User.objects.create_user(username='instructor', password='password')
+        course = Course.objects.create(title='Test Course', instructor=instructor, description='Test')
+        template = certificates.get_certificate_template(self.settings)
+        with mock.patch.object(certificates.FPDF, 'add_font') as add_font, \
+                mock.patch('fpdf.image_parsing.get_img_info') as get_img_info:
+            for name in ('Ada', 'Grace Hopper'):
+                student = User.objects.create_user(username=name, password='password', first_name=name)
+                certificate = Certificate.objects.create(student=student, course=course)
+                self.assertTrue(template.render(certificate).startswith(b'%PDF'))
+        add_font.assert_not_called()
+        get_img_info.assert_not_called()
+
+    def test_renders_without_fpdf_internals(self):
+        instructor = User.objects.create_user(username='instructor', password='password')
+        course = Course.objects.create(title='Test Course', instructor=instructor, description='Test')
+        certificate = Certificate.objects.create(student=instructor, course=course)
+        certificates._font_registry.clear()
+        self.addCleanup(certificates._font_registry.clear)
+        with mock.patch.multiple(certificates, SubsetMap=None, ImageCache=None, preload_image=None):
+            self.settings.save()
+            template = certificates.get_certificate_template(self.settings)
+            with mock.patch.object(certificates.FPDF, 'add_font', wraps=None, autospec=True,
+                                   side_effect=certificates.FPDF.add_font) as add_font:
+                self.assertTrue(template.render(certificate).startswith(b'%PDF'))
+        self.assertTrue(add_font.called)
+
+
+class WatermarkTilingTests(SimpleTestCase):
+    def setUp(self):
+        self.logo = Image.new('RGBA', (30, 12), (20, 40, 200, 20))
+
+    def test_staggered_matches_per_tile_compositing(self):
+        size = (200, 100)
+        expected = Image.new('RGBA', size, (255, 255, 255, 255))
+        for y in range(0, size[1], 12):
+            for x in range(0, size[0], 30):
+                offset = 15 if (y // 12) % 2 == 1 else 0
+                expected.alpha_composite(self.logo, (x + offset, y))
+
+        canvas = Image.new('RGBA', size, (255, 255, 255, 255))
+        certificates.tile_watermark(canvas, certificates.build_watermark_pattern(self.logo))
+        # The legacy loop left the first half tile of odd rows empty; the pattern wraps it
+        diff = ImageChops.difference(expected.crop((15, 0, 200, 100)), canvas.crop((15, 0, 200, 100)))
+        self.assertIsNone(diff.getbbox())
+
+    def test_diagonal_pattern_period(self):
+        pattern = certificates.build_watermark_pattern(self.logo, certificates.WATERMARK_MODE_DIAGONAL)
+        self.assertEqual(pattern.size, (30, 48))
+
+
+@override_settings(CERTIFICATE_CACHE_DIR=CACHE_DIR, MEDIA_ROOT=MEDIA_DIR)
+class CertificateFileTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.student = User.objects.create_user(username='student', password='password')
+        instructor = User.objects.create_user(username='instructor', password='password')
+        self.course = Course.objects.create(title='Test Course', instructor=instructor, description='Test')
+        self.certificate = Certificate.objects.create(student=self.student, course=self.course)
+        self.client.login(username='student', password='password')
+
+    def test_download_serves_stored_pdf(self):
+        url = reverse('download_certificate', args=[self.certificate.certificate_id])
+        with mock.patch.object(utils, 'generate_certificate_pdf_bytes', wraps=utils.generate_certificate_pdf_bytes) as render:
+            first = self.client.get(url)
+            second = self.client.get(url)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(b''.join(first.streaming_content), b''.join(second.streaming_content))
+        self.certificate.refresh_from_db()
+        self.assertTrue(self.certificate.file)
+
+    def test_name_change_invalidates_stored_pdf(self):
+        utils.ensure_certificate_file(self.certificate)
+        old_fingerprint = self.certificate.file_fingerprint
+        self.student.first_name = 'Grace'
+        self.student.save()
+        self.certificate.refresh_from_db()
+        utils.ensure_certificate_file(self.certificate)
+        self.assertNotEqual(old_fingerprint, self.certificate.file_fingerprint)
+
+    def test_issue_certificates_command(self):
+        other = User.objects.create_user(username='other', password='password')
+        Enrollment.objects.create(student=other, course=self.course, is_completed=True)
+        call_command('issue_certificates', course=self.course.slug, workers=1, stdout=io.StringIO())
+        certificates = Certificate.objects.filter(course=self.course)
+        self.assertEqual(certificates.count(), 2)
+        self.assertTrue(all(cert.file and cert.file_fingerprint for cert in certificates))
+
+    def test_course_completion_queues_certificate_email(self):
+        self.student.email = 'student@example.com'
+        self.student.save()
+        course = Course.objects.create(title='Queued Course', instructor=self.course.instructor, description='Test', has_certificate=True)
+        Enrollment.objects.create(student=self.student, course=course)
+        response = self.client.get(reverse('mark_all_complete', args=[course.slug]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(drain_outbox().sent, 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['student@example.com'])
+        self.assertTrue(Certificate.objects.get(student=self.student, course=course).file)
+
+
+class SingletonSettingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_paystack_keys_are_cached_until_saved(self):
+        payment_settings = PaymentSettings.objects.create(paystack_public_key='pk_one', paystack_secret_key='sk_one')
+        self.assertEqual(get_paystack_keys(), ('pk_one', 'sk_one'))
+        with self.assertNumQueries(0):
+            get_paystack_keys()
+        payment_settings.paystack_secret_key = 'sk_two'
+        payment_settings.save()
+        self.assertEqual(get_paystack_keys(), ('pk_one', 'sk_two'))
+
+    def test_invalidation_reaches_other_processes(self):
+        payment_settings = PaymentSettings.objects.create(paystack_public_key='pk_one', paystack_secret_key='sk_one')
+        self.assertEqual(get_paystack_keys(), ('pk_one', 'sk_one'))
+        PaymentSettings.objects.filter(pk=payment_settings.pk).update(paystack_secret_key='sk_rotated')
+        invalidate_in_other_process('from courses.models import PaymentSettings\nPaymentSettings.invalidate_cache()\n')
+        self.assertEqual(get_paystack_keys(), ('pk_one', 'sk_rotated'))
+
+    def test_delete_clears_cached_row(self):
+        certificate_settings = CertificateSettings.objects.create()
+        self.assertEqual(CertificateSettings.get_cached(), certificate_settings)
+        certificate_settings.delete()
+        self.assertIsNone(CertificateSettings.get_cached())
+
+
+class StoredProgressTests(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', password='password')
+        self.student = User.objects.create_user(username='student', password='password')
+        self.course = Course.objects.create(title='Progress Course', instructor=instructor, description='Test')
+        self.module = Module.objects.create(course=self.course, title='Module 1')
+        self.lessons = [Lesson.objects.create(module=self.module, title=f'Lesson {i}') for i in range(4)]
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+
+    def stored(self):
+        self.course.refresh_from_db()
+        self.enrollment.refresh_from_db()
+        return self.course.lesson_count, self.enrollment.completed_count, self.enrollment.get_progress()
+
+    def test_counts_follow_lessons_and_completions(self):
+        self.assertEqual(self.stored(), (4, 0, 0))
+        LessonCompletion.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        self.assertEqual(self.stored(), (4, 1, 25))
+        Lesson.objects.create(module=self.module, title='Lesson 4')
+        self.assertEqual(self.stored(), (5, 1, 20))
+        self.lessons[0].delete()
+        self.assertEqual(self.stored(), (4, 0, 0))
+
+    def test_cascaded_deletes_refresh_once(self):
+        for lesson in self.lessons[:2]:
+            LessonCompletion.objects.create(enrollment=self.enrollment, lesson=lesson)
+        other = Module.objects.create(course=self.course, title='Module 2')
+        for i in range(3):
+            Lesson.objects.create(module=other, title=f'Extra {i}')
+        with CaptureQueriesContext(connection) as ctx:
+            other.delete()
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "courses_enrollment"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.stored(), (4, 2, 50))
+        LessonCompletion.objects.filter(enrollment=self.enrollment).delete()
+        self.assertEqual(self.stored(), (4, 0, 0))
+
+    def test_course_delete_queries_do_not_grow_with_lessons(self):
+        for i in range(26):
+            Lesson.objects.create(module=self.module, title=f'Extra {i}')
+        for i in range(10):
+            student = User.objects.create_user(username=f'bulk{i}', password='password')
+            enrollment = Enrollment.objects.create(student=student, course=self.course)
+            LessonCompletion.objects.bulk_create(
+                LessonCompletion(enrollment=enrollment, lesson=lesson) for lesson in self.module.lessons.all()
+            )
+        # One SELECT per related model and DELETEs in batches of 100, no progress refreshes
+        with self.assertNumQueries(17):
+            self.course.delete()
+        self.assertFalse(LessonCompletion.objects.exists())
+
+    def test_mark_complete_uses_stored_progress(self):
+        self.client.login(username='student', password='password')
+        for lesson in self.lessons:
+            self.client.get(reverse('mark_lesson_complete', args=[lesson.pk]))
+        self.assertEqual(self.stored(), (4, 4, 100))
+        self.assertTrue(self.enrollment.is_completed)
+
+    def test_reconcile_repairs_drift(self):
+        LessonCompletion.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        Course.objects.filter(pk=self.course.pk).update(lesson_count=9)
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_count=3, progress=77)
+        out = io.StringIO()
+        call_command('reconcile_progress', dry_run=True, stdout=out)
+        self.assertIn('1 courses and 1 enrollments have drifted', out.getvalue())
+        call_command('reconcile_progress', stdout=io.StringIO())
+        self.assertEqual(self.stored(), (4, 1, 25))
+
+    def test_with_progress_lists_in_one_query(self):
+        other = Course.objects.create(title='Other Course', instructor=self.course.instructor, description='Test')
+        Enrollment.objects.create(student=self.student, course=other)
+        LessonCompletion.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        with self.assertNumQueries(1):
+            rows = {e.course_id: (e.completed_lessons, e.total_lessons, e.current_progress)
+                    for e in Enrollment.objects.filter(student=self.student).with_progress()}
+        self.assertEqual(rows, {self.course.pk: (1, 4, 25), other.pk: (0, 0, 0)})
+
+    def test_dashboard_progress_queries_do_not_grow(self):
+        self.client.login(username='student', password='password')
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(4) as first:
+            self.client.get(reverse('dashboard'))
+        for i in range(3):
+            course = Course.objects.create(title=f'Extra {i}', instructor=self.course.instructor, description='Test')
+            Enrollment.objects.create(student=self.student, course=course)
+        with self.assertNumQueries(len(first)):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['active_courses']), 4)
+
+    def test_mark_all_complete_bulk_inserts(self):
+        LessonCompletion.objects.create(enrollment=self.enrollment, lesson=self.lessons[0], is_completed=False)
+        self.client.login(username='student', password='password')
+        with mock.patch.object(LessonCompletion.objects, 'get_or_create') as get_or_create:
+            self.client.get(reverse('mark_all_complete', args=[self.course.slug]))
+        get_or_create.assert_not_called()
+        self.assertEqual(self.stored(), (4, 4, 100))
+        self.assertTrue(self.enrollment.is_completed)
+        self.assertEqual(LessonCompletion.objects.filter(enrollment=self.enrollment, is_completed=True).count(), 4)
+
+    def test_import_progress_from_csv(self):
+        self.student.email = 'student@example.com'
+        self.student.save()
+        other = User.objects.create_user(username='other', password='password')
+        Enrollment.objects.create(student=other, course=self.course)
+        path = tempfile.mktemp(suffix='.csv')
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        with open(path, 'w', newline='') as f:
+            f.write('student,course,lesson\n')
+            f.write(f'student@example.com,{self.course.slug},\n')
+            f.write(f'other,{self.course.slug},{self.lessons[0].slug}\n')
+            f.write(f'nobody,{self.course.slug},\n')
+        out = io.StringIO()
+        call_command('import_progress', path, certificates=True, stdout=out)
+        self.assertIn('2 enrollments (1 now completed, 1 skipped)', out.getvalue())
+        self.assertEqual(self.stored(), (4, 4, 100))
+        self.assertEqual(Enrollment.objects.get(student=other).progress, 25)
+        self.assertTrue(Certificate.objects.filter(student=self.student, course=self.course).exists())
+
+
+class CatalogueQueryTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', password='password')
+        self.student = User.objects.create_user(username='student', password='password')
+        # Write the page visits these requests record before the test data is rolled back
+        self.addCleanup(visit_buffer.flush, blocking=True)
+
+    def add_course(self, title):
+        course = Course.objects.create(title=title, instructor=self.instructor, description='Test', is_published=True)
+        module = Module.objects.create(course=course, title='Module')
+        Lesson.objects.create(module=module, title=f'{title} intro', duration=timedelta(minutes=10))
+        Lesson.objects.create(module=module, title=f'{title} outro', duration=timedelta(minutes=5))
+        return course
+
+    def test_annotations(self):
+        course = self.add_course('Annotated')
+        Enrollment.objects.create(student=self.student, course=course)
+        Review.objects.create(course=course, user=self.student, rating=4, comment='Good')
+        Review.objects.create(course=course, user=self.instructor, rating=5, comment='Great')
+        row = Course.objects.for_catalogue(self.student).get(pk=course.pk)
+        self.assertEqual((row.module_count, row.lesson_count, row.review_count), (1, 2, 2))
+        self.assertEqual(row.total_duration, timedelta(minutes=15))
+        self.assertEqual(row.avg_rating, 4.5)
+        self.assertTrue(row.is_enrolled)
+        self.assertFalse(Course.objects.for_catalogue(self.instructor).get(pk=course.pk).is_enrolled)
+
+    def test_list_stars_follow_average_rating(self):
+        self.assertEqual(course_extras.star_icons(3.7), ['full', 'full', 'full', 'half', 'empty'])
+        rated = self.add_course('Rated')
+        Review.objects.create(course=rated, user=self.student, rating=2, comment='Meh')
+        self.add_course('Unrated')
+        response = self.client.get(reverse('course_list'))
+        self.assertContains(response, '2.0 (1)')
+        self.assertContains(response, 'title="2.0 out of 5"', count=1)
+        self.assertContains(response, '<i class="fas fa-star"></i>', count=2)
+        self.assertNotContains(response, 'fa-star-half-alt')
+
+    def test_catalogue_queries_do_not_grow(self):
+        self.client.login(username='student', password='password')
+        self.add_course('First')
+        for url in (reverse('course_list'), reverse('home')):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as before:
+                self.client.get(url)
+            for i in range(3):
+                self.add_course(f'{url} {i}')
+            with self.assertNumQueries(len(before)):
+                self.client.get(url)
+
+
+class PaymentVerificationTests(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', password='password')
+        self.student = User.objects.create_user(username='student', password='password', email='student@example.com')
+        self.course = Course.objects.create(title='Paid Course', instructor=instructor, description='Test', price=5000, is_published=True)
+        self.client.login(username='student', password='password')
+
+    def start(self, reference='ref-1', own=True):
+        if own:
+            session = self.client.session
+            payments.remember_checkout(session, self.course, reference)
+            session.save()
+        with mock.patch.object(payments, 'fetch_transaction') as fetch:
+            response = self.client.get(reverse('verify_course_payment', args=[self.course.slug]), {'reference': reference})
+        fetch.assert_not_called()
+        return response
+
+    def status(self, reference='ref-1'):
+        return self.client.get(reverse('payment_status', args=[self.course.slug]), {'reference': reference}).json()
+
+    def test_verify_returns_immediately_and_job_settles(self):
+        response = self.start()
+        self.assertTemplateUsed(response, 'courses/payment_verifying.html')
+        self.assertEqual(self.status(), {'status': 'pending'})
+
+        paid = {'status': True, 'data': {'status': 'success', 'reference': 'ref-1', 'amount': 500000}}
+        with mock.patch.object(payments, 'fetch_transaction', return_value=paid):
+            run_pending()
+        self.assertEqual(self.status()['status'], 'success')
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+        self.assertEqual(Job.objects.filter(task='courses.send_payment_receipt').count(), 1)
+
+    def test_pending_is_rechecked_later(self):
+        self.start()
+        with mock.patch.object(payments, 'fetch_transaction', return_value={'status': True, 'data': {'status': 'ongoing'}}):
+            self.assertEqual(run_pending(), (1, 0))
+        recheck = Job.objects.get(task='courses.verify_payment', status=Job.STATUS_PENDING)
+        self.assertEqual(recheck.payload['check'], 2)
+        self.assertGreater(recheck.run_after, timezone.now())
+
+    def test_failed_payment(self):
+        self.start()
+        with mock.patch.object(payments, 'fetch_transaction', return_value={'status': True, 'data': {'status': 'abandoned'}}):
+            run_pending()
+        self.assertEqual(self.status(), {'status': 'failed'})
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_unknown_reference_is_refused(self):
+        response = self.start('made-up', own=False)
+        self.assertRedirects(response, reverse('course_detail', args=[self.course.slug]), fetch_redirect_response=False)
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(Job.objects.filter(task='courses.verify_payment').exists())
+
+    def test_reference_paystack_does_not_know_fails(self):
+        self.start()
+        missing = paystack.PaystackError('Transaction reference not found', 400, {'status': False, 'message': 'Transaction reference not found'})
+        with mock.patch.object(payments, 'fetch_transaction', side_effect=missing):
+            self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(self.status(), {'status': 'failed'})
+        self.assertFalse(Job.objects.filter(task='courses.verify_payment', status=Job.STATUS_PENDING).exists())
+
+    @override_settings(PAYSTACK_VERIFY_MAX_CHECKS=2)
+    def test_unconfirmed_payment_is_abandoned_after_last_check(self):
+        self.start()
+        outage = paystack.PaystackError('Paystack returned HTTP 503', 503)
+        with mock.patch.object(payments, 'fetch_transaction', side_effect=outage):
+            self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(self.status(), {'status': 'pending'})
+        Job.objects.filter(status=Job.STATUS_PENDING).update(run_after=timezone.now())
+        with mock.patch.object(payments, 'fetch_transaction', return_value={'status': True, 'data': {'status': 'ongoing'}}):
+            self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(self.status(), {'status': 'abandoned'})
+        self.assertFalse(Job.objects.filter(task='courses.verify_payment', status=Job.STATUS_PENDING).exists())
+        # A late webhook still settles it
+        data = {'status': 'success', 'reference': 'ref-1', 'amount': 500000}
+        self.assertEqual(payments.fulfil_payment('ref-1', data).status, payments.STATUS_SUCCESS)
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+
+    def test_fulfilment_is_idempotent(self):
+        data = {'status': 'success', 'reference': 'ref-2', 'amount': 500000,
+                'metadata': {'course_slug': self.course.slug, 'user_id': self.student.pk}}
+        # Webhook first: the reference is recorded from the metadata
+        self.assertEqual(payments.fulfil_payment('ref-2', data).status, payments.STATUS_SUCCESS)
+        # Insert-or-ignore, a no-op update and the read back (plus the savepoint pair)
+        with self.assertNumQueries(5):
+            payments.fulfil_payment('ref-2', data, user=self.student, course=self.course)
+        self.assertTemplateNotUsed(self.start('ref-2'), 'courses/payment_verifying.html')
+        self.assertEqual(Enrollment.objects.filter(student=self.student, course=self.course).count(), 1)
+        self.assertEqual(Job.objects.filter(task='courses.send_payment_receipt').count(), 1)
+        self.assertFalse(Job.objects.filter(task='courses.verify_payment').exists())
+        self.assertEqual(Payment.objects.get(reference='ref-2').payload.data['amount'], 500000)
+
+    def test_unattributable_reference_is_ignored(self):
+        self.assertIsNone(payments.fulfil_payment('ref-3', {'status': 'success', 'reference': 'ref-3'}))
+        self.assertFalse(Enrollment.objects.exists())
+
+
+class PaymentLedgerTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        instructor = User.objects.create_user(username='instructor', password='password')
+        self.course = Course.objects.create(title='Paid Course', instructor=instructor, description='Test', price=5000, is_published=True)
+        for i, status in enumerate([Payment.STATUS_SUCCESS, Payment.STATUS_FAILED, Payment.STATUS_SUCCESS]):
+            payment = Payment.objects.create(user=self.staff, course=self.course, reference=f'T{i}abc', amount=500000, status=status)
+            PaymentPayload.objects.create(payment=payment, data={'blob': 'x' * 1000})
+        Payment.objects.create(user=self.staff, course=self.course, reference='X9', amount=500000, status=Payment.STATUS_PENDING)
+        self.client.login(username='staff', password='password')
+
+    def references(self, **params):
+        response = self.client.get(reverse('manage_payments'), params)
+        return sorted(p.reference for p in response.context['payments'])
+
+    def test_search_matches_reference_prefix(self):
+        self.assertEqual(self.references(q='T'), ['T0abc', 'T1abc', 'T2abc'])
+        self.assertEqual(self.references(q='T1abc'), ['T1abc'])
+        self.assertEqual(self.references(q='abc'), [])
+        # Case-sensitive, so it stays an index range scan
+        self.assertEqual(self.references(q='t1'), [])
+        self.assertIn('USING INDEX', Payment.objects.filter(reference__prefix='T1').explain())
+
+    def test_admin_search_uses_prefix_and_exact_lookups(self):
+        User.objects.filter(pk=self.staff.pk).update(is_superuser=True)
+        response = self.client.get(reverse('admin:courses_payment_changelist'), {'q': 'T1'})
+        self.assertEqual([p.reference for p in response.context['cl'].result_list], ['T1abc'])
+        response = self.client.get(reverse('admin:courses_payment_changelist'), {'q': 'staff'})
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+    def test_status_filter(self):
+        self.assertEqual(self.references(status='success'), ['T0abc', 'T2abc'])
+        self.assertEqual(self.references(status='bogus'), ['T0abc', 'T1abc', 'T2abc', 'X9'])
+
+    def test_list_does_not_load_payloads(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('manage_payments'))
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_paymentpayload' in q['sql']])
+
+    def test_payment_success_shows_latest_successful_payment(self):
+        response = self.client.get(reverse('payment_success', args=[self.course.slug]))
+        self.assertEqual(response.context['payment'].status, Payment.STATUS_SUCCESS)
+
+
+class StubPaystackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Status codes to answer with before succeeding
+    failures = []
+    connections = set()
+
+    def do_GET(self):
+        type(self).connections.add(self.client_address)
+        status = type(self).failures.pop(0) if type(self).failures else 200
+        body = json.dumps({'status': status == 200, 'data': {'status': 'success', 'reference': self.path.rsplit('/', 1)[-1]}}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PaystackClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubPaystackHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubPaystackHandler.failures = []
+        StubPaystackHandler.connections = set()
+        self.client = paystack.PaystackClient('sk_test', base_url=self.base_url, backoff=0)
+        self.addCleanup(self.client.session.close)
+
+    def test_connection_is_reused(self):
+        for i in range(5):
+            self.assertEqual(self.client.verify_transaction(f'ref-{i}')['data']['reference'], f'ref-{i}')
+        self.assertEqual(len(StubPaystackHandler.connections), 1)
+        self.assertEqual(self.client.metrics.snapshot()['verify']['calls'], 5)
+
+    def test_server_errors_are_retried(self):
+        StubPaystackHandler.failures = [503, 502]
+        self.assertTrue(self.client.verify_transaction('ref')['status'])
+        self.assertEqual(self.client.metrics.snapshot()['verify']['retries'], 2)
+
+    def test_breaker_opens_after_repeated_failures(self):
+        self.client.breaker = paystack.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        StubPaystackHandler.failures = [500] * 6
+        for _ in range(2):
+            with self.assertRaises(paystack.PaystackError):
+                self.client.verify_transaction('ref')
+        with self.assertRaises(paystack.CircuitOpenError):
+            self.client.verify_transaction('ref')
+        self.assertEqual(self.client.breaker.state, 'open')
+
+
+@override_settings(PAYSTACK_SECRET_KEY='sk_test_fake', JOB_QUEUE_EAGER=False)
+class FakePaystackTests(TestCase):
+    def setUp(self):
+        self.fake = FakePaystack('sk_test_fake').start()
+        self.addCleanup(self.fake.stop)
+        overrides = override_settings(PAYSTACK_API_BASE=self.fake.base_url)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        User = get_user_model()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        instructor = User.objects.create_user(username='teacher', password='pw')
+        self.course = Course.objects.create(title='Paid', instructor=instructor, description='d', price=5000, is_published=True)
+
+    def test_checkout_through_fake_server(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('init_course_payment', args=[self.course.slug]))
+        authorization_url = response.context['authorization_url']
+        self.assertTrue(authorization_url.startswith(self.fake.base_url))
+        reference = authorization_url.rsplit('/', 1)[-1]
+        self.assertTrue(payments.is_own_checkout(self.client.session, self.course, reference))
+
+        self.assertEqual(self.fake.pay(reference, success=True)['status'], 'success')
+        body, signature = self.fake.webhook(reference)
+        response = self.client.post(reverse('paystack_webhook'), body, content_type='application/json',
+                                    HTTP_X_PAYSTACK_SIGNATURE=signature)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Enrollment.objects.filter(student=self.user, course=self.course).exists())
+        self.assertEqual(payments.check_payment(reference), payments.STATUS_SUCCESS)
+
+    def test_unknown_reference_is_rejected(self):
+        with self.assertRaises(paystack.PaystackError) as ctx:
+            paystack.get_client().verify_transaction('missing')
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    def test_load_test_command_runs_inline(self):
+        out = io.StringIO()
+        call_command('paystack_load_test', checkouts=3, concurrency=1, latency=0, stdout=out)
+        output = out.getvalue()
+        self.assertIn("Payments: {'success': 3}; enrollments: 3; receipts queued: 3 (0 references with duplicates)", output)
+        self.assertIn('No errors.', output)
+        self.assertFalse(get_user_model().objects.filter(username__startswith='loadtest-').exists())
@@ -49,6 +49,7 @@ urlpatterns = [
     path('<slug:slug>/pay/', views.course_payment, name='course_payment'),
     path('<slug:slug>/pay/init/', views.init_course_payment, name='init_course_payment'),
     path('<slug:slug>/pay/verify/', views.verify_course_payment, name='verify_course_payment'),
+    path('<slug:slug>/pay/status/', views.payment_status, name='payment_status'),
     path('<slug:slug>/pay/success/', views.payment_success, name='payment_success'),
     path('pay/webhook/', views.paystack_webhook, name='paystack_webhook'),
     path('<slug:slug>/enroll/', views.enroll_course, name='enroll_course'),
@@ -10,47 +10,23 @@ from django.http import JsonResponse, HttpResponse, FileResponse
 from django.template.loader import get_template, render_to_string
 from django.utils.html import strip_tags
 from django.core.mail import send_mail
-from django.conf import settings as django_settings
 from django.views.decorators.csrf import csrf_exempt
 from decimal import Decimal
 import hmac
 import hashlib
 from django.http import HttpResponse
-from urllib.error import HTTPError, URLError
 from django.urls import reverse
-from core.models import SiteSettings
 from .models import Payment, PaymentSettings
 import uuid
-from fpdf import FPDF
-import io
-import os
-from PIL import Image, ImageDraw, ImageEnhance # Import PIL
 import json
-from urllib import request as urlrequest, parse as urlparse
-import requests
-import time
-import tempfile
-from .utils import generate_certificate_pdf_bytes, send_certificate_email
-from core.utils import send_html_email
-
-try:
-    import barcode
-    from barcode.writer import ImageWriter
-except ImportError:
-    barcode = None
-
-def get_paystack_keys():
-    payment_settings = PaymentSettings.objects.first()
-    pk = payment_settings.paystack_public_key if payment_settings else None
-    sk = payment_settings.paystack_secret_key if payment_settings else None
-    
-    # Fallback to settings if not in DB
-    if not pk:
-        pk = getattr(django_settings, 'PAYSTACK_PUBLIC_KEY', None)
-    if not sk:
-        sk = getattr(django_settings, 'PAYSTACK_SECRET_KEY', None)
-        
-    return pk, sk
+from urllib import parse as urlparse
+from .utils import ensure_certificate_file
+from .certificates import refresh_certificate_background
+from core.utils import get_base_url
+from core.jobs import enqueue
+from .progress import complete_lessons
+from .payments import STATUS_SUCCESS, SUCCESS_STATUSES, fulfil_payment, is_own_checkout, new_reference, remember_checkout, start_verification
+from .paystack import PaystackError, get_client, get_paystack_keys
 
 @staff_required
 def manage_payment_settings(request):
@@ -263,17 +239,19 @@ def manage_submissions(request, pk):
 
 @staff_required
 def manage_payments(request):
-    payments = Payment.objects.all().order_by('-paid_at')
+    payments = Payment.objects.select_related('user', 'course').order_by('-paid_at')
     
     # Get payment settings for display
-    payment_settings = PaymentSettings.objects.first()
+    payment_settings = PaymentSettings.get_cached()
     
     status = request.GET.get('status')
-    if status:
+    if status in dict(Payment.STATUS_CHOICES):
         payments = payments.filter(status=status)
-    query = request.GET.get('q')
+    query = (request.GET.get('q') or '').strip()
     if query:
-        payments = payments.filter(reference__icontains=query)
+        # Exact reference or a prefix of one. Case-sensitive, as a range the
+        # unique index serves (references are stored as Paystack returns them)
+        payments = payments.filter(reference__prefix=query)
         
     # Add pagination
     from django.core.paginator import Paginator
@@ -316,7 +294,9 @@ def manage_certificate_settings(request):
             form = CertificateSettingsForm(request.POST, request.FILES, instance=settings)
             
         if form.is_valid():
-            form.save()
+            settings = form.save()
+            # Re-render the cached certificate background for the new design revision
+            refresh_certificate_background(settings)
             messages.success(request, 'Certificate settings updated successfully!')
             return redirect('manage_certificate_settings')
     else:
@@ -328,7 +308,7 @@ def manage_certificate_settings(request):
     return render(request, 'courses/manage_certificate_settings.html', {'form': form})
 
 def course_list(request):
-    courses = Course.objects.filter(is_published=True)
+    courses = Course.objects.filter(is_published=True).for_catalogue(request.user)
     categories = Category.objects.all().order_by('name')
     return render(request, 'courses/course_list.html', {'courses': courses, 'categories': categories})
 
@@ -443,9 +423,11 @@ def init_course_payment(request, slug):
     callback_url = request.build_absolute_uri(
         reverse('verify_course_payment', kwargs={'slug': slug})
     )
+    reference = new_reference()
     payload = {
         'email': request.user.email or 'noemail@techohr.com.ng',
         'amount': amount_kobo,
+        'reference': reference,
         'currency': 'NGN',
         'callback_url': callback_url,
         'metadata': {
@@ -454,44 +436,20 @@ def init_course_payment(request, slug):
             'username': request.user.username,
         }
     }
-    data = json.dumps(payload).encode('utf-8')
-    req = urlrequest.Request(
-        'https://api.paystack.co/transaction/initialize',
-        data=data,
-        headers={
-            'Content-Type': 'application/json',
-            'Authorization': f"Bearer {paystack_secret_key}"
-        },
-        method='POST'
-    )
     try:
-        with urlrequest.urlopen(req) as resp:
-            body = resp.read().decode('utf-8')
-            res = json.loads(body)
-            if res.get('status') and res.get('data', {}).get('authorization_url'):
-                return render(request, 'courses/payment_init.html', {
-                    'course': course,
-                    'authorization_url': res['data']['authorization_url'],
-                    'amount_naira': float(course.current_price),
-                })
-            # Show Paystack error message if available
-            err_msg = res.get('message') or 'Unable to initialize payment. Please try again.'
-            messages.error(request, err_msg)
-    except HTTPError as e:
-        try:
-            err_body = e.read().decode('utf-8')
-            err_json = json.loads(err_body)
-            err_msg = err_json.get('message') or 'Payment initialization failed.'
-            messages.error(request, err_msg)
-        except Exception:
-            messages.error(request, 'Payment initialization failed. Please try again later.')
-        return redirect('course_payment', slug=slug)
-    except URLError:
-        messages.error(request, 'Network error contacting Paystack. Check your internet and try again.')
-        return redirect('course_payment', slug=slug)
-    except Exception:
-        messages.error(request, 'Payment initialization failed. Please try again later.')
+        res = get_client().initialize_transaction(payload)
+    except PaystackError as e:
+        messages.error(request, str(e) or 'Payment initialization failed. Please try again later.')
         return redirect('course_payment', slug=slug)
+    if res.get('status') and res.get('data', {}).get('authorization_url'):
+        remember_checkout(request.session, course, reference)
+        return render(request, 'courses/payment_init.html', {
+            'course': course,
+            'authorization_url': res['data']['authorization_url'],
+            'amount_naira': float(course.current_price),
+        })
+    # Show Paystack error message if available
+    messages.error(request, res.get('message') or 'Unable to initialize payment. Please try again.')
     return redirect('course_payment', slug=slug)
 
 @login_required
@@ -501,117 +459,48 @@ def verify_course_payment(request, slug):
     if not reference:
         messages.error(request, 'Payment verification failed: missing reference.')
         return redirect('course_detail', slug=slug)
-    
-    paystack_public_key, paystack_secret_key = get_paystack_keys()
 
-    # Retry verification a few times to allow Paystack to finalize the transaction
-    attempts = 5
-    last_error_message = None
-    
-    # Check if payment already exists (webhook might have already processed it)
-    existing_payment = Payment.objects.filter(reference=reference).first()
-    if existing_payment and existing_payment.status.lower() in ['success', 'successful', 'successfull']:
-        if not Enrollment.objects.filter(student=request.user, course=course).exists():
-             Enrollment.objects.get_or_create(student=request.user, course=course)
-        return redirect('payment_success', slug=slug)
-
-    for i in range(attempts):
-        url = f"https://api.paystack.co/transaction/verify/{urlparse.quote(reference)}"
-        headers = {
-            "Authorization": f"Bearer {paystack_secret_key}",
-            "Content-Type": "application/json",
-            "User-Agent": "TechOHR-LMS/1.0",
-            "Accept": "application/json",
-        }
-        
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            # If we get a 403, it's definitely a configuration or header issue
-            if response.status_code == 403:
-                last_error_message = f"Connection error: HTTP Error 403: Forbidden - Paystack rejected the request headers."
-                if i < attempts - 1:
-                    time.sleep(2)
-                    continue
-                break
+    # Only references from a checkout started in this session (or already recorded)
+    if not is_own_checkout(request.session, course, reference) and not Payment.objects.filter(reference=reference).exists():
+        messages.error(request, 'Payment verification failed: unknown payment reference.')
+        return redirect('course_detail', slug=slug)
 
-            response.raise_for_status()
-            res = response.json()
-            data = res.get('data') or {}
-            status_val = str(data.get('status') or '').lower()
-            
-            # Broaden the success check to handle common variations
-            if res.get('status') is True and status_val in ['success', 'successful', 'successfull']:
-                # Create or update Payment record
-                payment, created = Payment.objects.get_or_create(
-                    reference=data.get('reference') or reference or '',
-                    defaults={
-                        'user': request.user,
-                        'course': course,
-                        'amount': data.get('amount') or 0,
-                        'status': 'success',
-                        'raw': data,
-                    }
-                )
-                
-                # Ensure Enrollment
-                if not Enrollment.objects.filter(student=request.user, course=course).exists():
-                    Enrollment.objects.create(student=request.user, course=course)
-                    
-                    # Send Receipt Email
-                    try:
-                        amount_naira = (data.get('amount') or 0) / 100.0
-                        context = {
-                            'user': request.user,
-                            'course': course,
-                            'reference': data.get('reference') or reference,
-                            'amount_naira': amount_naira,
-                            'status': 'success',
-                            'paid_at': data.get('paid_at') or timezone.now(),
-                            'start_url': request.build_absolute_uri(reverse('course_detail', kwargs={'slug': slug})),
-                        }
-                        send_html_email(
-                            subject=f'Payment Receipt - {course.title}',
-                            template_name='emails/payment_receipt.html',
-                            context=context,
-                            recipient_list=[request.user.email],
-                            request=request
-                        )
-                    except Exception as email_err:
-                        print(f"Error sending receipt email: {email_err}")
-                        
-                messages.success(request, f'Payment successful. You are now enrolled in {course.title}.')
-                return redirect('payment_success', slug=slug)
-            
-            last_error_message = res.get('message') or (data.get('gateway_response') if isinstance(data, dict) else None) or 'Payment pending or not successful.'
-            
-        except requests.exceptions.RequestException as e:
-            last_error_message = f"Connection error: {str(e)}"
-        except Exception as e:
-            last_error_message = f"Verification failed: {str(e)}"
-            
-        # Wait before next attempt
-        if i < attempts - 1:
-            time.sleep(2)
-            
-    # Final check before failing
-    payment = Payment.objects.filter(reference=reference).first()
-    if payment and payment.status.lower() in ['success', 'successful', 'successfull']:
-        if not Enrollment.objects.filter(student=request.user, course=course).exists():
-            Enrollment.objects.create(student=request.user, course=course)
+    # Record the reference and let the job worker (or the webhook) settle it
+    amount_kobo = int(max(float(course.current_price), 0) * 100)
+    payment = start_verification(request.user, course, reference, amount_kobo, base_url=get_base_url(request))
+    if payment.user_id != request.user.id or payment.course_id != course.id:
+        messages.error(request, 'Payment verification failed: this reference belongs to another checkout.')
+        return redirect('course_detail', slug=slug)
+    if payment.status == STATUS_SUCCESS:
+        messages.success(request, f'Payment successful. You are now enrolled in {course.title}.')
         return redirect('payment_success', slug=slug)
 
-    messages.error(request, f"Verification Error: {last_error_message or 'Please check your dashboard or contact support.'}")
-    return redirect('course_detail', slug=slug)
+    return render(request, 'courses/payment_verifying.html', {
+        'course': course,
+        'payment': payment,
+        'status_url': f"{reverse('payment_status', kwargs={'slug': slug})}?{urlparse.urlencode({'reference': reference})}",
+    })
+
+@login_required
+def payment_status(request, slug):
+    """Polled by the verifying page: a single indexed lookup, no Paystack call."""
+    reference = request.GET.get('reference') or ''
+    payment = Payment.objects.filter(reference=reference, user=request.user, course__slug=slug).values('status').first()
+    if payment is None:
+        return JsonResponse({'status': 'unknown'}, status=404)
+    data = {'status': payment['status']}
+    if payment['status'] == STATUS_SUCCESS:
+        data['redirect_url'] = reverse('payment_success', kwargs={'slug': slug})
+    return JsonResponse(data)
 
 @login_required
 def payment_success(request, slug):
     course = get_object_or_404(Course, slug=slug)
     # Find the latest successful payment for this user and course
     payment = Payment.objects.filter(
-        user=request.user, 
-        course=course, 
-        status__in=['success', 'successful', 'successfull']
+        user=request.user,
+        course=course,
+        status=Payment.STATUS_SUCCESS,
     ).order_by('-paid_at').first()
     
     if not payment and not Enrollment.objects.filter(student=request.user, course=course).exists():
@@ -665,30 +554,20 @@ def course_payment(request, slug):
         amount_kobo = int(Decimal(str(course.current_price)) * 100)
     except Exception:
         amount_kobo = int(float(course.current_price) * 100)
+    # The popup checkout uses our reference, so the callback can be matched to it
+    reference = ''
+    if keys_ready:
+        reference = new_reference()
+        remember_checkout(request.session, course, reference)
     return render(request, 'courses/course_payment.html', {
         'course': course,
         'amount_naira': float(course.current_price),
         'amount_kobo': amount_kobo,
         'keys_ready': keys_ready,
         'public_key': paystack_public_key if keys_ready else '',
+        'reference': reference,
     })
 
-    # Check if already enrolled
-    if not Enrollment.objects.filter(student=request.user, course=course).exists():
-        Enrollment.objects.create(student=request.user, course=course)
-        messages.success(request, f"You have successfully enrolled in {course.title}!")
-    
-    # Redirect to the first lesson
-    first_module = course.modules.first()
-    if first_module:
-        first_lesson = first_module.lessons.first()
-        if first_lesson:
-            return redirect('lesson_detail', course_slug=course.slug, lesson_slug=first_lesson.slug)
-            
-    # Fallback if no lessons found
-    messages.info(request, "Course content is coming soon.")
-    return redirect('course_detail', slug=slug)
-
 @csrf_exempt
 def paystack_webhook(request):
     try:
@@ -710,72 +589,21 @@ def paystack_webhook(request):
         data = payload.get('data') or {}
         status_val = str(data.get('status') or '').lower()
         reference = data.get('reference')
-        amount = data.get('amount') or 0
-        course_slug = (data.get('metadata') or {}).get('course_slug')
-        user_id = (data.get('metadata') or {}).get('user_id')
-        if status_val in ('success', 'successful') and reference:
+        if status_val in SUCCESS_STATUSES and reference:
             try:
-                course = Course.objects.filter(slug=course_slug).first()
-                user = None
-                if user_id:
-                    from django.contrib.auth import get_user_model
-                    User = get_user_model()
-                    user = User.objects.filter(id=user_id).first()
-                Payment.objects.get_or_create(
-                    reference=reference,
-                    defaults={
-                        'user': user,
-                        'course': course,
-                        'amount': amount,
-                        'status': status_val,
-                        'raw': data,
-                    }
-                )
-                if user and course and not Enrollment.objects.filter(student=user, course=course).exists():
-                    Enrollment.objects.create(student=user, course=course)
-                    
-                    # Send Payment Receipt Email via Webhook
-                    try:
-                        amount_naira = (data.get('amount') or 0) / 100.0
-                        
-                        # Construct Start URL (Harder in webhook without request context, but we can try)
-                        # We can use the domain from SiteSettings if available or fallback
-                        start_url = reverse('course_detail', kwargs={'slug': course.slug})
-                        # Ideally prepend domain, but send_html_email handles relative URLs? No, it needs absolute for buttons usually.
-                        # Let's try to get domain from request or settings.
-                        domain = request.get_host() 
-                        protocol = 'https' if request.is_secure() else 'http'
-                        full_start_url = f"{protocol}://{domain}{start_url}"
-
-                        context = {
-                            'user': user,
-                            'course': course,
-                            'reference': reference,
-                            'amount_naira': amount_naira,
-                            'status': status_val,
-                            'paid_at': data.get('paid_at') or timezone.now(),
-                            'start_url': full_start_url,
-                        }
-                        
-                        send_html_email(
-                            subject=f'Payment Receipt - {course.title}',
-                            template_name='emails/payment_receipt.html',
-                            context=context,
-                            recipient_list=[user.email],
-                            request=request 
-                        )
-                    except Exception as e:
-                        print(f"Webhook email error: {e}")
-                        pass
-            except Exception:
-                pass
+                # Idempotent: a no-op if the verify job already settled it
+                fulfil_payment(reference, data, base_url=get_base_url(request))
+            except Exception as e:
+                print(f"Error processing Paystack webhook for {reference}: {e}")
+                # Paystack redelivers on non-2xx; safe now that fulfilment is idempotent
+                return HttpResponse(status=500)
         return HttpResponse(status=200)
     except Exception:
         return HttpResponse(status=400)
 
 @staff_required
 def manage_courses(request):
-    courses = Course.objects.all().order_by('-created_at')
+    courses = Course.objects.select_related('category', 'instructor').order_by('-created_at')
     total_courses = courses.count()
     published_courses = courses.filter(is_published=True).count()
     draft_courses = courses.filter(is_published=False).count()
@@ -852,7 +680,7 @@ def delete_course_category(request, pk):
 
 @staff_required
 def manage_enrollments(request):
-    enrollments = Enrollment.objects.all().order_by('-enrolled_at')
+    enrollments = Enrollment.objects.select_related('student', 'course').with_progress().order_by('-enrolled_at')
     return render(request, 'courses/manage_enrollments.html', {'enrollments': enrollments})
 
 @staff_required
@@ -1010,11 +838,13 @@ def mark_lesson_complete(request, pk):
     lesson = get_object_or_404(Lesson, pk=pk)
     enrollment = get_object_or_404(Enrollment, student=request.user, course=lesson.module.course)
     
-    completion, created = LessonCompletion.objects.get_or_create(enrollment=enrollment, lesson=lesson)
-    completion.is_completed = True
-    completion.save()
+    completion, created = LessonCompletion.objects.get_or_create(enrollment=enrollment, lesson=lesson, defaults={'is_completed': True})
+    if not completion.is_completed:
+        completion.is_completed = True
+        completion.save()
     
-    # Check if course is completed
+    # Check if course is completed (progress is recounted when the completion is saved)
+    enrollment.refresh_from_db(fields=['completed_count', 'progress'])
     progress = enrollment.get_progress()
     if progress == 100 and not enrollment.is_completed:
         enrollment.is_completed = True
@@ -1025,7 +855,7 @@ def mark_lesson_complete(request, pk):
         if lesson.module.course.has_certificate:
             cert, created = Certificate.objects.get_or_create(student=request.user, course=lesson.module.course)
             if created:
-                send_certificate_email(cert, request)
+                enqueue('courses.issue_certificate', certificate_id=cert.pk, base_url=get_base_url(request))
             messages.success(request, 'Congratulations! You have completed the course and earned a certificate.')
     
     messages.success(request, 'Lesson marked as complete!')
@@ -1036,21 +866,21 @@ def mark_all_complete(request, course_slug):
     course = get_object_or_404(Course, slug=course_slug)
     enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
     
-    lessons = Lesson.objects.filter(module__course=course)
-    
-    for lesson in lessons:
-        LessonCompletion.objects.get_or_create(enrollment=enrollment, lesson=lesson, defaults={'is_completed': True})
+    # One bulk insert for the missing completions, counters updated alongside
+    complete_lessons([enrollment])
+    enrollment.refresh_from_db()
         
-    # Update enrollment status
-    enrollment.is_completed = True
-    enrollment.completed_at = timezone.now()
-    enrollment.save()
+    # Update enrollment status (also for a course without lessons)
+    if not enrollment.is_completed:
+        enrollment.is_completed = True
+        enrollment.completed_at = timezone.now()
+        enrollment.save()
     
     # Generate Certificate if applicable
     if course.has_certificate:
         cert, created = Certificate.objects.get_or_create(student=request.user, course=course)
         if created:
-            send_certificate_email(cert, request)
+            enqueue('courses.issue_certificate', certificate_id=cert.pk, base_url=get_base_url(request))
         messages.success(request, 'Congratulations! You have completed the course and earned a certificate.')
     else:
         messages.success(request, 'All lessons marked as complete!')
@@ -1061,340 +891,12 @@ def mark_all_complete(request, course_slug):
 def download_certificate(request, certificate_id):
     certificate = get_object_or_404(Certificate, certificate_id=certificate_id, student=request.user)
     
-    # Static Assets Paths
-    static_images_path = os.path.join(django_settings.BASE_DIR, 'static', 'images')
-    corners_path = os.path.join(static_images_path, 'certificate_corners.png')
-    seal_path = os.path.join(static_images_path, 'gold_seal.png')
-    
-    # Colors
-    DARK_BLUE = (25, 55, 90)   # Brightened Dark Blue
-    LIGHT_BLUE = (100, 180, 255) # Light Blue for inner border
-    GRAY = (100, 100, 100)
-    
-    # Get Settings for Logo & Colors
-    settings = CertificateSettings.objects.first()
-    
-    # Use settings colors if available
-    primary_color = DARK_BLUE
-    secondary_color = DARK_BLUE
-    accent_color = DARK_BLUE
+    # Rendered once at issue time; only re-rendered if the design or printed details changed
+    ensure_certificate_file(certificate)
     
-    if settings:
-        def hex_to_rgb(hex_color):
-            hex_color = hex_color.lstrip('#')
-            return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-            
-        if settings.primary_color: primary_color = hex_to_rgb(settings.primary_color)
-        if settings.secondary_color: secondary_color = hex_to_rgb(settings.secondary_color)
-        if settings.accent_color: accent_color = hex_to_rgb(settings.accent_color)
-        
-    # Create Dynamic Background with Watermark
-    temp_bg_path = None
-    try:
-        # 1. Create White Canvas (High Res for Print Quality, scaled down for PDF if needed)
-        # A4 @ 96 DPI is approx 1123x794. Let's use 2000x1414 for good quality.
-        bg_width, bg_height = 2000, 1414
-        background = Image.new('RGBA', (bg_width, bg_height), (255, 255, 255, 255))
-        
-        # 2. Tile Faint Logo
-        if settings and settings.logo:
-            try:
-                logo = Image.open(settings.logo.path).convert('RGBA')
-                # Resize logo to be small (e.g., 100px width)
-                logo_w = 150
-                aspect = logo.height / logo.width
-                logo_h = int(logo_w * aspect)
-                resampling_attr = getattr(Image, 'Resampling', None)
-                resample_filter = resampling_attr.LANCZOS if resampling_attr else getattr(Image, 'LANCZOS', Image.ANTIALIAS)
-                logo = logo.resize((logo_w, logo_h), resample_filter)
-                
-                # Make logo faint (Opacity)
-                # Create a new image with alpha channel adjusted
-                # Easy way: split alpha, multiply by factor, merge back
-                r, g, b, alpha = logo.split()
-                alpha = alpha.point(lambda p: p * 0.08) # 8% opacity (Reduced from 15%)
-                logo.putalpha(alpha)
-                
-                # Tile it
-                # Spacing - "No space at all" means spacing equals dimensions
-                space_x = logo_w 
-                space_y = logo_h
-                
-                # Diagonal tiling or grid? Grid is simpler.
-                for y in range(0, bg_height, space_y):
-                    for x in range(0, bg_width, space_x):
-                        # Offset every other row
-                        offset = (space_x // 2) if (y // space_y) % 2 == 1 else 0
-                        background.alpha_composite(logo, (x + offset, y))
-            except Exception as e:
-                print(f"Error processing watermark logo: {e}")
-        else:
-             print("No logo found in settings for watermark.")
-
-        # 3. Draw Borders and Corners (Programmatically)
-        try:
-            draw = ImageDraw.Draw(background)
-            
-            # Dimensions
-            margin = 50
-            outer_border_width = 20
-            gap = 5
-            inner_border_width = 8
-            
-            # Outer Border (Dark Blue)
-            # Note: In PIL, width draws inside the bounding box
-            draw.rectangle(
-                [margin, margin, bg_width - margin, bg_height - margin],
-                outline=DARK_BLUE,
-                width=outer_border_width
-            )
-            
-            # Inner Border (Light Blue)
-            inner_offset = margin + outer_border_width + gap
-            draw.rectangle(
-                [inner_offset, inner_offset, bg_width - inner_offset, bg_height - inner_offset],
-                outline=LIGHT_BLUE,
-                width=inner_border_width
-            )
-            
-            # Corner Graphics (Decorative L-shapes)
-            corner_length = 200
-            corner_width = 25
-            corner_offset = margin - 15 
-            
-            # Helper to draw thick lines
-            def draw_corner(start, end, width, color):
-                draw.line([start, end], fill=color, width=width)
-                
-            # Top-Left
-            draw_corner((corner_offset, corner_offset), (corner_offset + corner_length, corner_offset), corner_width, DARK_BLUE)
-            draw_corner((corner_offset, corner_offset), (corner_offset, corner_offset + corner_length), corner_width, DARK_BLUE)
-            
-            # Top-Right
-            draw_corner((bg_width - corner_offset - corner_length, corner_offset), (bg_width - corner_offset, corner_offset), corner_width, DARK_BLUE)
-            draw_corner((bg_width - corner_offset, corner_offset), (bg_width - corner_offset, corner_offset + corner_length), corner_width, DARK_BLUE)
-            
-            # Bottom-Left
-            draw_corner((corner_offset, bg_height - corner_offset), (corner_offset + corner_length, bg_height - corner_offset), corner_width, DARK_BLUE)
-            draw_corner((corner_offset, bg_height - corner_offset - corner_length), (corner_offset, bg_height - corner_offset), corner_width, DARK_BLUE)
-
-            # Bottom-Right
-            draw_corner((bg_width - corner_offset - corner_length, bg_height - corner_offset), (bg_width - corner_offset, bg_height - corner_offset), corner_width, DARK_BLUE)
-            draw_corner((bg_width - corner_offset, bg_height - corner_offset - corner_length), (bg_width - corner_offset, bg_height - corner_offset), corner_width, DARK_BLUE)
-            
-        except Exception as e:
-            print(f"Error drawing borders: {e}")
-
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-            temp_bg_path = tmp.name
-        background.save(temp_bg_path)
-        
-    except Exception as e:
-        print(f"Error creating dynamic background: {e}")
-
-    # Create PDF
-    pdf = FPDF(orientation='L', unit='mm', format='A4')
-    pdf.set_auto_page_break(auto=False)
-    font_path = os.path.join(django_settings.BASE_DIR, 'static', 'fonts')
-    try:
-        if os.path.exists(os.path.join(font_path, 'GreatVibes-Regular.ttf')):
-            pdf.add_font('GreatVibes', '', os.path.join(font_path, 'GreatVibes-Regular.ttf'))
-        if os.path.exists(os.path.join(font_path, 'Lato-Regular.ttf')):
-            pdf.add_font('Lato', '', os.path.join(font_path, 'Lato-Regular.ttf'))
-        if os.path.exists(os.path.join(font_path, 'Lato-Bold.ttf')):
-            pdf.add_font('Lato', 'B', os.path.join(font_path, 'Lato-Bold.ttf'))
-    except Exception as e:
-        print(f"Font loading error: {e}")
-    family_script = 'GreatVibes' if os.path.exists(os.path.join(font_path, 'GreatVibes-Regular.ttf')) else 'Helvetica'
-    family_sans = 'Lato' if os.path.exists(os.path.join(font_path, 'Lato-Regular.ttf')) else 'Helvetica'
-    family_sans_bold = 'Lato' if os.path.exists(os.path.join(font_path, 'Lato-Bold.ttf')) else 'Helvetica'
-
-    pdf.add_page()
-    
-    # 1. Background (Dynamic)
-    if temp_bg_path and os.path.exists(temp_bg_path):
-        try:
-            pdf.image(temp_bg_path, x=0, y=0, w=297, h=210)
-        except Exception as e:
-            print(f"Error loading background: {e}")
-            
-    # Clean up temp background immediately? No, wait until end or use try/finally block logic.
-    # We'll clean up at the end of the view.
-
-    # 2. Main Logo (Top Center)
-    if settings and settings.logo:
-        try:
-            logo_path = settings.logo.path
-            # Center the logo at the top
-            pdf.image(logo_path, x=123.5, y=10, w=50) # x = (297-50)/2 = 123.5
-        except Exception as e:
-            print(f"Error loading logo: {e}")
-
-    # 3. Title: "Certificate of Completion"
-    # Font: Sans-Bold (Lato-Bold)
-    pdf.set_font(family_sans_bold, 'B' if family_sans_bold != 'Helvetica' else 'B', 42)
-    pdf.set_text_color(*primary_color)
-    pdf.set_y(50) # Shifted down (was 45)
-    pdf.cell(0, 15, 'Certificate of Completion', align='C')
-    
-    # 4. Subtitle: "THIS IS TO CERTIFY THAT"
-    pdf.set_font(family_sans, '', 10)
-    pdf.set_text_color(*secondary_color) # Keep uniform color or slightly lighter
-    pdf.set_y(67) # Shifted down (was 62)
-    pdf.cell(0, 10, 'THIS IS TO CERTIFY THAT', align='C')
-    
-    # 5. Student Name
-    # Font: Script (GreatVibes)
-    pdf.set_font(family_script, '', 48)
-    pdf.set_text_color(*primary_color)
-    pdf.set_y(80) # Shifted down (was 75)
-    student_name = certificate.student.get_full_name() or certificate.student.username
-    pdf.cell(0, 20, student_name, align='C')
-    
-    # Line under name
-    text_width = pdf.get_string_width(student_name)
-    # Ensure line is at least somewhat wide
-    line_width = max(text_width + 20, 100)
-    start_x = (297 - line_width) / 2
-    pdf.set_draw_color(*accent_color)
-    pdf.set_line_width(0.5)
-    pdf.line(start_x, 100, start_x + line_width, 100) # Shifted down (was 95)
-    
-    # 6. "HAS SUCCESSFULLY COMPLETED"
-    pdf.set_font(family_sans_bold, 'B' if family_sans_bold != 'Helvetica' else 'B', 8)
-    pdf.set_text_color(*secondary_color)
-    pdf.set_y(105) # Shifted down (was 100)
-    pdf.cell(0, 10, 'HAS SUCCESSFULLY COMPLETED', align='C')
-    
-    # 7. Course Name
-    pdf.set_font(family_sans, '', 24)
-    pdf.set_text_color(*primary_color)
-    pdf.set_y(120) # Shifted down (was 115)
-    pdf.cell(0, 15, certificate.course.title.upper(), align='C')
-    
-    # 8. Bottom Section (Date, Seal, Signature)
-    bottom_y = 165 # Shifted down (was 160)
-    
-    # Seal (Center)
-    if os.path.exists(seal_path):
-        # Center x = 297/2 = 148.5
-        # Width 30 => x = 133.5
-        pdf.image(seal_path, x=133.5, y=bottom_y - 10, w=30)
-        
-    # Date (Left)
-    pdf.set_xy(40, bottom_y)
-    pdf.set_font(family_sans_bold, 'B' if family_sans_bold != 'Helvetica' else 'B', 12)
-    pdf.set_text_color(*secondary_color)
-    pdf.cell(60, 5, certificate.issued_at.strftime('%B %d, %Y').upper(), align='C')
-    
-    # Date Line
-    pdf.set_draw_color(*accent_color)
-    pdf.line(40, bottom_y + 6, 100, bottom_y + 6)
-    
-    # Date Label
-    pdf.set_xy(40, bottom_y + 8)
-    pdf.set_font(family_sans_bold, 'B' if family_sans_bold != 'Helvetica' else 'B', 8)
-    pdf.cell(60, 5, 'DATE OF COMPLETION', align='C')
-    
-    # Signature (Right)
-    settings = CertificateSettings.objects.first() # Still get settings for signature
-    if settings and settings.signature:
-        try:
-            sig_path = settings.signature.path
-            
-            # Calculate dimensions to fit in box above line
-            # Line is at bottom_y + 6.
-            # Available space above line: Let's say 30 units max height.
-            # Max width: 50 units (to stay centered within 200-260)
-            
-            max_w = 50
-            max_h = 25
-            line_y = bottom_y + 6
-            
-            # Use PIL to get dimensions
-            with Image.open(sig_path) as sig_img:
-                img_w, img_h = sig_img.size
-                aspect = img_h / img_w
-                
-                # Try fitting by width first
-                target_w = max_w
-                target_h = target_w * aspect
-                
-                # If height is too big, fit by height
-                if target_h > max_h:
-                    target_h = max_h
-                    target_w = target_h / aspect
-                    
-                # Calculate position to center horizontally and align bottom to line
-                # Center x of line is 230
-                pos_x = 230 - (target_w / 2)
-                # Position y so bottom touches line_y - padding (e.g. 1 unit)
-                pos_y = line_y - target_h - 1
-                
-                pdf.image(sig_path, x=pos_x, y=pos_y, w=target_w, h=target_h)
-                
-        except Exception as e:
-            print(f"Error loading signature: {e}")
-            
-    # Signature Line
-    pdf.set_draw_color(*accent_color)
-    pdf.line(200, bottom_y + 6, 260, bottom_y + 6)
-    
-    # Signature Label
-    pdf.set_xy(200, bottom_y + 8)
-    pdf.set_font(family_sans_bold, 'B' if family_sans_bold != 'Helvetica' else 'B', 8)
-    pdf.cell(60, 5, 'SIGNATURE', align='C')
-
-    # Instructor Name (Below Signature)
-    pdf.set_xy(200, bottom_y + 13)
-    instructor_name = certificate.course.instructor.get_full_name() or certificate.course.instructor.username
-    pdf.set_font(family_sans_bold, 'B' if family_sans_bold != 'Helvetica' else 'B', 10)
-    pdf.set_text_color(*secondary_color)
-    pdf.cell(60, 5, instructor_name, align='C')
-    pdf.set_xy(200, bottom_y + 18)
-    pdf.set_font(family_sans, '', 8)
-    pdf.cell(60, 5, 'INSTRUCTOR', align='C')
-    
-    # 9. Barcode (Below Seal)
-    if barcode:
-        try:
-            options = {
-                'write_text': False,
-                'module_height': 5.0, 
-                'quiet_zone': 1.0,
-                'font_size': 0,
-                'text_distance': 0,
-            }
-            code = barcode.get('code128', certificate.certificate_id, writer=ImageWriter())
-            tmp_base = os.path.join(tempfile.gettempdir(), f"barcode_{certificate.certificate_id}")
-            barcode_path = code.save(tmp_base, options=options)
-            
-            # Position below seal
-            pdf.image(barcode_path, x=123.5, y=bottom_y + 25, w=50, h=10)
-            
-            # Clean up
-            try:
-                if os.path.exists(barcode_path):
-                    os.remove(barcode_path)
-            except:
-                pass
-        except Exception as e:
-            print(f"Barcode error: {e}")
-
-    pdf_bytes = pdf.output(dest='S')
-    if isinstance(pdf_bytes, str):
-        pdf_bytes = pdf_bytes.encode('latin-1')
-    buffer = io.BytesIO(pdf_bytes)
-    
-    # Cleanup Temp File
-    if temp_bg_path and os.path.exists(temp_bg_path):
-        try:
-            os.remove(temp_bg_path)
-        except:
-            pass
-            
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f"attachment; filename=certificate_{certificate.certificate_id}.pdf"
-    response['Content-Length'] = str(len(pdf_bytes))
-    return response
+    return FileResponse(
+        certificate.file.open('rb'),
+        as_attachment=not request.GET.get('inline'),
+        filename=f"certificate_{certificate.certificate_id}.pdf",
+        content_type='application/pdf',
+    )
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_save, post_delete
+        from blog.models import Post
+        from core.models import Project, Contact, Newsletter
+        from courses.models import Course, Enrollment, Certificate
+        from .stats import invalidate_dashboard_stats
+
+        # Admin dashboard KPIs are cached; drop them when a counted model changes
+        for model in (get_user_model(), Project, Contact, Newsletter, Post, Course, Enrollment, Certificate):
+            post_save.connect(invalidate_dashboard_stats, sender=model, dispatch_uid=f'dashboard_stats_save_{model._meta.label}')
+            post_delete.connect(invalidate_dashboard_stats, sender=model, dispatch_uid=f'dashboard_stats_delete_{model._meta.label}')
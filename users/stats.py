@@ -0,0 +1,157 @@
+"""
+Admin dashboard statistics.
+
+Every KPI on the admin dashboard comes from one conditional aggregate per
+model (Count with filter=Q), and the visit chart from one bucketed query over
+the daily rollups. Both sit in the cache for DASHBOARD_STATS_TTL seconds; the
+KPIs are also dropped by signals as soon as one of the counted models changes.
+"""
+from datetime import date, timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+from blog.models import Post
+from core.models import Project, Contact, Newsletter, PageVisitDaily
+from core.rollups import TOTAL, daily_totals, hourly_totals
+from courses.models import Course, Enrollment, Certificate
+
+KPI_CACHE_KEY = 'admin_dashboard:kpis'
+TREND_CACHE_KEY = 'admin_dashboard:visits:{}'
+TREND_TYPES = ('hourly', 'daily', 'weekly', 'monthly', 'yearly')
+
+
+def get_stats_ttl():
+    return getattr(settings, 'DASHBOARD_STATS_TTL', 60)
+
+
+def pct_change(prev, current):
+    if prev == 0:
+        return 100 if current > 0 else 0
+    return int(round(((current - prev) / prev) * 100))
+
+
+def compute_dashboard_kpis(now=None):
+    """Totals, week-over-week numbers and recent rows for the admin dashboard."""
+    User = get_user_model()
+    now = now or timezone.now()
+    # Trends (last 7 days vs previous 7 days)
+    start = now - timedelta(days=7)
+    prev_start = now - timedelta(days=14)
+
+    users = User.objects.aggregate(
+        total=Count('id'),
+        week=Count('id', filter=Q(date_joined__gte=start)),
+        prev=Count('id', filter=Q(date_joined__gte=prev_start, date_joined__lt=start)),
+    )
+    projects = Project.objects.aggregate(total=Count('id'), week=Count('id', filter=Q(created_at__gte=start)))
+    courses = Course.objects.aggregate(total=Count('id'), week=Count('id', filter=Q(created_at__gte=start)))
+    posts = Post.objects.aggregate(total=Count('id'), week=Count('id', filter=Q(published_at__gte=start)))
+    learning = Enrollment.objects.aggregate(total=Count('id'))
+    certificates = Certificate.objects.aggregate(total=Count('id'))
+
+    return {
+        'total_users': users['total'],
+        'total_projects': projects['total'],
+        'total_courses': courses['total'],
+        'total_posts': posts['total'],
+        'total_enrollments': learning['total'],
+        'total_certificates': certificates['total'],
+        'users_week_change': pct_change(users['prev'], users['week']),
+        'projects_week_new': projects['week'],
+        'courses_week_new': courses['week'],
+        'posts_week_new': posts['week'],
+        # Recent Data
+        'recent_users': list(User.objects.order_by('-date_joined')[:5]),
+        'recent_contacts': list(Contact.objects.order_by('-created_at')[:5]),
+        'recent_subscribers': list(Newsletter.objects.order_by('-subscribed_at')[:5]),
+        'recent_enrollments': list(Enrollment.objects.select_related('student', 'course').order_by('-enrolled_at')[:5]),
+    }
+
+
+def _bucketed_totals(trunc, start_day, end_day):
+    rows = (
+        PageVisitDaily.objects.filter(page_url=TOTAL, day__range=(start_day, end_day))
+        .annotate(bucket=trunc('day'))
+        .values('bucket')
+        .annotate(visits=Sum('visits'))
+    )
+    return {row['bucket']: row['visits'] for row in rows}
+
+
+def compute_visit_trend(trend_type, now=None):
+    """(labels, values) for the page visit chart, read from the visit rollups."""
+    now = timezone.localtime(now or timezone.now())
+    today = now.date()
+    labels = []
+    values = []
+    if trend_type == 'hourly':
+        current_hour = now.replace(minute=0, second=0, microsecond=0)
+        first_hour = current_hour - timedelta(hours=23)
+        counts = hourly_totals(first_hour, current_hour + timedelta(hours=1))
+        for i in range(24):
+            hour = first_hour + timedelta(hours=i)
+            labels.append(hour.strftime('%H:00'))
+            values.append(counts.get(hour, 0))
+    elif trend_type == 'weekly':
+        this_week = today - timedelta(days=today.weekday())
+        first_week = this_week - timedelta(weeks=4)
+        counts = daily_totals(first_week, today)
+        for i in range(5):
+            week_start = first_week + timedelta(weeks=i)
+            labels.append(f"Week {week_start.strftime('%W')}")
+            values.append(sum(counts.get(week_start + timedelta(days=d), 0) for d in range(7)))
+    elif trend_type == 'monthly':
+        months = []
+        y, m = today.year, today.month
+        for i in range(12):
+            months.insert(0, (y, m))
+            m -= 1
+            if m == 0:
+                y, m = y - 1, 12
+        counts = _bucketed_totals(TruncMonth, date(*months[0], 1), today)
+        for y, m in months:
+            month = date(y, m, 1)
+            labels.append(month.strftime('%b'))
+            values.append(counts.get(month, 0))
+    elif trend_type == 'yearly':
+        counts = _bucketed_totals(TruncYear, date(today.year - 4, 1, 1), today)
+        for y in range(today.year - 4, today.year + 1):
+            labels.append(str(y))
+            values.append(counts.get(date(y, 1, 1), 0))
+    else:
+        counts = daily_totals(today - timedelta(days=6), today)
+        for i in range(6, -1, -1):
+            day = today - timedelta(days=i)
+            labels.append(day.strftime('%a'))
+            values.append(counts.get(day, 0))
+    return labels, values
+
+
+def get_dashboard_kpis():
+    kpis = cache.get(KPI_CACHE_KEY)
+    if kpis is None:
+        kpis = compute_dashboard_kpis()
+        cache.set(KPI_CACHE_KEY, kpis, get_stats_ttl())
+    return kpis
+
+
+def get_visit_trend(trend_type):
+    if trend_type not in TREND_TYPES:
+        trend_type = 'daily'
+    key = TREND_CACHE_KEY.format(trend_type)
+    trend = cache.get(key)
+    if trend is None:
+        trend = compute_visit_trend(trend_type)
+        cache.set(key, trend, get_stats_ttl())
+    return trend
+
+
+def invalidate_dashboard_stats(**kwargs):
+    # Logins only touch last_login, which the dashboard doesn't show
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    cache.delete(KPI_CACHE_KEY)
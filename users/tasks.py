@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from core.jobs import task
+from core.utils import send_html_email
+
+
+@task('users.send_activation_email')
+def send_activation_email(user_id, activate_url, domain='', base_url=''):
+    user = get_user_model().objects.filter(pk=user_id, is_active=False).first()
+    if user is None:
+        # Already activated (or deleted) by the time the job ran
+        return
+    context = {
+        'user': user,
+        'domain': domain,
+        'activate_url': activate_url,
+    }
+    send_html_email(
+        subject='Activate Your TechOhr Account',
+        template_name='emails/student_confirmation.html',
+        context=context,
+        recipient_list=[user.email],
+        base_url=base_url
+    )
+
+
+@task('users.notify_admin_new_student')
+def notify_admin_new_student(user_id, dashboard_url, base_url=''):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    send_html_email(
+        subject=f'New Student Registration: {user.username}',
+        template_name='emails/admin_new_student.html',
+        context={'user': user, 'dashboard_url': dashboard_url},
+        recipient_list=[settings.DEFAULT_FROM_EMAIL],
+        base_url=base_url
+    )
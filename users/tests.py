@@ -1,5 +1,6 @@
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from courses.models import Course, Enrollment, Category
 
@@ -30,3 +31,26 @@ class DashboardTests(TestCase):
         self.assertIn('completed_courses', response.context)
         self.assertIn('certificates', response.context)
         self.assertEqual(len(response.context['active_courses']), 1)
+
+
+class AdminDashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def test_kpis_are_cached_between_requests(self):
+        url = reverse('admin_dashboard')
+        first = self.client.get(url)
+        self.assertEqual(first.context['total_users'], 1)
+        # Only the session and user lookups remain once the stats and site settings are cached
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_new_user_invalidates_kpis(self):
+        url = reverse('admin_dashboard')
+        self.client.get(url)
+        User.objects.create_user(username='newcomer', password='password')
+        response = self.client.get(url)
+        self.assertEqual(response.context['total_users'], 2)
+        self.assertEqual(response.context['users_week_change'], 100)